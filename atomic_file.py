@@ -0,0 +1,26 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Read once at import, os.umask can only be read by setting it, which would race the files other threads create
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+@contextmanager
+def atomic_write(file_name, newline=None):
+    """Yields a text file that replaces file_name in one step when the block ends, or is removed if the block fails"""
+
+    # Written next to the target then renamed, so a reader or a failure never sees a partial file
+    directory = os.path.dirname(os.path.abspath(file_name))
+    fd, temp_name = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", newline=newline) as text_file:
+            yield text_file
+
+        # mkstemp makes the file private, a new file gets the usual permissions instead
+        os.chmod(temp_name, 0o666 & ~UMASK)
+        os.replace(temp_name, file_name)
+    except BaseException:
+        os.remove(temp_name)
+        raise
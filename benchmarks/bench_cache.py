@@ -0,0 +1,107 @@
+"""Measures the memory of the in-memory device cache against keeping every row as a tuple.
+
+    python benchmarks/bench_cache.py [devices]
+
+The default is a 1,000,000 device fleet. The tuple layout is the one the
+cache used before it stored columns: a list of row tuples as sqlite3
+returns them, a list of property numbers and a dict from property number
+to row. Memory is what tracemalloc counts as still allocated after the
+load, so strings shared between rows are counted once. Load times are
+taken without tracemalloc, which slows every allocation.
+"""
+
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fleet import write_fleet_csv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOOKUPS = 100000
+
+
+def load_tuples(C):
+    """Returns the rows of the devices table held as tuples with a property number list and index"""
+
+    devices = []
+    property_numbers = []
+    index = {}
+    for row in C.cur.execute("SELECT * FROM devices ORDER BY property_number"):
+        devices.append(row)
+        property_numbers.append(row[0])
+        index[row[0]] = row
+    return devices, property_numbers, index
+
+
+def load_columns(C):
+    """Returns the devices table loaded into the columnar cache"""
+
+    C.generate_devices_list()
+    return C.cache
+
+
+def measure(load, C):
+    """Returns what a load keeps allocated in bytes and its time in seconds"""
+
+    gc.collect()
+    tracemalloc.start()
+    held = load(C)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    gc.collect()
+
+    started = time.perf_counter()
+    held = load(C)
+    elapsed = time.perf_counter() - started
+    return size, elapsed, held
+
+
+def main():
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp())
+    write_fleet_csv("fleet.csv", devices)
+
+    from device_database import Cal_Database
+
+    C = Cal_Database(load_devices=False)
+    C.import_csv("fleet.csv", replace=True, progress=False)
+
+    tuple_size, tuple_load, (_, _, index) = measure(load_tuples, C)
+    column_size, column_load, cache = measure(load_columns, C)
+
+    sample = random.Random(0).sample(cache.property_numbers, LOOKUPS)
+    started = time.perf_counter()
+    for property_number in sample:
+        property_number in index
+    tuple_lookup = (time.perf_counter() - started) / LOOKUPS
+    started = time.perf_counter()
+    for property_number in sample:
+        property_number in cache
+    column_lookup = (time.perf_counter() - started) / LOOKUPS
+
+    print("devices: %d" % devices)
+    print(
+        "distinct values: "
+        + ", ".join(
+            "%s %d" % (name, len(column.values))
+            for name, column in zip(C.display_column_names()[1:], cache.columns)
+        )
+    )
+    print("\nlayout      bytes/device     load s   lookup us")
+    for name, size, load, lookup in (
+        ("tuples", tuple_size, tuple_load, tuple_lookup),
+        ("columns", column_size, column_load, column_lookup),
+    ):
+        print("%-10s %13.0f %10.2f %11.2f" % (name, size / devices, load, lookup * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Benchmarks the vectorized due_status engine against the per-row date_math loop.
+
+Run from the repository root:
+
+    python benchmarks/bench_due_status.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROW_COUNTS = [10_000, 100_000, 1_000_000]
+
+
+def generate_due_dates(rows, seed=0):
+    """Returns a list of MM/DD/YYYY due dates spread two years around today"""
+
+    rng = random.Random(seed)
+    today = date.today()
+    return [
+        (today + timedelta(days=rng.randint(-365, 365))).strftime("%m/%d/%Y")
+        for _ in range(rows)
+    ]
+
+
+def time_call(function, *args):
+    """Returns the result and wall time in seconds of one call"""
+
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    # The Cal_Database under test writes its database file in the working directory
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp())
+    from device_database import Cal_Database
+
+    C = Cal_Database()
+
+    print("rows        date_math loop    due_status    speedup")
+    for rows in ROW_COUNTS:
+        cal_due = generate_due_dates(rows)
+        loop_days, loop_time = time_call(lambda: [C.date_math(i) for i in cal_due])
+        df, vector_time = time_call(C.due_status, cal_due)
+
+        assert list(df["days_remaining"].astype(int)) == loop_days
+        print(
+            "%-11d %13.3fs %12.3fs %9.1fx"
+            % (rows, loop_time, vector_time, loop_time / vector_time)
+        )
+
+
+if __name__ == "__main__":
+    main()
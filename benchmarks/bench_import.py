@@ -0,0 +1,57 @@
+"""Imports a synthetic csv file through Cal_Database.import_csv and reports rows/sec and peak RSS.
+
+    python benchmarks/bench_import.py [rows] [batch_size]
+
+The default is a 5,000,000 row file. Peak RSS is read from getrusage, which
+reports kilobytes on Linux.
+"""
+
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from fleet import write_fleet_csv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MB"""
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+
+    # The Cal_Database under test writes its database file in the working directory
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp())
+    write_fleet_csv("fleet.csv", rows)
+    file_mb = os.path.getsize("fleet.csv") / 1024 / 1024
+
+    from device_database import Cal_Database
+
+    C = Cal_Database()
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    inserted, rejected = C.import_csv(
+        "fleet.csv", batch_size=batch_size, progress=False
+    )
+    elapsed = time.perf_counter() - start
+
+    print("rows:        %d inserted, %d rejected" % (inserted, rejected))
+    print("file size:   %.1f MB" % file_mb)
+    print("batch size:  %d" % batch_size)
+    print("wall time:   %.2f s" % elapsed)
+    print("rows/sec:    %.0f" % (inserted / elapsed))
+    print(
+        "peak RSS:    %.1f MB (%.1f MB before the import)" % (peak_rss_mb(), rss_before)
+    )
+
+
+if __name__ == "__main__":
+    main()
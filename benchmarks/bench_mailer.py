@@ -0,0 +1,67 @@
+"""Compares one SMTP session per reminder against one session for the whole batch.
+
+Both runs send to a local SMTP_Sink, so the numbers leave out the TLS handshake
+and network round trips that make the per-reminder sessions even slower against
+a real provider.
+
+    python benchmarks/bench_mailer.py [messages]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mailer import Reminder_Mailer
+from smtp_sink import SMTP_Sink
+
+SUBJECT = "Calibration Reminder"
+BODY = "Greetings,\n\nOne or more of your devices need to be calibrated.\n\nThank you."
+
+
+def create_mailer(sink):
+    """Returns a mailer pointed at the local sink"""
+
+    return Reminder_Mailer(
+        "sender@example.com", "password", sink.host, sink.port, use_ssl=False
+    )
+
+
+def session_per_message(sink, receivers):
+    """Opens, logs in and closes a session for every reminder like the old send_email_gmail"""
+
+    for receiver in receivers:
+        with create_mailer(sink) as mailer:
+            mailer.send(receiver, SUBJECT, BODY)
+
+
+def shared_session(sink, receivers):
+    """Sends every reminder over one session"""
+
+    with create_mailer(sink) as mailer:
+        for receiver in receivers:
+            mailer.send(receiver, SUBJECT, BODY)
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    receivers = ["custodian%d@example.com" % i for i in range(messages)]
+
+    print("mode                   messages   connections   messages/s")
+    for name, function in (
+        ("session per message", session_per_message),
+        ("shared session", shared_session),
+    ):
+        with SMTP_Sink() as sink:
+            start = time.perf_counter()
+            function(sink, receivers)
+            elapsed = time.perf_counter() - start
+            print(
+                "%-22s %8d %13d %12.1f"
+                % (name, len(sink.messages), sink.connections, messages / elapsed)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Compares SEARCH through the FTS5 index against LIKE scans of the devices table.
+
+    python benchmarks/bench_search.py [devices]
+
+The default is a 1,000,000 device fleet. Every query is timed for the first
+page of 20 devices and for all matching devices, taking the best of three
+runs. The LIKE scans match substrings the way an ad-hoc SELECT would, FTS5
+matches word prefixes and ranks the matches.
+
+The synthetic catalog only has 14 instruments, so each of its words matches
+7% or more of the fleet and LIKE finds a first page after a few hundred rows.
+One device in RARE_EVERY is turned into an interferometer to time the
+selective searches of a real catalog as well, together with a word that
+matches nothing.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from fleet import write_fleet_csv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUERIES = [
+    "thorlabs",
+    "thorl power",
+    "oscilloscope",
+    "rohde signal",
+    "micro",
+    "zygo interferometer",
+    "interf",
+    "nosuchword",
+]
+RARE_EVERY = 10000
+RUNS = 3
+
+
+def best_time(C, sqlquery, parameters):
+    """Returns the rows and the fastest of RUNS runs of a query in ms"""
+
+    best = None
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        rows = C.cur.execute(sqlquery, parameters).fetchall()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return rows, best
+
+
+def like_query(words, limit):
+    """Returns a LIKE scan of the devices table requiring every word"""
+
+    sqlquery = "SELECT * FROM devices WHERE " + " AND ".join(
+        "(manufacturer LIKE ? OR description LIKE ?)" for _ in words
+    )
+    parameters = []
+    for word in words:
+        parameters += ["%" + word + "%", "%" + word + "%"]
+    if limit:
+        sqlquery += " LIMIT ?"
+        parameters.append(limit)
+    return sqlquery, parameters
+
+
+def fts_query(words, limit):
+    """Returns a ranked FTS5 prefix search like search_devices"""
+
+    sqlquery = "SELECT devices.* FROM devices_search JOIN devices ON devices.rowid = devices_search.rowid WHERE devices_search MATCH ? ORDER BY rank"
+    parameters = [" ".join('"%s"*' % word for word in words)]
+    if limit:
+        sqlquery += " LIMIT ?"
+        parameters.append(limit)
+    return sqlquery, parameters
+
+
+def main():
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp())
+    write_fleet_csv("fleet.csv", devices)
+
+    from device_database import Cal_Database
+
+    C = Cal_Database(load_devices=False)
+    started = time.perf_counter()
+    C.import_csv("fleet.csv", replace=True, progress=False)
+    print("import:        %.1f s" % (time.perf_counter() - started))
+
+    # Changed through the triggers like an UPDATE command would
+    C.cur.execute(
+        "UPDATE devices SET manufacturer = 'Zygo', description = 'Laser Interferometer' WHERE rowid % ? = 0",
+        (RARE_EVERY,),
+    )
+    C.conn.commit()
+
+    started = time.perf_counter()
+    C.rebuild_search_table()
+    C.conn.commit()
+    print("index rebuild: %.1f s" % (time.perf_counter() - started))
+    print(
+        "database:      %.0f MB" % (os.path.getsize("device_database.db") / 1024 / 1024)
+    )
+
+    print(
+        "\n%-20s %9s %12s %12s %12s %12s"
+        % ("query", "matches", "LIKE 20 ms", "FTS5 20 ms", "LIKE all ms", "FTS5 all ms")
+    )
+    for query in QUERIES:
+        words = query.split()
+        _, like_page = best_time(C, *like_query(words, 20))
+        _, fts_page = best_time(C, *fts_query(words, 20))
+        _, like_all = best_time(C, *like_query(words, None))
+        rows, fts_all = best_time(C, *fts_query(words, None))
+        print(
+            "%-20s %9d %12.2f %12.2f %12.1f %12.1f"
+            % (query, len(rows), like_page, fts_page, like_all, fts_all)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Load tests the HTTP/JSON service with concurrent local clients.
+
+A temporary database is filled with a fleet of devices, then every client
+thread runs a mix of page reads, device lookups and updates against the
+server and the latency of each request is recorded.
+
+    python benchmarks/bench_server.py [clients] [requests per client] [devices]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.client import HTTPConnection
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from device_database import Cal_Database
+from fleet import generate_fleet, property_number
+from server import Device_Server
+
+
+def fill_database(db_file, devices):
+    """Creates a database with a fleet of devices"""
+
+    C = Cal_Database(db_file, load_devices=False)
+    C.add_many(generate_fleet(devices))
+    C.conn.close()
+
+
+def client(port, requests, devices, seed, latencies, errors):
+    """Sends a mix of 80% reads and 20% updates, one connection per request"""
+
+    rng = random.Random(seed)
+    for _ in range(requests):
+        pn = property_number(rng.randrange(devices), devices)
+        choice = rng.random()
+        if choice < 0.4:
+            method, path, body = "GET", "/devices?sort=cal_due&limit=20", None
+        elif choice < 0.8:
+            method, path, body = "GET", "/devices/" + pn, None
+        else:
+            method, path = "PATCH", "/devices/" + pn
+            body = json.dumps({"description": "Device %d" % rng.randrange(300)})
+
+        started = time.perf_counter()
+        connection = HTTPConnection("127.0.0.1", port)
+        connection.request(method, path, body)
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        latencies.append(time.perf_counter() - started)
+        if response.status != 200:
+            errors.append(response.status)
+
+
+def percentile(values, fraction):
+    """Returns the value below which a fraction of the sorted values fall"""
+
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    devices = int(sys.argv[3]) if len(sys.argv) > 3 else 100000
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = os.path.join(directory, "devices.db")
+        fill_database(db_file, devices)
+
+        server = Device_Server(("127.0.0.1", 0), db_file, workers=8)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        latencies = []
+        errors = []
+        threads = [
+            threading.Thread(
+                target=client,
+                args=(server.server_port, requests, devices, n, latencies, errors),
+            )
+            for n in range(clients)
+        ]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        server.shutdown()
+        server.server_close()
+
+    latencies.sort()
+    print("clients   requests   errors   requests/s   p50 ms   p99 ms")
+    print(
+        "%7d %10d %8d %12.0f %8.2f %8.2f"
+        % (
+            clients,
+            len(latencies),
+            len(errors),
+            len(latencies) / elapsed,
+            percentile(latencies, 0.50) * 1000,
+            percentile(latencies, 0.99) * 1000,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
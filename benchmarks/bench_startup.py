@@ -0,0 +1,82 @@
+"""Measures how long it takes to import device_database and to reach the first prompt of the CLI.
+
+Each run starts a fresh interpreter. Time to first prompt runs
+device_database.py against a copy of the bundled database and stops the
+clock when "Please enter a command" is printed.
+
+    python benchmarks/bench_startup.py [runs]
+
+For the modules behind the import time use:
+
+    python -X importtime -c "import device_database" 2> importtime.log
+"""
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT = b"Please enter a command"
+
+
+def time_import(directory):
+    """Returns the wall time of a fresh interpreter that only imports the module"""
+
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", "import device_database"],
+        cwd=directory,
+        env=dict(os.environ, PYTHONPATH=ROOT),
+        check=True,
+    )
+    return time.perf_counter() - started
+
+
+def time_first_prompt(directory):
+    """Returns the wall time from starting the CLI until it asks for a command"""
+
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "device_database.py")],
+        cwd=directory,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+    output = b""
+    while PROMPT not in output:
+        chunk = process.stdout.read1(4096)
+        if not chunk:
+            raise RuntimeError("The CLI exited before the first prompt")
+        output += chunk
+    elapsed = time.perf_counter() - started
+
+    process.communicate(b"quit\n")
+    return elapsed
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copy(os.path.join(ROOT, "device_database.db"), directory)
+
+        # Warms the file cache and the bytecode before timing
+        time_first_prompt(directory)
+
+        imports = [time_import(directory) for _ in range(runs)]
+        prompts = [time_first_prompt(directory) for _ in range(runs)]
+
+    print("measure               median ms     min ms")
+    for name, values in (("import", imports), ("first prompt", prompts)):
+        print(
+            "%-16s %14.1f %10.1f"
+            % (name, statistics.median(values) * 1000, min(values) * 1000)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""Times every command of Cal_Database against synthetic fleets and records the results as JSON.
+
+For each fleet size a fresh database is filled by REPLACE, then every command
+runs in its own forked process so its peak memory is measured on its own.
+Wall time and rows/sec leave out the setup of each command (opening the
+database, writing the input csv, starting the SMTP sink).
+
+    python benchmarks/bench_suite.py --sizes 1000 10000 100000 --output results.json
+    python benchmarks/bench_suite.py --sizes 1000 10000 --baseline results.json
+
+With --baseline, commands that got slower than the threshold are listed and
+the exit status is 1, so the suite can gate a change.
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fleet import generate_fleet, write_fleet_csv
+
+REFRESHES = 1000
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MB"""
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def count_devices(C):
+    """Returns the number of rows of the devices table"""
+
+    return C.cur.execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+
+
+def sample_property_numbers(C, count, seed=0):
+    """Returns a repeatable random sample of the property numbers in the table"""
+
+    property_numbers = [
+        row[0] for row in C.cur.execute("SELECT property_number FROM devices")
+    ]
+    return random.Random(seed).sample(
+        property_numbers, min(count, len(property_numbers))
+    )
+
+
+def bench_replace(C, devices):
+    write_fleet_csv("fleet.csv", devices)
+    yield
+    C.replace("devices", "fleet.csv")
+    C.generate_devices_list()
+    yield devices
+
+
+def bench_append(C, devices):
+    """The APPEND import alone, its cache update is timed by append_cache"""
+
+    write_fleet_csv("append.csv", max(1, devices // 10), seed=1, prefix="a")
+    last_rowid = C.last_rowid()
+    yield
+    C.append("devices", "append.csv")
+    yield C.last_rowid() - last_rowid
+
+
+def bench_append_cache(C, devices):
+    """The cache update that follows APPEND, for devices appended after the cache was loaded"""
+
+    write_fleet_csv("append_cache.csv", max(1, devices // 10), seed=4, prefix="c")
+    last_rowid = C.last_rowid()
+    C.append("devices", "append_cache.csv")
+    yield
+    yield len(C.cache_devices_since(last_rowid))
+
+
+def bench_add(C, devices):
+    """The ADD command, one device per transaction followed by its cache refresh"""
+
+    rows = list(generate_fleet(min(REFRESHES, devices), seed=2, prefix="n"))
+    sqlquery = "INSERT INTO devices (property_number, manufacturer, description, cal_date, cal_due, custodian_email) VALUES (?, ?, ?, ?, ?, ?)"
+    yield
+    for row in rows:
+        C.sql_executemany(sqlquery, [row], "Device added!")
+        C.conn.commit()
+        C.refresh_device(row[0])
+    yield len(rows)
+
+
+def bench_add_many(C, devices):
+    rows = list(generate_fleet(max(1, devices // 10), seed=3, prefix="m"))
+    yield
+    yield C.add_many(rows)
+
+
+def bench_display(C, devices):
+    rows = count_devices(C)
+    with patch("builtins.input", return_value="due"):
+        yield
+        C.display_data()
+    yield rows
+
+
+def bench_page(C, devices):
+    """The PAGE command walking every page sorted by due date"""
+
+    yield
+    rows = 0
+    after = None
+    while True:
+        page, after = C.display_page("cal_due", after, 100)
+        rows += len(page)
+        if after is None:
+            break
+    yield rows
+
+
+def bench_save(C, devices):
+    rows = count_devices(C)
+    yield
+    C.save_csv("devices", "export.csv")
+    yield rows
+
+
+def bench_status(C, devices):
+    # The one-time import of pandas is part of startup, not of the command
+    import pandas
+
+    yield
+    yield len(C.generate_status_table())
+
+
+def bench_remind(C, devices, digest=False):
+    from smtp_sink import SMTP_Sink
+
+    # REMIND only sends what changed since the last run, so every run starts from no reminder state
+    C.create_reminder_table()
+    C.cur.execute("DELETE FROM devices_reminders")
+    C.conn.commit()
+
+    with SMTP_Sink() as sink:
+        settings = {
+            "EMAIL": "sender@example.com",
+            "PASSWORD": "password",
+            "SMTP_HOST": sink.host,
+            "SMTP_PORT": str(sink.port),
+            "SMTP_SSL": "0",
+        }
+        with patch.dict(os.environ, settings):
+            yield
+            C.remind(digest=digest)
+        yield len(sink.messages)
+
+
+def bench_remind_digest(C, devices):
+    return bench_remind(C, devices, digest=True)
+
+
+def bench_generate_devices_list(C, devices):
+    """The full cache reload run after REPLACE and MERGE"""
+
+    yield
+    yield len(C.generate_devices_list())
+
+
+def bench_refresh_device(C, devices):
+    """The single device cache refresh run after ADD, DELETE and UPDATE"""
+
+    property_numbers = sample_property_numbers(C, REFRESHES)
+    yield
+    for property_number in property_numbers:
+        C.refresh_device(property_number)
+    yield len(property_numbers)
+
+
+def bench_refresh_devices(C, devices):
+    """The batch cache refresh run after update_many"""
+
+    property_numbers = sample_property_numbers(C, REFRESHES)
+    yield
+    C.refresh_devices(property_numbers)
+    yield len(property_numbers)
+
+
+# In run order: REPLACE fills the database the later commands work on
+COMMANDS = {
+    "replace": bench_replace,
+    "append": bench_append,
+    "append_cache": bench_append_cache,
+    "add": bench_add,
+    "add_many": bench_add_many,
+    "display": bench_display,
+    "page": bench_page,
+    "save": bench_save,
+    "status": bench_status,
+    "remind": bench_remind,
+    "remind_digest": bench_remind_digest,
+    "generate_devices_list": bench_generate_devices_list,
+    "refresh_device": bench_refresh_device,
+    "refresh_devices": bench_refresh_devices,
+}
+
+
+def run_command(name, devices, directory, connection):
+    """Runs one command in a forked process and sends back its measurements"""
+
+    try:
+        os.chdir(directory)
+        from device_database import Cal_Database
+
+        # Printed output goes to a file so DISPLAY of a large fleet is not held in memory
+        with open(name + ".log", "w") as output:
+            with contextlib.redirect_stdout(output):
+                C = Cal_Database(load_devices=name != "generate_devices_list")
+                steps = COMMANDS[name](C, devices)
+                next(steps)
+                started = time.perf_counter()
+                rows = next(steps)
+                elapsed = time.perf_counter() - started
+                steps.close()
+                C.conn.close()
+
+        # The commands report failures by printing them
+        with open(name + ".log") as output:
+            errors = [line.strip() for line in output if "Error" in line]
+        connection.send(
+            {
+                "command": name,
+                "devices": devices,
+                "rows": rows,
+                "wall_s": round(elapsed, 6),
+                "rows_per_s": round(rows / elapsed, 1) if elapsed > 0 else None,
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+                "errors": errors[:5],
+            }
+        )
+    except Exception as e:
+        connection.send({"command": name, "devices": devices, "errors": [repr(e)]})
+
+
+def run_size(devices, commands):
+    """Runs the commands against a fresh database of a number of devices"""
+
+    context = multiprocessing.get_context("fork")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in COMMANDS:
+            if name != "replace" and name not in commands:
+                continue
+
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=run_command, args=(name, devices, directory, sender)
+            )
+            process.start()
+            result = receiver.recv()
+            process.join()
+            results.append(result)
+
+            print(
+                "%-22s %10d %10s %10s %12s %10s %s"
+                % (
+                    name,
+                    devices,
+                    result.get("rows", "-"),
+                    "%.3f" % result["wall_s"] if "wall_s" in result else "-",
+                    "%.0f" % result["rows_per_s"] if result.get("rows_per_s") else "-",
+                    "%.1f" % result["peak_rss_mb"] if "peak_rss_mb" in result else "-",
+                    "; ".join(result["errors"]),
+                ),
+                flush=True,
+            )
+
+    return results
+
+
+def git_commit():
+    """Returns the commit of the tree under test, or None outside a git checkout"""
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Prints the change of every command against a baseline run and returns the regressions"""
+
+    old = {(i["command"], i["devices"]): i for i in baseline["results"]}
+    regressions = []
+
+    print("\ncommand                   devices   baseline s        s     change")
+    for result in results:
+        previous = old.get((result["command"], result["devices"]))
+        if previous is None or "wall_s" not in result or "wall_s" not in previous:
+            continue
+
+        ratio = result["wall_s"] / previous["wall_s"] if previous["wall_s"] else 1.0
+        flag = ""
+        # Very short commands vary by more than the threshold from run to run
+        if ratio > threshold and result["wall_s"] - previous["wall_s"] > min_delta:
+            flag = "REGRESSION"
+            regressions.append(result)
+        print(
+            "%-22s %10d %12.3f %8.3f %9.2fx %s"
+            % (
+                result["command"],
+                result["devices"],
+                previous["wall_s"],
+                result["wall_s"],
+                ratio,
+                flag,
+            )
+        )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times every Cal_Database command against synthetic fleets"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument(
+        "--commands",
+        nargs="+",
+        choices=list(COMMANDS),
+        default=list(COMMANDS),
+        help="REPLACE always runs first to fill the database",
+    )
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument(
+        "--baseline", help="JSON file of an earlier run to compare with"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="slowdown ratio over the baseline reported as a regression",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.05,
+        help="seconds a command must slow down by to count as a regression",
+    )
+    args = parser.parse_args()
+
+    print(
+        "command                   devices       rows     wall s       rows/s    peak MB"
+    )
+    results = []
+    for devices in args.sizes:
+        results.extend(run_size(devices, args.commands))
+
+    run = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as json_file:
+            json.dump(run, json_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as json_file:
+            baseline = json.load(json_file)
+        if compare(results, baseline, args.threshold, args.min_delta):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
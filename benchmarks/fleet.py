@@ -0,0 +1,107 @@
+"""Generates deterministic synthetic device fleets for the benchmarks.
+
+The same devices count, seed and reference date always produce the same rows,
+so runs on different machines or commits are comparable. The reference date
+defaults to today, which keeps the due dates at the same distance from the
+date the commands compare against. The spreads follow a real calibration
+program:
+
++ Devices come from a catalog of instruments, each with its usual calibration
+  interval of 6, 12 or 24 months.
++ Calibration dates are spread evenly over the last interval, so due dates are
+  spread evenly over the next one. About 8% of devices missed their last
+  calibration and are expired by up to six months.
++ Custodians own a skewed share of the fleet: a few labs hold hundreds of
+  devices while most people hold a handful. There is one custodian for every
+  20 devices on average.
+"""
+
+import csv
+import random
+from bisect import bisect_left
+from datetime import date, timedelta
+
+COLUMNS = [
+    "property_number",
+    "manufacturer",
+    "description",
+    "cal_date",
+    "cal_due",
+    "custodian_email",
+]
+
+# (manufacturer, description, calibration interval in days)
+CATALOG = [
+    ("Fluke", "Digital Multi-meter", 365),
+    ("Fluke", "Process Calibrator", 365),
+    ("Keysight", "Oscilloscope", 365),
+    ("Keysight", "Power Supply", 730),
+    ("Keysight", "Spectrum Analyzer", 365),
+    ("Tektronix", "Oscilloscope", 365),
+    ("Newport", "Optical Power Meter", 365),
+    ("Thorlabs", "Optical Power Meter", 365),
+    ("Mitutoyo", "Caliper", 182),
+    ("Mitutoyo", "Micrometer", 182),
+    ("Omega", "Thermocouple Reader", 182),
+    ("Druck", "Pressure Gauge", 182),
+    ("Rohde & Schwarz", "Signal Generator", 730),
+    ("Ohaus", "Balance", 365),
+]
+
+EXPIRED_SHARE = 0.08
+
+
+def custodian_count(devices):
+    """Returns the number of custodians of a fleet"""
+
+    return max(1, devices // 20)
+
+
+def property_number(i, devices, prefix="b"):
+    """Returns the property number of the i-th device of a fleet"""
+
+    return prefix + str(i).zfill(max(6, len(str(devices - 1))))
+
+
+def generate_fleet(devices, seed=0, today=None, prefix="b"):
+    """Yields the rows of a fleet of devices in property number order"""
+
+    rng = random.Random(seed)
+    if today is None:
+        today = date.today()
+
+    # Lognormal weights give a long tail: most custodians own a few devices, some own many
+    cum_weights = []
+    total = 0.0
+    for _ in range(custodian_count(devices)):
+        total += rng.lognormvariate(0, 1.5)
+        cum_weights.append(total)
+
+    for i in range(devices):
+        manufacturer, description, interval = rng.choice(CATALOG)
+
+        if rng.random() < EXPIRED_SHARE:
+            cal_due = today - timedelta(days=rng.randint(1, 182))
+        else:
+            cal_due = today + timedelta(days=rng.randint(0, interval - 1))
+        cal_date = cal_due - timedelta(days=interval)
+
+        custodian = bisect_left(cum_weights, rng.random() * total)
+
+        yield (
+            property_number(i, devices, prefix),
+            manufacturer,
+            description,
+            cal_date.strftime("%m/%d/%Y"),
+            cal_due.strftime("%m/%d/%Y"),
+            "custodian%d@example.com" % custodian,
+        )
+
+
+def write_fleet_csv(file_name, devices, seed=0, today=None, prefix="b"):
+    """Writes a fleet to a csv file with the devices table header, one row at a time"""
+
+    with open(file_name, "w", newline="") as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(COLUMNS)
+        csv_writer.writerows(generate_fleet(devices, seed, today, prefix))
@@ -1,32 +1,480 @@
-import pandas as pd
 import re
+import csv
+import json
 import sqlite3
 import os
-import ssl
-import smtplib
+import time
+import io
+import mmap
+import contextlib
+from collections import Counter, deque
+from collections.abc import Sequence
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
 from sqlite3 import Error
-from datetime import datetime, date
-from email.message import EmailMessage
-from dotenv import load_dotenv, dotenv_values
+from datetime import datetime, date, timedelta
+from atomic_file import atomic_write
+from mailer import Reminder_Mailer, Send_Result, dispatch_concurrent
+from metrics import PROCESS_METRICS, write_on_exit
+from query_log import Slow_Query_Log
+from result_cache import Result_Cache
+
+# Month first dates such as 1/2/23, 01-02-2023 or 1.2.2023
+US_DATE = re.compile(r"(\d{1,2})([/.-])(\d{1,2})\2(\d{4}|\d{2})")
+# Year first dates such as 2023-01-02, with an optional time from spreadsheet exports
+ISO_DATE = re.compile(r"(\d{4})([/-])(\d{1,2})\2(\d{1,2})(?:[ T][\d:.]*)?")
+# Dates with a month name such as Jan 2, 2023 or 02-Jan-2023
+NAMED_DATE_FORMATS = ("%b %d, %Y", "%B %d, %Y", "%d %b %Y", "%d-%b-%Y", "%d-%b-%y")
+# Custodian emails accepted by the ADD prompt and by csv imports
+EMAIL_PATTERN = re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b")
+# Size of the byte ranges a large csv import is split into for the checking processes
+CHUNK_BYTES = 8 * 1024 * 1024
+# Cache edits up to this count are spliced in place, larger batches rebuild every column once
+SPLICE_EDITS = 32
+
+
+@lru_cache(maxsize=65536)
+def parse_date(value):
+    """Returns a date in one of the common formats as MM/DD/YYYY, or None if it is not a valid date"""
+
+    # A fleet has a few thousand distinct dates, so almost every row is a cache hit
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+
+    match = US_DATE.fullmatch(value)
+    if match is not None:
+        month, day, year = int(match.group(1)), int(match.group(3)), match.group(4)
+    else:
+        match = ISO_DATE.fullmatch(value)
+        if match is not None:
+            year, month, day = match.group(1), int(match.group(3)), int(match.group(4))
+        else:
+            for date_format in NAMED_DATE_FORMATS:
+                try:
+                    return datetime.strptime(value, date_format).strftime("%m/%d/%Y")
+                except ValueError:
+                    pass
+            return None
+
+    # Two digit years follow strptime: 69-99 are 1969-1999, 00-68 are 2000-2068
+    if len(year) == 2:
+        year = int(year) + (1900 if int(year) >= 69 else 2000)
+    else:
+        year = int(year)
+    try:
+        date(year, month, day)
+    except ValueError:
+        return None
+    return "%02d/%02d/%04d" % (month, day, year)
+
+
+def check_row(row, columns, today):
+    """Returns a csv row with its dates normalized, and the reason it is rejected or None if it is valid"""
+
+    if len(row) != len(columns):
+        return row, "has %d fields, expected %d" % (len(row), len(columns))
+
+    row = list(row)
+    if (
+        "property_number" in columns
+        and not (row[columns["property_number"]] or "").strip()
+    ):
+        return row, "missing property_number"
+
+    for column in ("cal_date", "cal_due"):
+        if column in columns:
+            i = columns[column]
+            normalized = parse_date(row[i])
+            if normalized is None:
+                return row, "invalid %s %r" % (column, row[i])
+            row[i] = normalized
+
+    # Calibrations cannot be in the future, as the ADD prompt checks. today is
+    # written as date.today().strftime("%Y%m/%d") so it compares as a string
+    if "cal_date" in columns:
+        cal_date = row[columns["cal_date"]]
+        if cal_date[6:] + cal_date[:5] > today:
+            return row, "cal_date %s is in the future" % cal_date
+
+    if "custodian_email" in columns:
+        i = columns["custodian_email"]
+        email = (row[i] or "").strip()
+        if not EMAIL_PATTERN.match(email):
+            return row, "invalid custodian_email %r" % row[i]
+        row[i] = email
+
+    return row, None
+
+
+def csv_chunks(file_name, chunk_size=CHUNK_BYTES):
+    """Returns the (start, end, lines before) byte ranges of about chunk_size that split the rows of a csv file after its header"""
+
+    chunks = []
+    with open(file_name, "rb") as csv_file:
+        size = os.fstat(csv_file.fileno()).st_size
+        if size == 0:
+            return chunks
+
+        # Mapped rather than read, so a feed of several GB is never held in memory
+        with mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = target = lines = 0
+            while start < size:
+                # A row only ends at a newline after an even number of quotes, so quoted newlines stay inside their row
+                quotes = data[start:target].count(b'"')
+                position = target
+                while True:
+                    newline = data.find(b"\n", position)
+                    if newline == -1:
+                        end = size
+                        break
+                    quotes += data[position:newline].count(b'"')
+                    if quotes % 2 == 0:
+                        end = newline + 1
+                        break
+                    position = newline + 1
+
+                # The first range is the header
+                if start > 0:
+                    chunks.append((start, end, lines))
+                lines += data[start:end].count(b"\n")
+                start = end
+                target = min(start + chunk_size, size)
+
+    return chunks
+
+
+def check_csv_chunk(file_name, start, end, lines, columns, today):
+    """Returns the line numbers and rows of the valid rows and the rejected (line number, row, reason) rows of a byte range of a csv file"""
+
+    with open(file_name, "rb") as csv_file:
+        csv_file.seek(start)
+        data = csv_file.read(end - start)
+
+    # Line numbers and row tuples are unpickled by the writer several times faster than a list of pairs
+    line_numbers = array("l")
+    rows = []
+    rejects = []
+    # Decoded like the text file of a serial import
+    csv_reader = csv.reader(io.TextIOWrapper(io.BytesIO(data), newline=""))
+    for row in csv_reader:
+        row, reason = check_row(
+            tuple(None if value == "" else value for value in row), columns, today
+        )
+        if reason is None:
+            line_numbers.append(lines + csv_reader.line_num)
+            rows.append(tuple(row))
+        else:
+            rejects.append((lines + csv_reader.line_num, row, reason))
+    return line_numbers, rows, rejects
+
+
+class Category_Column:
+    """A cached column whose distinct values are stored once, with a 4 byte code for every row"""
+
+    __slots__ = ("values", "codes", "lookup")
+
+    def __init__(self):
+        """Initiates Category_Column"""
+
+        self.values = []
+        self.codes = array("I")
+        self.lookup = {}
+
+    def encode(self, value):
+        """Returns the code of a value, adding the value if it is new"""
+
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decoded(self):
+        """Returns an iterator over the values of every row"""
+
+        return map(self.values.__getitem__, self.codes)
+
+
+class Device_Rows(Sequence):
+    """A read-only list of the cached devices, built as tuples from the columns of a Device_Cache when read"""
+
+    def __init__(self, cache):
+        """Initiates Device_Rows"""
+
+        self.cache = cache
+
+    def __len__(self):
+        return len(self.cache.property_numbers)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.cache.row(j) for j in range(*i.indices(len(self)))]
+        return self.cache.row(i)
+
+    def __iter__(self):
+        return zip(
+            self.cache.property_numbers,
+            *(column.decoded() for column in self.cache.columns),
+        )
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, Device_Rows)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class Device_Cache:
+    """An in-memory copy of the devices table kept sorted by property number, stored by column"""
+
+    def __init__(self):
+        """Initiates Device_Cache"""
+
+        # The property numbers are the key column, devices is a view of every column
+        self.property_numbers = []
+        self.columns = []
+        self.devices = Device_Rows(self)
+        # Property number to its number of cached rows, for lookups without a search
+        self.index = Counter()
+
+    def __contains__(self, property_number):
+        """Checks if a property number is in the cache by its index"""
+
+        return property_number in self.index
+
+    def count(self, property_numbers, step):
+        """Adds step to the index count of every property number, dropping the ones that reach zero"""
+
+        index = self.index
+        for property_number in property_numbers:
+            total = index[property_number] + step
+            if total:
+                index[property_number] = total
+            else:
+                del index[property_number]
+
+    def __len__(self):
+        """Returns the number of cached devices"""
+
+        return len(self.property_numbers)
+
+    def row(self, i):
+        """Returns the cached device at position i as a tuple"""
+
+        return (self.property_numbers[i],) + tuple(
+            column.values[column.codes[i]] for column in self.columns
+        )
+
+    def splice(self, start, end, rows):
+        """Replaces the cached devices from position start to end with rows"""
+
+        self.property_numbers[start:end] = [row[0] for row in rows]
+        for i, column in enumerate(self.columns, 1):
+            column.codes[start:end] = array(
+                "I", [column.encode(row[i]) for row in rows]
+            )
+
+    def load(self, rows):
+        """Replaces the cache content with rows already sorted by property number, NULL first as SQLite sorts them"""
+
+        self.property_numbers.clear()
+        self.columns = []
+        for row in rows:
+            if not self.columns:
+                self.columns = [Category_Column() for _ in row[1:]]
+            self.property_numbers.append(row[0])
+            for column, value in zip(self.columns, row[1:]):
+                column.codes.append(column.encode(value))
+        self.index = Counter(self.property_numbers)
+
+        return self.devices
+
+    def merge(self, property_numbers, rows):
+        """Removes the cached rows of many property numbers and inserts rows at their sorted positions in one pass"""
+
+        # NULL property numbers cannot be compared, they stay in front of the others and out of the searches
+        nulls = self.index.get(None, 0)
+        rows = [row for row in rows if row[0] is None] + sorted(
+            (row for row in rows if row[0] is not None), key=lambda row: row[0]
+        )
+        if rows and not self.columns:
+            self.columns = [Category_Column() for _ in rows[0][1:]]
+
+        # Every edit replaces the cached devices from start to end with the sorted rows from first to last
+        keys = self.property_numbers
+        edits = []
+        for property_number in set(property_numbers):
+            if property_number is None:
+                start, end = 0, nulls
+            else:
+                start = bisect_left(keys, property_number, nulls)
+                end = bisect_right(keys, property_number, start)
+            if start < end:
+                edits.append((start, end, 0, 0))
+        position = 0
+        for i, row in enumerate(rows):
+            if row[0] is None:
+                position = nulls
+            else:
+                position = bisect_right(keys, row[0], max(position, nulls))
+            if edits and edits[-1][:2] == (position, position):
+                edits[-1] = (position, position, edits[-1][2], i + 1)
+            else:
+                edits.append((position, position, i, i + 1))
+        edits.sort(key=lambda edit: edit[:2])
+
+        self.count((key for start, end, _, _ in edits for key in keys[start:end]), -1)
+        self.count((row[0] for row in rows), 1)
+
+        # A few edits are cheaper to splice in place, last first so the earlier positions still hold
+        if len(edits) <= SPLICE_EDITS:
+            for start, end, first, last in reversed(edits):
+                self.splice(start, end, rows[first:last])
+            return
+
+        # Each run keeps the old devices from start to end followed by the new rows from first to last
+        runs = []
+        start = 0
+        for end, after, first, last in edits:
+            runs.append((start, end, first, last))
+            start = after
+        runs.append((start, len(keys), 0, 0))
+
+        merged = []
+        new = [row[0] for row in rows]
+        for start, end, first, last in runs:
+            merged += keys[start:end]
+            merged += new[first:last]
+        keys[:] = merged
+        for i, column in enumerate(self.columns, 1):
+            codes = array("I")
+            new = array("I", [column.encode(row[i]) for row in rows])
+            for start, end, first, last in runs:
+                codes += column.codes[start:end]
+                codes += new[first:last]
+            column.codes = codes
+
+    def replace(self, property_number, rows=()):
+        """Replaces the cached rows of one property number, removing it if rows is empty"""
+
+        self.merge([property_number], rows)
+
+    def add(self, row):
+        """Inserts a row at its sorted position"""
+
+        self.merge((), [row])
+
+    def remove(self, property_number):
+        """Removes every cached row of a property number"""
+
+        self.merge([property_number], ())
 
 
 class Cal_Database:
     """A program that manages a device calibration database."""
 
-    def __init__(self):
+    # Shortcuts accepted wherever a column name is prompted
+    column_names = {
+        "pn": "property_number",
+        "mn": "manufacturer",
+        "des": "description",
+        "date": "cal_date",
+        "due": "cal_due",
+        "email": "custodian_email",
+    }
+
+    email_pattern = EMAIL_PATTERN
+
+    # Whether the SQLite library has FTS5, looked up once
+    fts5 = None
+
+    # Commands of the event loop, other input is recorded as invalid by the metrics
+    commands = (
+        "add",
+        "append",
+        "delete",
+        "digest",
+        "display",
+        "help",
+        "list",
+        "merge",
+        "page",
+        "quit",
+        "rebuild",
+        "remind",
+        "replace",
+        "save",
+        "search",
+        "select",
+        "stats",
+        "status",
+        "update",
+    )
+
+    def __init__(
+        self,
+        db_file="device_database.db",
+        load_devices=True,
+        check_same_thread=True,
+        metrics=None,
+    ):
         """Initiates Cal_Database"""
 
-        self.conn = sqlite3.connect("device_database.db")
-        self.cur = self.conn.cursor()
-        self.devices = []
-        self.property_numbers = []
+        self.metrics = metrics
+        self.query_log = None
+        self.conn = sqlite3.connect(db_file, check_same_thread=check_same_thread)
+        self.cur = self.cursor()
+        self.cache = Device_Cache()
+        self.devices = self.cache.devices
+        self.property_numbers = self.cache.property_numbers
         self.emails = []
+        self.changed_pns = []
         self.create_cal_table()
-        self.generate_devices_list()
-        self.generate_property_list()
-        # self.remind()
+        self.create_page_indexes()
+        if load_devices:
+            self.generate_devices_list()
+        from dotenv import load_dotenv
+
         load_dotenv()
-        
+
+        # RESULT_CACHE_MB limits the rows of repeated SELECTs and DISPLAYs kept until the next change, 0 turns it off
+        self.result_cache = Result_Cache(
+            self.conn, int(float(os.getenv("RESULT_CACHE_MB", "64")) * 1024 * 1024)
+        )
+
+        # SLOW_QUERY_LOG names the log of statements slower than SLOW_QUERY_MS and SELECT_TIMEOUT
+        # cancels ad-hoc SELECTs after that many seconds
+        if os.getenv("SLOW_QUERY_LOG") or os.getenv("SELECT_TIMEOUT"):
+            self.query_log = Slow_Query_Log(
+                self.conn,
+                os.getenv("SLOW_QUERY_LOG"),
+                float(os.getenv("SLOW_QUERY_MS", "100")) / 1000,
+                float(os.getenv("SELECT_TIMEOUT", "0")),
+            )
+
+        # METRICS_FILE in the .env file turns the metrics on and names the file written on exit
+        if self.metrics is None and os.getenv("METRICS_FILE"):
+            self.enable_metrics(PROCESS_METRICS, os.getenv("METRICS_FILE"))
+
+    def cursor(self):
+        """Opens a cursor, recording its statements when the metrics are on"""
+
+        if self.metrics is None:
+            return self.conn.cursor()
+        return self.metrics.cursor(self.conn)
+
+    def enable_metrics(self, metrics, file_name=None):
+        """Starts recording commands, SQL statements and emails, written to file_name in Prometheus format on exit"""
+
+        self.metrics = metrics
+        self.cur.close()
+        self.cur = self.cursor()
+        if file_name:
+            write_on_exit(metrics, file_name)
 
     def sql_execute(self, sqlquery="", message=""):
         """Accepts SQLite string command then executes"""
@@ -57,38 +505,525 @@ class Cal_Database:
             + " (property_number TEXT UNIQUE, manufacturer TEXT, description TEXT, cal_date TEXT, cal_due TEXT, custodian_email TEXT)"
         )
         self.cur.execute(sqlquery)
+        self.create_indexes(table_name)
+        self.create_due_table(table_name)
+        self.create_search_table(table_name)
         self.conn.commit()
         return sqlquery
 
+    def date_key(self, column="cal_due"):
+        """Returns the SQL expression that turns a MM/DD/YYYY column into a sortable YYYY-MM-DD key"""
+
+        return (
+            "(substr("
+            + column
+            + ", 7, 4) || '-' || substr("
+            + column
+            + ", 1, 2) || '-' || substr("
+            + column
+            + ", 4, 2))"
+        )
+
+    def create_indexes(self, table_name="devices"):
+        """Indexes property numbers and the YYYY-MM-DD keys of cal_date and cal_due, migrating existing dates the first time"""
+
+        # Tables written by pandas lose their UNIQUE constraint, so the property number lookup gets its own index
+        if not self.has_unique_index(table_name):
+            sqlquery = (
+                "CREATE INDEX IF NOT EXISTS "
+                + table_name
+                + "_property_number ON "
+                + table_name
+                + " (property_number)"
+            )
+            self.cur.execute(sqlquery)
+
+        for column in ("cal_date", "cal_due"):
+            index_name = table_name + "_" + column + "_key"
+            sqlquery = (
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name = ?"
+            )
+            if self.cur.execute(sqlquery, (index_name,)).fetchone() is None:
+                self.normalize_dates(table_name, column)
+                sqlquery = (
+                    "CREATE INDEX IF NOT EXISTS "
+                    + index_name
+                    + " ON "
+                    + table_name
+                    + " "
+                    + self.date_key(column)
+                )
+                self.cur.execute(sqlquery)
+
+    def create_due_table(self, table_name="devices"):
+        """Creates the due table that triggers keep in step with a table, filling it the first time"""
+
+        sqlquery = "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name = ?"
+        if self.cur.execute(sqlquery, (table_name + "_due_insert",)).fetchone() is None:
+            self.rebuild_due_table(table_name)
+
+    def create_due_triggers(self, table_name="devices"):
+        """Creates the triggers that copy every insert, update and delete of a table into its due table"""
+
+        due_table = table_name + "_due"
+        insert = (
+            "INSERT INTO "
+            + due_table
+            + " (property_number, custodian_email, due_key) VALUES (new.property_number, new.custodian_email, "
+            + self.date_key("new.cal_due")
+            + ");"
+        )
+        # Tables that lost their UNIQUE constraint may repeat a property number, so one matching row is removed
+        delete = (
+            "DELETE FROM "
+            + due_table
+            + " WHERE rowid = (SELECT rowid FROM "
+            + due_table
+            + " WHERE property_number IS old.property_number AND custodian_email IS old.custodian_email AND due_key IS "
+            + self.date_key("old.cal_due")
+            + " LIMIT 1);"
+        )
+
+        self.cur.execute(
+            "CREATE TRIGGER IF NOT EXISTS "
+            + due_table
+            + "_insert AFTER INSERT ON "
+            + table_name
+            + " BEGIN "
+            + insert
+            + " END"
+        )
+        self.cur.execute(
+            "CREATE TRIGGER IF NOT EXISTS "
+            + due_table
+            + "_update AFTER UPDATE OF property_number, cal_due, custodian_email ON "
+            + table_name
+            + " BEGIN "
+            + delete
+            + " "
+            + insert
+            + " END"
+        )
+        self.cur.execute(
+            "CREATE TRIGGER IF NOT EXISTS "
+            + due_table
+            + "_delete AFTER DELETE ON "
+            + table_name
+            + " BEGIN "
+            + delete
+            + " END"
+        )
+
+    def drop_triggers(self, table_name="devices", derived="due"):
+        """Drops the triggers of the due or search table so a bulk change does not update it row by row, returning whether there were any"""
+
+        prefix = table_name + "_" + derived + "_"
+        sqlquery = "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name = ?"
+        found = self.cur.execute(sqlquery, (prefix + "insert",)).fetchone()
+        for action in ("insert", "update", "delete"):
+            self.cur.execute("DROP TRIGGER IF EXISTS " + prefix + action)
+        return found is not None
+
+    @contextlib.contextmanager
+    def bulk_insert(self, table_name="devices"):
+        """Suspends the due and search table triggers in a transaction that only inserts, copying the new rows to them in one statement each at the end"""
+
+        last_rowid = self.last_rowid(table_name)
+        due = self.drop_triggers(table_name, "due")
+        search = self.drop_triggers(table_name, "search")
+        yield
+        if due:
+            self.cur.execute(
+                "INSERT INTO "
+                + table_name
+                + "_due SELECT property_number, custodian_email, "
+                + self.date_key("cal_due")
+                + " FROM "
+                + table_name
+                + " WHERE rowid > ?",
+                (last_rowid,),
+            )
+            self.create_due_triggers(table_name)
+        if search:
+            self.cur.execute(
+                "INSERT INTO "
+                + table_name
+                + "_search (rowid, manufacturer, description) SELECT rowid, manufacturer, description FROM "
+                + table_name
+                + " WHERE rowid > ?",
+                (last_rowid,),
+            )
+            self.create_search_triggers(table_name)
+
+    def rebuild_due_table(self, table_name="devices"):
+        """Refills the due table from its table in one statement and recreates its triggers, used after bulk changes"""
+
+        due_table = table_name + "_due"
+        self.drop_triggers(table_name, "due")
+        self.cur.execute(
+            "CREATE TABLE IF NOT EXISTS "
+            + due_table
+            + " (property_number TEXT, custodian_email TEXT, due_key TEXT)"
+        )
+        # Indexes are built once after the rows are copied instead of row by row
+        self.cur.execute("DROP INDEX IF EXISTS " + due_table + "_key")
+        self.cur.execute("DELETE FROM " + due_table)
+        self.cur.execute(
+            "INSERT INTO "
+            + due_table
+            + " SELECT property_number, custodian_email, "
+            + self.date_key("cal_due")
+            + " FROM "
+            + table_name
+        )
+        rows = self.cur.rowcount
+
+        # The index covers the due date lookups and finds the row a trigger deletes
+        self.cur.execute(
+            "CREATE INDEX "
+            + due_table
+            + "_key ON "
+            + due_table
+            + " (due_key, custodian_email, property_number)"
+        )
+        self.create_due_triggers(table_name)
+        return rows
+
+    def check_due_table(self, table_name="devices"):
+        """Returns the number of property number, custodian and due date combinations whose count differs between a table and its due table"""
+
+        table = (
+            "SELECT property_number, custodian_email, "
+            + self.date_key("cal_due")
+            + ", COUNT(*) FROM "
+            + table_name
+            + " GROUP BY 1, 2, 3"
+        )
+        due_table = (
+            "SELECT property_number, custodian_email, due_key, COUNT(*) FROM "
+            + table_name
+            + "_due GROUP BY 1, 2, 3"
+        )
+        sqlquery = (
+            "SELECT (SELECT COUNT(*) FROM ("
+            + table
+            + " EXCEPT "
+            + due_table
+            + ")) + (SELECT COUNT(*) FROM ("
+            + due_table
+            + " EXCEPT "
+            + table
+            + "))"
+        )
+        return self.cur.execute(sqlquery).fetchone()[0]
+
+    def has_fts5(self):
+        """Checks if the SQLite library was built with the FTS5 full-text search extension"""
+
+        if Cal_Database.fts5 is None:
+            options = [row[0] for row in self.cur.execute("PRAGMA compile_options")]
+            Cal_Database.fts5 = "ENABLE_FTS5" in options
+        return Cal_Database.fts5
+
+    def create_search_table(self, table_name="devices"):
+        """Creates the full-text index of manufacturers and descriptions that triggers keep in step with a table, building it the first time"""
+
+        if not self.has_fts5():
+            return
+
+        sqlquery = "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name = ?"
+        if (
+            self.cur.execute(sqlquery, (table_name + "_search_insert",)).fetchone()
+            is None
+        ):
+            self.rebuild_search_table(table_name)
+
+    def create_search_triggers(self, table_name="devices"):
+        """Creates the triggers that add and remove the words of every changed device in the search table"""
+
+        search_table = table_name + "_search"
+        insert = (
+            "INSERT INTO "
+            + search_table
+            + " (rowid, manufacturer, description) VALUES (new.rowid, new.manufacturer, new.description);"
+        )
+        # The search table holds no copy of the text, so removing a row needs the old values
+        delete = (
+            "INSERT INTO "
+            + search_table
+            + " ("
+            + search_table
+            + ", rowid, manufacturer, description) VALUES ('delete', old.rowid, old.manufacturer, old.description);"
+        )
+
+        self.cur.execute(
+            "CREATE TRIGGER IF NOT EXISTS "
+            + search_table
+            + "_insert AFTER INSERT ON "
+            + table_name
+            + " BEGIN "
+            + insert
+            + " END"
+        )
+        self.cur.execute(
+            "CREATE TRIGGER IF NOT EXISTS "
+            + search_table
+            + "_update AFTER UPDATE OF manufacturer, description ON "
+            + table_name
+            + " BEGIN "
+            + delete
+            + " "
+            + insert
+            + " END"
+        )
+        self.cur.execute(
+            "CREATE TRIGGER IF NOT EXISTS "
+            + search_table
+            + "_delete AFTER DELETE ON "
+            + table_name
+            + " BEGIN "
+            + delete
+            + " END"
+        )
+
+    def rebuild_search_table(self, table_name="devices"):
+        """Rebuilds the full-text index from its table in one pass and recreates its triggers, used after bulk changes"""
+
+        search_table = table_name + "_search"
+        self.drop_triggers(table_name, "search")
+        # An external content table indexes the words and reads the text from the table itself
+        self.cur.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS "
+            + search_table
+            + " USING fts5(manufacturer, description, content="
+            + table_name
+            + ", content_rowid=rowid, prefix='2 3')"
+        )
+        self.cur.execute(
+            "INSERT INTO " + search_table + " (" + search_table + ") VALUES ('rebuild')"
+        )
+        self.create_search_triggers(table_name)
+
+    def search_devices(self, terms, limit=100, table_name="devices", ranked=False):
+        """Returns the devices whose manufacturer or description has words starting with every search term, best matches first, each after its rank if ranked"""
+
+        words = re.findall(r"\w+", terms)
+        if not words:
+            return []
+
+        sqlquery = "SELECT name FROM sqlite_master WHERE name = ?"
+        if self.cur.execute(sqlquery, (table_name + "_search",)).fetchone():
+            # Each word is quoted so it is matched as a prefix and never read as FTS5 syntax
+            # The rank is the negated bm25 score, lower is better
+            sqlquery = (
+                "SELECT "
+                + ("rank, " if ranked else "")
+                + table_name
+                + ".* FROM "
+                + table_name
+                + "_search JOIN "
+                + table_name
+                + " ON "
+                + table_name
+                + ".rowid = "
+                + table_name
+                + "_search.rowid WHERE "
+                + table_name
+                + "_search MATCH ? ORDER BY rank LIMIT ?"
+            )
+            parameters = (" ".join('"%s"*' % word for word in words), limit)
+        else:
+            # SQLite builds without FTS5 scan the table instead, unranked
+            sqlquery = (
+                "SELECT "
+                + ("0.0, " if ranked else "")
+                + "* FROM "
+                + table_name
+                + " WHERE "
+                + " AND ".join(
+                    "IFNULL(manufacturer, '') || ' ' || IFNULL(description, '') LIKE ?"
+                    for _ in words
+                )
+                + " ORDER BY property_number LIMIT ?"
+            )
+            parameters = ["%" + word + "%" for word in words] + [limit]
+
+        return self.cur.execute(sqlquery, parameters).fetchall()
+
+    def search(self, limit=100):
+        """Finds devices by words of their manufacturer and description, such as "thorlabs power", best matches first. Words may be shortened, e.g. "osc"."""
+
+        try:
+            terms = input("Enter search terms.\n").strip()
+            rows = self.search_devices(terms, limit)
+            print(self.display_column_names())
+            for row in rows:
+                print(row)
+            if len(rows) == limit:
+                print(
+                    "Showing the best %d matches, add words to narrow the search"
+                    % limit
+                )
+            else:
+                print("%d devices found" % len(rows))
+            return rows
+
+        except Error as e:
+            print("Error: " + str(e))
+            return e
+
+    def rebuild(self, table_name="devices"):
+        """Rebuilds the due table used by REMIND and the SEARCH index from the devices table and checks the due table matches"""
+
+        try:
+            rows = self.rebuild_due_table(table_name)
+            if self.has_fts5():
+                self.rebuild_search_table(table_name)
+            self.conn.commit()
+            mismatches = self.check_due_table(table_name)
+            if mismatches:
+                print("Error: %d devices differ from the due table" % mismatches)
+            else:
+                print("Due table and search index rebuilt! (%d devices)" % rows)
+            return mismatches
+
+        except Exception as e:
+            print("Error: " + str(e))
+            return e
+
+    def due_within(self, days=60, table_name="devices"):
+        """Returns the property number, custodian and YYYY-MM-DD due date of the devices due within a number of days, earliest first"""
+
+        due_limit = (date.today() + timedelta(days=days)).isoformat()
+        sqlquery = (
+            "SELECT property_number, custodian_email, due_key FROM "
+            + table_name
+            + "_due WHERE due_key <= ? ORDER BY due_key, custodian_email, property_number"
+        )
+        return self.cur.execute(sqlquery, (due_limit,)).fetchall()
+
+    def has_unique_index(self, table_name="devices"):
+        """Checks if the property numbers of a table are covered by a UNIQUE constraint or index"""
+
+        sqlquery = "PRAGMA index_list(" + table_name + ")"
+        for index in self.cur.execute(sqlquery).fetchall():
+            if index[2]:
+                sqlquery = "PRAGMA index_info(" + index[1] + ")"
+                columns = [row[2] for row in self.cur.execute(sqlquery).fetchall()]
+                if columns == ["property_number"]:
+                    return True
+
+        return False
+
+    def create_unique_index(self, table_name="devices"):
+        """Adds a UNIQUE index on property numbers to tables that lost their constraint, as required by upserts"""
+
+        if not self.has_unique_index(table_name):
+            sqlquery = (
+                "CREATE UNIQUE INDEX "
+                + table_name
+                + "_property_number_unique ON "
+                + table_name
+                + " (property_number)"
+            )
+            self.cur.execute(sqlquery)
+            self.conn.commit()
+
+    def normalize_date(self, value):
+        """Returns a date such as 1/2/23 in the zero-padded MM/DD/YYYY format, or unchanged if it is not a date"""
+
+        normalized = parse_date(value)
+        return value if normalized is None else normalized
+
+    def normalize_dates(self, table_name="devices", column="cal_due", min_rowid=0):
+        """Rewrites dates such as 1/2/2023 into the zero-padded MM/DD/YYYY format the date index relies on"""
+
+        sqlquery = (
+            "SELECT rowid, "
+            + column
+            + " FROM "
+            + table_name
+            + " WHERE rowid > ? AND "
+            + column
+            + " NOT GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]'"
+        )
+        updates = []
+        for rowid, value in self.cur.execute(sqlquery, (min_rowid,)).fetchall():
+            normalized = self.normalize_date(value)
+            # Values that are not dates keep their original text
+            if normalized != value:
+                updates.append((normalized, rowid))
+
+        sqlquery = "UPDATE " + table_name + " SET " + column + " = ? WHERE rowid = ?"
+        self.cur.executemany(sqlquery, updates)
+        return len(updates)
+
     def generate_devices_list(self):
         """Populates a complete device data list from the devices table"""
 
-        self.devices.clear()
         sqlquery = "SELECT * FROM devices ORDER BY property_number"
         device_data = self.cur.execute(sqlquery)
-        for row in device_data:
-            self.devices.append(row)
+        self.cache.load(device_data)
 
         return self.devices
 
     def generate_property_list(self):
         """Populates a property number list from the devices table"""
 
-        self.property_numbers.clear()
-        sqlquery = "SELECT * FROM devices ORDER BY property_number"
-        device_data = self.cur.execute(sqlquery)
-        for row in device_data:
-            self.property_numbers.append(row[0])
+        self.generate_devices_list()
 
         return self.property_numbers
 
+    def last_rowid(self, table_name="devices"):
+        """Returns the largest rowid of a table, 0 if it is empty"""
+
+        sqlquery = "SELECT IFNULL(MAX(rowid), 0) FROM " + table_name
+        return self.cur.execute(sqlquery).fetchone()[0]
+
+    def refresh_device(self, property_number):
+        """Reloads the cached rows of one property number from the devices table"""
+
+        sqlquery = "SELECT * FROM devices WHERE property_number = ? ORDER BY rowid"
+        rows = self.cur.execute(sqlquery, (property_number,)).fetchall()
+        self.cache.replace(property_number, rows)
+
+        return rows
+
+    def refresh_devices(self, property_numbers):
+        """Reloads the cached rows of many property numbers with a single query"""
+
+        property_numbers = set(property_numbers)
+        sqlquery = (
+            "SELECT * FROM devices WHERE property_number IN "
+            + "(SELECT value FROM json_each(?)) ORDER BY property_number, rowid"
+        )
+        found = self.cur.execute(
+            sqlquery, (json.dumps(list(property_numbers)),)
+        ).fetchall()
+        self.cache.merge(property_numbers, found)
+
+        rows = {}
+        for row in found:
+            rows.setdefault(row[0], []).append(row)
+
+        return rows
+
+    def cache_devices_since(self, rowid):
+        """Adds the devices inserted after rowid to the cache"""
+
+        sqlquery = "SELECT * FROM devices WHERE rowid > ? ORDER BY rowid"
+        rows = self.cur.execute(sqlquery, (rowid,)).fetchall()
+        self.cache.merge((), rows)
+
+        return rows
+
     def pn_prompt(self):
         """Prompts users for a property number"""
 
         finished = False
         while not finished:
             prompt = input("Enter device property number.\n").strip()
-            if prompt in self.property_numbers:
+            if prompt in self.cache:
                 finished = True
             else:
                 print("Error: Property number does not exist")
@@ -100,7 +1035,7 @@ class Cal_Database:
         finished = False
         while not finished:
             prompt = input("Enter device property number.\n").strip()
-            if prompt in self.property_numbers:
+            if prompt in self.cache:
                 print("Error: Property number already exists")
             else:
                 finished = True
@@ -117,6 +1052,7 @@ class Cal_Database:
                 date_today = date.today().strftime("%m/%d/%Y")
                 date_today = datetime.strptime(date_today, "%m/%d/%Y").date()
                 if date_entered <= date_today:
+                    prompt = date_entered.strftime("%m/%d/%Y")
                     finished = True
                 else:
                     print("Error: Date exceeds current date")
@@ -131,7 +1067,8 @@ class Cal_Database:
         while not finished:
             try:
                 prompt = input("Enter calibration due date (MM/DD/YYYY).\n").strip()
-                datetime.strptime(prompt, "%m/%d/%Y").date()
+                date_entered = datetime.strptime(prompt, "%m/%d/%Y").date()
+                prompt = date_entered.strftime("%m/%d/%Y")
                 finished = True
             except ValueError or TypeError as e:
                 print("Error: " + str(e))
@@ -141,11 +1078,10 @@ class Cal_Database:
         """Prompts user for an email address"""
 
         finished = False
-        email_pattern = r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b"
 
         while not finished:
             prompt = input("Enter custodian email address.\n").strip()
-            if re.match(email_pattern, prompt):
+            if self.email_pattern.match(prompt):
                 finished = True
             else:
                 print("Error: Invalid email format")
@@ -154,14 +1090,7 @@ class Cal_Database:
     def column_prompt(self):
         """Prompts user for the table column"""
 
-        column_dict = {
-            "pn": "property_number",
-            "mn": "manufacturer",
-            "des": "description",
-            "date": "cal_date",
-            "due": "cal_due",
-            "email": "custodian_email",
-        }
+        column_dict = self.column_names
 
         finished = False
         while not finished:
@@ -175,10 +1104,11 @@ class Cal_Database:
                 print("Error: Column name does not exist")
         return prompt
 
-    def display_column_names(self):
+    def display_column_names(self, table_name="devices"):
         """Displays the column names into the terminal"""
 
-        sqlquery = "SELECT * FROM devices"
+        # LIMIT 0 finishes the statement at once, so it holds no read lock afterwards
+        sqlquery = "SELECT * FROM " + table_name + " LIMIT 0"
         column = self.cur.execute(sqlquery)
         column_names = tuple(map(lambda x: x[0], column.description))
         return column_names
@@ -191,7 +1121,7 @@ class Cal_Database:
             print(self.display_column_names())
 
             sqlquery = "SELECT * FROM devices ORDER BY " + column_prompt
-            device_data = self.cur.execute(sqlquery)
+            device_data = self.result_cache.execute(self.cur, sqlquery)
             for row in device_data:
                 print(row)
 
@@ -199,15 +1129,218 @@ class Cal_Database:
             print("Error: " + str(e))
             return e
 
+    def sort_key(self, column="property_number"):
+        """Returns the SQL expression pages are sorted by, dates by their YYYY-MM-DD key and NULL as an empty string"""
+
+        if column == "property_number":
+            return column
+        if column in ("cal_date", "cal_due"):
+            return "IFNULL(" + self.date_key(column) + ", '')"
+        return "IFNULL(" + column + ", '')"
+
+    def create_page_indexes(self, table_name="devices"):
+        """Indexes every sortable column together with property_number so pages are read straight from an index"""
+
+        for column in (
+            "manufacturer",
+            "description",
+            "cal_date",
+            "cal_due",
+            "custodian_email",
+        ):
+            sqlquery = (
+                "CREATE INDEX IF NOT EXISTS "
+                + table_name
+                + "_"
+                + column
+                + "_page ON "
+                + table_name
+                + " ("
+                + self.sort_key(column)
+                + ", property_number)"
+            )
+            self.cur.execute(sqlquery)
+        self.conn.commit()
+
+    def display_page(
+        self,
+        column="property_number",
+        after=None,
+        page_size=20,
+        columns=None,
+        custodian=None,
+        status=None,
+        days=60,
+        table_name="devices",
+    ):
+        """Returns one page of rows sorted by a column and the position to pass as after for the next page"""
+
+        data = self.page_data(
+            column, after, page_size, columns, custodian, status, days, table_name
+        )
+        rows = [row[:-2] for row in data]
+        after = tuple(data[-1][-2:]) if len(data) == page_size else None
+        return rows, after
+
+    def sorted_pages(
+        self,
+        column="property_number",
+        page_size=1000,
+        columns=None,
+        custodian=None,
+        status=None,
+        days=60,
+        table_name="devices",
+    ):
+        """Yields every row sorted by a column in pages of (sort value, property number, row), the keys sites are merged by"""
+
+        after = None
+        while True:
+            data = self.page_data(
+                column, after, page_size, columns, custodian, status, days, table_name
+            )
+            yield [(row[-2], row[-1], row[:-2]) for row in data]
+            if len(data) < page_size:
+                return
+            after = tuple(data[-1][-2:])
+
+    def page_data(
+        self,
+        column="property_number",
+        after=None,
+        page_size=20,
+        columns=None,
+        custodian=None,
+        status=None,
+        days=60,
+        table_name="devices",
+    ):
+        """Returns one page of rows sorted by a column, each followed by its sort value and property number"""
+
+        table_columns = self.display_column_names(table_name)
+        for name in [column] + list(columns or []):
+            if name not in table_columns:
+                raise ValueError("Column " + name + " does not exist")
+
+        sort_key = self.sort_key(column)
+        conditions = []
+        parameters = []
+
+        if custodian:
+            # Matches the custodian_email page index expression so the filter is an index lookup
+            conditions.append(self.sort_key("custodian_email") + " = ?")
+            parameters.append(custodian)
+
+        if status:
+            # Written on the same expression as the cal_due page index so it can serve the filter.
+            # When pages follow another column, the unary + keeps SQLite walking that column's index instead
+            due_key = self.sort_key("cal_due")
+            if column != "cal_due":
+                due_key = "+" + due_key
+            expression, (today, due_limit) = self.status_expression(
+                days, due_key=due_key
+            )
+            # The range reads the matching part of the index, the shared status expression then drops invalid dates
+            if status == "expired":
+                conditions.append(due_key + " < ?")
+                parameters.append(today)
+            elif status == "due-soon":
+                conditions.append(due_key + " BETWEEN ? AND ?")
+                parameters.extend([today, due_limit])
+            elif status == "ok":
+                conditions.append(due_key + " > ?")
+                parameters.append(due_limit)
+            else:
+                raise ValueError("Status must be expired, due-soon or ok")
+            conditions.append(expression + " = ?")
+            parameters.extend([today, due_limit, status])
+
+        # Keyset pagination: continue after the last (sort value, property number) instead of using OFFSET
+        if after is not None:
+            if column == "property_number":
+                conditions.append("property_number > ?")
+                parameters.append(after[1])
+            else:
+                conditions.append(
+                    sort_key + " >= ? AND (" + sort_key + ", property_number) > (?, ?)"
+                )
+                parameters.extend([after[0], after[0], after[1]])
+
+        sqlquery = (
+            "SELECT "
+            + ", ".join(columns or table_columns)
+            + ", "
+            + sort_key
+            + ", property_number FROM "
+            + table_name
+        )
+        if conditions:
+            sqlquery += " WHERE " + " AND ".join(conditions)
+        sqlquery += " ORDER BY " + sort_key + ", property_number LIMIT ?"
+        parameters.append(page_size)
+
+        return self.cur.execute(sqlquery, parameters).fetchall()
+
+    def display_paged(self, page_size=20):
+        """Displays the table one page at a time with a choice of columns and filters by custodian or due status"""
+
+        try:
+            column = self.column_prompt()
+            columns = input(
+                "Enter the columns to show separated by commas, or press Enter for all.\n"
+            ).strip()
+            columns = [
+                self.column_names.get(i.strip().lower(), i.strip().lower())
+                for i in columns.split(",")
+                if i.strip()
+            ]
+            custodian = input(
+                "Enter a custodian email to filter by, or press Enter for all.\n"
+            ).strip()
+            status = (
+                input(
+                    "Enter a due status to filter by (expired, due-soon, ok), or press Enter for all.\n"
+                )
+                .strip()
+                .lower()
+            )
+
+            print(tuple(columns) if columns else self.display_column_names())
+            after = None
+            while True:
+                rows, after = self.display_page(
+                    column, after, page_size, columns, custodian, status
+                )
+                for row in rows:
+                    print(row)
+
+                if after is None:
+                    break
+                prompt = input("Press Enter for the next page or Q to stop.\n")
+                if prompt.strip().lower() == "q":
+                    break
+
+        except (Error, ValueError) as e:
+            print("Error: " + str(e))
+            return e
+
     def select(self):
         """Displays data using advanced SQL commands. Most useful for advanced SELECT searches. Refer to sqlite3 documentation for proper syntax."""
 
         try:
             sqlquery = input("Enter sql query\n").strip()
-            data = self.cur.execute(sqlquery)
-            for row in data:
-                print(row)
+            verb = sqlquery.split(None, 1)[0].upper() if sqlquery else ""
+            budget = contextlib.nullcontext()
+            if self.query_log is not None and verb in ("SELECT", "WITH", "VALUES"):
+                budget = self.query_log.time_budget()
+
+            with budget:
+                data = self.result_cache.execute(self.cur, sqlquery)
+                for row in data:
+                    print(row)
         except Error as e:
+            if str(e) == "interrupted":
+                e = Error("Query cancelled after %g seconds" % self.query_log.budget)
             print("Error: " + str(e))
             return e
 
@@ -237,12 +1370,343 @@ class Cal_Database:
 
         return sqlquery, new_device, message
 
-    def append(self, table_name="devices"):
+    def read_csv_batches(self, csv_reader, batch_size=10000):
+        """Yields lists of up to batch_size (line number, row) pairs from a csv reader"""
+
+        batch = []
+        for row in csv_reader:
+            # Empty fields are stored as NULL like pandas did
+            batch.append(
+                (
+                    csv_reader.line_num,
+                    tuple(None if value == "" else value for value in row),
+                )
+            )
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def validate_batch(self, batch, columns, reject_file=None):
+        """Returns the valid rows of a batch as (line number, row) pairs, reporting and saving the rejected ones"""
+
+        today = date.today().strftime("%Y%m/%d")
+        rows = []
+        rejects = []
+        for line_number, row in batch:
+            row, reason = check_row(row, columns, today)
+            if reason is None:
+                rows.append((line_number, row))
+            else:
+                rejects.append((line_number, row, reason))
+        self.reject_rows(rejects, list(columns), reject_file)
+        return rows, len(rejects)
+
+    def import_workers(self, file_name):
+        """Returns how many processes check a csv import, IMPORT_WORKERS or one per core for files of PARALLEL_IMPORT_MB or more"""
+
+        # Starting the processes costs more than checking a small file
+        if os.path.getsize(file_name) < float(os.getenv("PARALLEL_IMPORT_MB", "64")) * (
+            1024 * 1024
+        ):
+            return 1
+        return int(os.getenv("IMPORT_WORKERS", "0")) or os.cpu_count() or 1
+
+    def validated_batches(
+        self,
+        csv_reader,
+        file_name,
+        columns,
+        batch_size=10000,
+        reject_file=None,
+        workers=None,
+    ):
+        """Yields the valid (line number, row) pairs of a csv file in batches with the number of rows rejected, checked by a pool of processes when there are several workers"""
+
+        if workers is None:
+            workers = self.import_workers(file_name)
+
+        if workers <= 1:
+            for batch in self.read_csv_batches(csv_reader, batch_size):
+                yield self.validate_batch(batch, columns, reject_file)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        today = date.today().strftime("%Y%m/%d")
+        executor = ProcessPoolExecutor(workers)
+        try:
+            # Only a few ranges are checked ahead of the writer, so memory does not grow with the file
+            pending = deque()
+            for chunk in csv_chunks(file_name, CHUNK_BYTES):
+                pending.append(
+                    executor.submit(check_csv_chunk, file_name, *chunk, columns, today)
+                )
+                if len(pending) < 2 * workers:
+                    continue
+                yield from self.chunk_batches(
+                    pending.popleft(), columns, batch_size, reject_file
+                )
+            while pending:
+                yield from self.chunk_batches(
+                    pending.popleft(), columns, batch_size, reject_file
+                )
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def chunk_batches(self, future, columns, batch_size, reject_file):
+        """Yields the valid rows of a checked byte range in batches after saving its rejected rows"""
+
+        line_numbers, rows, rejects = future.result()
+        self.reject_rows(rejects, list(columns), reject_file)
+        invalid = len(rejects)
+        for i in range(0, len(rows), batch_size):
+            yield list(
+                zip(line_numbers[i : i + batch_size], rows[i : i + batch_size])
+            ), invalid
+            invalid = 0
+        if invalid:
+            yield [], invalid
+
+    def reject_rows(self, rejects, header, reject_file=None):
+        """Prints rejected (line number, row, reason) rows and appends them to a reject csv file"""
+
+        for line_number, _, reason in rejects:
+            print("Error: line %d: %s" % (line_number, reason))
+
+        if not reject_file or not rejects:
+            return
+
+        new_file = not os.path.exists(reject_file)
+        with open(reject_file, "a", newline="") as csv_file:
+            csv_writer = csv.writer(csv_file)
+            if new_file:
+                csv_writer.writerow(["line", "reason"] + header)
+            csv_writer.writerows(
+                [line_number, reason]
+                + ["" if value is None else value for value in row]
+                for line_number, row, reason in rejects
+            )
+
+    def reject_file_name(self, file_name):
+        """Returns the reject csv file of an imported csv file, such as additional_data_rejects.csv"""
+
+        return os.path.splitext(file_name)[0] + "_rejects.csv"
+
+    def import_csv(
+        self,
+        file_name,
+        table_name="devices",
+        replace=False,
+        batch_size=10000,
+        progress=True,
+        reject_file=None,
+        workers=None,
+    ):
+        """Streams a csv file into a table in batches inside one transaction, saving the rows that are invalid or cannot be inserted to a reject file"""
+
+        with open(file_name, newline="") as csv_file:
+            csv_reader = csv.reader(csv_file)
+            header = [column.strip() for column in next(csv_reader)]
+            positions = {column: i for i, column in enumerate(header)}
+            sqlquery = (
+                "INSERT INTO "
+                + table_name
+                + " ("
+                + ", ".join(header)
+                + ") VALUES ("
+                + ", ".join("?" * len(header))
+                + ")"
+            )
+
+            if self.conn.in_transaction:
+                self.conn.commit()
+            # A reject file left by an earlier import would describe rows of another run
+            if reject_file and os.path.exists(reject_file):
+                os.remove(reject_file)
+            inserted = 0
+            rejected = 0
+
+            self.cur.execute("BEGIN")
+            try:
+                if replace:
+                    # The due and search tables are rebuilt once at the end instead of by triggers on every row
+                    self.drop_triggers(table_name, "due")
+                    search = self.drop_triggers(table_name, "search")
+                    self.cur.execute("DELETE FROM " + table_name)
+                    bulk_insert = contextlib.nullcontext()
+                else:
+                    bulk_insert = self.bulk_insert(table_name)
+
+                with bulk_insert:
+                    # This connection is the only writer, while the rows ahead are still being checked
+                    for rows, invalid in self.validated_batches(
+                        csv_reader,
+                        file_name,
+                        positions,
+                        batch_size,
+                        reject_file,
+                        workers,
+                    ):
+                        rejected += invalid
+
+                        self.cur.execute("SAVEPOINT csv_batch")
+                        try:
+                            self.cur.executemany(sqlquery, [row for _, row in rows])
+                            inserted += len(rows)
+                        except Error:
+                            # Retried row by row so one bad row only loses itself
+                            self.cur.execute("ROLLBACK TO csv_batch")
+                            failed = []
+                            for line_number, row in rows:
+                                try:
+                                    self.cur.execute(sqlquery, row)
+                                    inserted += 1
+                                except Error as e:
+                                    failed.append((line_number, row, str(e)))
+                            rejected += len(failed)
+                            self.reject_rows(failed, header, reject_file)
+                        self.cur.execute("RELEASE csv_batch")
+
+                        if progress:
+                            print("%d rows imported" % inserted, end="\r")
+
+                if replace:
+                    self.rebuild_due_table(table_name)
+                    if search:
+                        self.rebuild_search_table(table_name)
+                self.conn.commit()
+
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+        if progress:
+            print("%d rows imported, %d rejected" % (inserted, rejected))
+            if rejected and reject_file:
+                print("Rejected rows saved to " + reject_file)
+        return inserted, rejected
+
+    def upsert_csv(
+        self,
+        file_name,
+        table_name="devices",
+        batch_size=10000,
+        progress=True,
+        reject_file=None,
+        workers=None,
+    ):
+        """Inserts new devices and updates existing ones from a csv file in batches inside one transaction"""
+
+        with open(file_name, newline="") as csv_file:
+            csv_reader = csv.reader(csv_file)
+            header = [column.strip() for column in next(csv_reader)]
+            if "property_number" not in header:
+                raise ValueError("The csv file has no property_number column")
+
+            key = header.index("property_number")
+            positions = {column: i for i, column in enumerate(header)}
+            columns = [column for column in header if column != "property_number"]
+            sqlquery = (
+                "INSERT INTO "
+                + table_name
+                + " ("
+                + ", ".join(header)
+                + ") VALUES ("
+                + ", ".join("?" * len(header))
+                + ") ON CONFLICT(property_number) DO UPDATE SET "
+                + ", ".join(column + " = excluded." + column for column in columns)
+                # Rows that already match are left alone and not counted as changes
+                + " WHERE "
+                + " OR ".join(
+                    table_name + "." + column + " IS NOT excluded." + column
+                    for column in columns
+                )
+            )
+            existing_query = (
+                "SELECT COUNT(*) FROM "
+                + table_name
+                + " WHERE property_number IN (SELECT value FROM json_each(?))"
+            )
+
+            self.create_unique_index(table_name)
+            if self.conn.in_transaction:
+                self.conn.commit()
+            if reject_file and os.path.exists(reject_file):
+                os.remove(reject_file)
+            inserted = updated = unchanged = rejected = 0
+
+            self.cur.execute("BEGIN")
+            try:
+                for rows, invalid in self.validated_batches(
+                    csv_reader,
+                    file_name,
+                    positions,
+                    batch_size,
+                    reject_file,
+                    workers,
+                ):
+                    rejected += invalid
+                    rows = [row for _, row in rows]
+
+                    new_pns = set(row[key] for row in rows)
+                    existing = self.cur.execute(
+                        existing_query, (json.dumps(list(new_pns)),)
+                    ).fetchone()[0]
+
+                    # rowcount leaves out the rows written by the due table triggers
+                    self.cur.executemany(sqlquery, rows)
+                    changes = max(self.cur.rowcount, 0)
+
+                    inserted += len(new_pns) - existing
+                    updated += changes - (len(new_pns) - existing)
+                    unchanged += len(rows) - changes
+
+                    if progress:
+                        print(
+                            "%d rows merged" % (inserted + updated + unchanged),
+                            end="\r",
+                        )
+
+                self.conn.commit()
+
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+        if progress:
+            print(
+                "%d inserted, %d updated, %d unchanged, %d rejected"
+                % (inserted, updated, unchanged, rejected)
+            )
+            if rejected and reject_file:
+                print("Rejected rows saved to " + reject_file)
+        return inserted, updated, unchanged, rejected
+
+    def merge(self, table_name="devices", file_name="additional_data.csv"):
+        """Adds new devices and updates existing ones from a csv file called additional_data.csv"""
+
+        try:
+            result = self.upsert_csv(
+                file_name, table_name, reject_file=self.reject_file_name(file_name)
+            )
+            message = "Devices merged!"
+            print(message)
+            return result
+
+        except Exception as e:
+            print("Error: " + str(e))
+            return e
+
+    def append(self, table_name="devices", file_name="additional_data.csv"):
         """Add devices from a csv file called additional_data.csv"""
 
         try:
-            df = pd.read_csv("additional_data.csv")
-            df.to_sql(table_name, self.conn, if_exists="append", index=False)
+            self.import_csv(
+                file_name, table_name, reject_file=self.reject_file_name(file_name)
+            )
             message = "Devices added!"
             print(message)
 
@@ -250,12 +1714,18 @@ class Cal_Database:
             print("Error: " + str(e))
             return e
 
-    def replace(self, table_name="devices"):
+    def replace(self, table_name="devices", file_name="calibration_data.csv"):
         """replaces data in the devices table with data from a csv file called calibration_data.csv"""
 
         try:
-            df = pd.read_csv("calibration_data.csv")
-            df.to_sql(table_name, self.conn, if_exists="replace", index=False)
+            # Rows are deleted instead of dropping the table, so its constraint and indexes are kept
+            self.create_cal_table(table_name)
+            self.import_csv(
+                file_name,
+                table_name,
+                replace=True,
+                reject_file=self.reject_file_name(file_name),
+            )
             message = "Data replaced!"
             print(message)
 
@@ -273,8 +1743,9 @@ class Cal_Database:
                 "Enter the property number of the device you wish to delete. \n"
             ).strip()
 
-            if pn in self.property_numbers:
+            if pn in self.cache:
                 sqlquery = "DELETE FROM devices WHERE property_number = '" + pn + "'"
+                self.changed_pns = [pn]
                 finished = True
             else:
                 e = "Error: Property number not found."
@@ -291,7 +1762,7 @@ class Cal_Database:
         while not finished:
             pn = self.pn_prompt()
 
-            if pn in self.property_numbers:
+            if pn in self.cache:
                 try:
                     col = self.column_prompt()
 
@@ -315,6 +1786,8 @@ class Cal_Database:
                         + pn
                         + "'"
                     )
+                    # A renamed device is cached under both its old and new property number
+                    self.changed_pns = [pn, value] if col == "property_number" else [pn]
                     finished = True
 
                 except Error as e:
@@ -327,19 +1800,198 @@ class Cal_Database:
         message = "Device updated!"
         return sqlquery, message
 
-    def save_csv(self, table_name="devices", file_name="calibration_data.csv"):
+    def add_many(self, devices, table_name="devices"):
+        """Adds a list of device rows in one transaction without prompts"""
+
+        devices = [
+            tuple(device[:3])
+            + (self.normalize_date(device[3]), self.normalize_date(device[4]))
+            + tuple(device[5:])
+            for device in devices
+        ]
+
+        if self.conn.in_transaction:
+            self.conn.commit()
+
+        self.cur.execute("BEGIN")
+        try:
+            sqlquery = (
+                "INSERT INTO "
+                + table_name
+                + " (property_number, manufacturer, description, cal_date, cal_due, custodian_email) VALUES (?, ?, ?, ?, ?, ?)"
+            )
+            with self.bulk_insert(table_name):
+                self.cur.executemany(sqlquery, devices)
+            self.conn.commit()
+
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+        if table_name == "devices":
+            self.refresh_devices([device[0] for device in devices])
+
+        return len(devices)
+
+    def update_many(self, changes, table_name="devices"):
+        """Applies a list of (property number, column, value) changes in one transaction without prompts"""
+
+        table_columns = self.display_column_names(table_name)
+        # Changes keep their order, only consecutive changes of one column share a statement
+        runs = []
+        # Later changes of a renamed device follow it to its new property number
+        renamed = {}
+        for property_number, column, value in changes:
+            if column not in table_columns:
+                raise ValueError("Column " + column + " does not exist")
+            if column in ("cal_date", "cal_due"):
+                value = self.normalize_date(value)
+            property_number = renamed.get(property_number, property_number)
+            if column == "property_number":
+                for old, new in renamed.items():
+                    if new == property_number:
+                        renamed[old] = value
+                renamed[property_number] = value
+
+            if runs and runs[-1][0] == column:
+                runs[-1][1].append((value, property_number))
+            else:
+                runs.append((column, [(value, property_number)]))
+
+        if self.conn.in_transaction:
+            self.conn.commit()
+        # rowcount leaves out the rows written by the due table triggers, unlike total_changes
+        updated = 0
+
+        self.cur.execute("BEGIN")
+        try:
+            # One parameterized executemany per run of a column
+            for column, rows in runs:
+                sqlquery = (
+                    "UPDATE "
+                    + table_name
+                    + " SET "
+                    + column
+                    + " = ? WHERE property_number = ?"
+                )
+                self.cur.executemany(sqlquery, rows)
+                updated += self.cur.rowcount
+            self.conn.commit()
+
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+        if table_name == "devices":
+            # Renamed devices are refreshed under both property numbers
+            property_numbers = [change[0] for change in changes]
+            property_numbers += [
+                change[2] for change in changes if change[1] == "property_number"
+            ]
+            self.refresh_devices(property_numbers)
+
+        return updated
+
+    def delete_many(self, property_numbers, table_name="devices"):
+        """Deletes a list of devices by property number in one transaction without prompts"""
+
+        if self.conn.in_transaction:
+            self.conn.commit()
+
+        self.cur.execute("BEGIN")
+        try:
+            sqlquery = "DELETE FROM " + table_name + " WHERE property_number = ?"
+            self.cur.executemany(sqlquery, [(i,) for i in property_numbers])
+            deleted = self.cur.rowcount
+            self.conn.commit()
+
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+        if table_name == "devices":
+            self.cache.merge(property_numbers, ())
+
+        return deleted
+
+    def export_cursor(
+        self, table_name="devices", columns=None, where="", parameters=()
+    ):
+        """Returns a new cursor over the rows of a table to export, checking the column names first"""
+
+        if columns:
+            table_columns = self.display_column_names(table_name)
+            for column in columns:
+                if column not in table_columns:
+                    raise ValueError("Column " + column + " does not exist")
+
+        sqlquery = (
+            "SELECT " + (", ".join(columns) if columns else "*") + " FROM " + table_name
+        )
+        if where:
+            sqlquery += " WHERE " + where
+
+        # A separate cursor keeps self.cur free while the rows are streamed
+        cursor = self.cursor()
+        cursor.execute(sqlquery, parameters)
+        return cursor
+
+    def write_csv_rows(self, csv_file, cursor, batch_size=10000):
+        """Streams the rows of an executed cursor into an open text file in csv format, fetching batch_size rows at a time"""
+
+        try:
+            csv_writer = csv.writer(csv_file, lineterminator="\n")
+            csv_writer.writerow([column[0] for column in cursor.description])
+
+            count = 0
+            rows = cursor.fetchmany(batch_size)
+            while rows:
+                csv_writer.writerows(rows)
+                count += len(rows)
+                rows = cursor.fetchmany(batch_size)
+        finally:
+            cursor.close()
+
+        return count
+
+    def write_csv(
+        self,
+        csv_file,
+        table_name="devices",
+        columns=None,
+        where="",
+        parameters=(),
+        batch_size=10000,
+    ):
+        """Streams the rows of a table into an open text file in csv format, fetching batch_size rows at a time"""
+
+        cursor = self.export_cursor(table_name, columns, where, parameters)
+        return self.write_csv_rows(csv_file, cursor, batch_size)
+
+    def save_csv(
+        self,
+        table_name="devices",
+        file_name="calibration_data.csv",
+        columns=None,
+        where="",
+        parameters=(),
+        batch_size=10000,
+    ):
         """Saves the table content to a csv file named calibration_data.csv"""
 
-        sqlquery = "SELECT * FROM " + table_name
-        self.cur.execute(sqlquery)
-        result = self.cur.fetchall()
+        try:
+            # A failed export never leaves a partial file
+            with atomic_write(file_name, newline="") as csv_file:
+                self.write_csv(
+                    csv_file, table_name, columns, where, parameters, batch_size
+                )
 
-        for row in result:
-            df = pd.read_sql_query(sqlquery, self.conn)
-            df.to_csv(file_name, index=False)
+            message = "File saved!"
+            print(message)
 
-        message = "File saved!"
-        print(message)
+        except Exception as e:
+            print("Error: " + str(e))
+            return e
 
     def date_math(self, cal_due):
         """Computes the remaining days until calibration expiration"""
@@ -356,17 +2008,127 @@ class Cal_Database:
             # "Error: Date not in the correct format (mm/dd/yyyy)"
             return e
 
-    def generate_email_list(self):
-        """Adds into a list custodian email with expiring devices"""
+    def parse_dates(self, dates):
+        """Parses a whole column of MM/DD/YYYY strings into a datetime64 array, NaT where invalid"""
+
+        # pandas and numpy are imported on first use so starting the CLI stays fast
+        import numpy as np
+        import pandas as pd
+
+        # Each date is viewed as a row of 11 code points so the fields are sliced in one pass
+        dates = pd.Series(dates, dtype=object).fillna("")
+        chars = (
+            dates.to_numpy(dtype="U11").view(np.uint32).reshape(-1, 11).astype(np.int64)
+        )
+        digits = chars[:, [0, 1, 3, 4, 6, 7, 8, 9]] - ord("0")
+
+        valid = (
+            ((digits >= 0) & (digits <= 9)).all(axis=1)
+            & (chars[:, 2] == ord("/"))
+            & (chars[:, 5] == ord("/"))
+            & (chars[:, 10] == 0)
+        )
+        month = digits[:, 0] * 10 + digits[:, 1]
+        day = digits[:, 2] * 10 + digits[:, 3]
+        year = (
+            digits[:, 4] * 1000 + digits[:, 5] * 100 + digits[:, 6] * 10 + digits[:, 7]
+        )
+        valid &= (month >= 1) & (month <= 12) & (day >= 1)
+
+        month_start = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype(
+            "datetime64[M]"
+        )
+        parsed = month_start.astype("datetime64[D]") + (day - 1)
+        # Days past the end of the month (e.g. 02/31) roll into the next month
+        valid &= parsed.astype("datetime64[M]") == month_start
+        parsed[~valid] = np.datetime64("NaT")
+        return parsed
+
+    def due_status(self, cal_due, days=60, today=None):
+        """Computes the remaining days and status (expired, due-soon, ok) for a whole column of due dates"""
+
+        import numpy as np
+        import pandas as pd
+
+        if today is None:
+            today = date.today()
+
+        cal_due = pd.Series(cal_due, dtype=object).reset_index(drop=True)
+        due = self.parse_dates(cal_due)
+        remaining = (due - np.datetime64(today, "D")).astype("float64")
+        remaining[np.isnat(due)] = np.nan
+
+        status = np.select(
+            [np.isnan(remaining), remaining < 0, remaining <= days],
+            ["invalid", "expired", "due-soon"],
+            "ok",
+        )
+        return pd.DataFrame(
+            {"cal_due": cal_due, "days_remaining": remaining, "status": status}
+        )
+
+    def status_expression(self, days=60, today=None, due_key=None):
+        """Returns the SQL expression of the status (invalid, expired, due-soon, ok) of cal_due with its parameters, the same statuses due_status computes"""
+
+        if today is None:
+            today = date.today()
+        if due_key is None:
+            due_key = self.date_key("cal_due")
+
+        # Like parse_dates, a due date is invalid unless it is exactly a real MM/DD/YYYY date, the modifier makes date() roll 02/30 over
+        expression = (
+            "CASE WHEN length(cal_due) IS NOT 10 OR date("
+            + due_key
+            + ", '+0 days') IS NOT "
+            + due_key
+            + " THEN 'invalid' WHEN "
+            + due_key
+            + " < ? THEN 'expired' WHEN "
+            + due_key
+            + " <= ? THEN 'due-soon' ELSE 'ok' END"
+        )
+        due_limit = today + timedelta(days=days)
+        return expression, [today.isoformat(), due_limit.isoformat()]
+
+    def generate_status_table(self, table_name="devices", days=60):
+        """Loads the table with the remaining days and calibration status of every device"""
+
+        import pandas as pd
+
+        sqlquery = "SELECT * FROM " + table_name + " ORDER BY property_number"
+        df = pd.read_sql_query(sqlquery, self.conn)
+        status = self.due_status(df["cal_due"], days)
+        df["days_remaining"] = status["days_remaining"].to_numpy()
+        df["status"] = status["status"].to_numpy()
+        return df
+
+    def status_report(self, table_name="devices", days=60):
+        """Displays how many devices are expired, due within 60 days or ok, followed by the devices needing calibration"""
 
         try:
-            sqlquery = "SELECT * FROM devices ORDER BY property_number"
-            device_data = self.cur.execute(sqlquery)
-            for row in device_data:
-                days = self.date_math(row[4])
+            df = self.generate_status_table(table_name, days)
+            print(df["status"].value_counts().to_string())
+            print(self.display_column_names() + ("days_remaining", "status"))
+            for row in df[df["status"] != "ok"].itertuples(index=False):
+                print(tuple(row))
+            return df
+
+        except Exception as e:
+            print("Error: " + str(e))
+            return e
 
-                if days <= 60 and row[5] not in self.emails:
-                    self.emails.append(row[5])
+    def generate_email_list(self, days=60):
+        """Adds into a list custodian email with expiring devices"""
+
+        try:
+            due_limit = (date.today() + timedelta(days=days)).isoformat()
+            # The due table's covering index answers this without reading the devices rows
+            # A due key that is not a real date is invalid, as in status_expression
+            sqlquery = "SELECT custodian_email FROM devices_due WHERE due_key <= ? AND date(due_key, '+0 days') IS due_key GROUP BY custodian_email ORDER BY MIN(property_number)"
+            device_data = self.cur.execute(sqlquery, (due_limit,))
+            # GROUP BY already returns each custodian once, so the list is rebuilt on every call
+            self.emails.clear()
+            self.emails.extend(row[0] for row in device_data)
 
             return self.emails
 
@@ -374,49 +2136,278 @@ class Cal_Database:
             # "Error: Date not in the correct format (mm/dd/yyyy)"
             return e
 
-    def send_email_gmail(self, email_receiver):
-        """Sends email reminders to custodians using gmail"""
+    def generate_digest_list(self, days=60, table_name="devices"):
+        """Groups the expired and expiring devices of each custodian in one query"""
 
-        try:
-            email_sender = os.getenv("EMAIL")
-            email_password = os.getenv("PASSWORD")
+        due_key = self.date_key("cal_due")
+        expression, parameters = self.status_expression(days)
+        sqlquery = (
+            "SELECT custodian_email, json_group_array(json_array("
+            + "property_number, manufacturer, description, cal_due, status, due_key"
+            + ")) FROM (SELECT *, "
+            + expression
+            + " AS status, "
+            + due_key
+            + " AS due_key FROM "
+            + table_name
+            + " WHERE "
+            + due_key
+            + " <= ?) WHERE status != 'invalid' GROUP BY custodian_email ORDER BY custodian_email"
+        )
+
+        digest = {}
+        for email_receiver, devices in self.cur.execute(
+            sqlquery, parameters + parameters[1:]
+        ):
+            # Each custodian's devices are listed from the earliest due date
+            devices = sorted(
+                json.loads(devices), key=lambda device: (device[5], device[0])
+            )
+            digest[email_receiver] = [tuple(device[:5]) for device in devices]
+
+        return digest
+
+    def reminder_thresholds(self):
+        """Returns the days before the due date at which custodians are reminded, from REMIND_THRESHOLDS in the .env file"""
+
+        thresholds = os.getenv("REMIND_THRESHOLDS", "60,30,7,0")
+        return sorted(set(int(days) for days in thresholds.split(",")))
+
+    def create_reminder_table(self, table_name="devices"):
+        """Creates the table recording the lowest threshold each device's custodian was reminded about"""
+
+        sqlquery = (
+            "CREATE TABLE IF NOT EXISTS "
+            + table_name
+            + "_reminders (property_number TEXT PRIMARY KEY, custodian_email TEXT, cal_due TEXT, threshold INTEGER, reminded TEXT)"
+        )
+        self.cur.execute(sqlquery)
+        self.conn.commit()
+
+    def generate_crossings(self, thresholds=None, table_name="devices"):
+        """Returns the devices that crossed a reminder threshold their custodian was not reminded about yet"""
+
+        if thresholds is None:
+            thresholds = self.reminder_thresholds()
+        thresholds = sorted(thresholds)
+        self.create_reminder_table(table_name)
+
+        today = date.today()
+        due_key = self.date_key("cal_due")
+        limits = [(today + timedelta(days=days)).isoformat() for days in thresholds]
+        # A device is at the lowest threshold its due date is within, expired devices are at the lowest one
+        level = (
+            "CASE "
+            + " ".join(
+                "WHEN " + due_key + " <= ? THEN %d" % days for days in thresholds
+            )
+            + " END"
+        )
+        # Only the devices inside the largest threshold are read, through the due date index
+        expression, parameters = self.status_expression(thresholds[-1], today)
+        sqlquery = (
+            "SELECT d.custodian_email, d.property_number, d.manufacturer, d.description, d.cal_due, d.status, d.level FROM (SELECT *, "
+            + expression
+            + " AS status, "
+            + level
+            + " AS level FROM "
+            + table_name
+            + " WHERE "
+            + due_key
+            + " <= ?) AS d LEFT JOIN "
+            + table_name
+            + "_reminders AS r ON r.property_number = d.property_number AND r.cal_due IS d.cal_due AND r.custodian_email IS d.custodian_email"
+            # A recalibrated device or a new custodian starts over
+            + " WHERE d.status != 'invalid' AND (r.threshold IS NULL OR r.threshold > d.level) ORDER BY d.property_number"
+        )
+        parameters += limits + [limits[-1]]
+        return self.cur.execute(sqlquery, parameters).fetchall()
+
+    def record_reminders(self, crossings, email_list, table_name="devices"):
+        """Records the crossings of the custodians that were reminded and forgets devices that were recalibrated or deleted"""
 
-            subject = "Calibration Reminder"
+        email_list = set(email_list)
+        reminded = date.today().isoformat()
+        sqlquery = (
+            "INSERT INTO "
+            + table_name
+            + "_reminders (property_number, custodian_email, cal_due, threshold, reminded) VALUES (?, ?, ?, ?, ?) ON CONFLICT(property_number) DO UPDATE SET custodian_email = excluded.custodian_email, cal_due = excluded.cal_due, threshold = excluded.threshold, reminded = excluded.reminded"
+        )
+        self.cur.executemany(
+            sqlquery,
+            [
+                (property_number, email_receiver, cal_due, level, reminded)
+                for email_receiver, property_number, _, _, cal_due, _, level in crossings
+                if email_receiver in email_list
+            ],
+        )
+        sqlquery = (
+            "DELETE FROM "
+            + table_name
+            + "_reminders WHERE NOT EXISTS (SELECT 1 FROM "
+            + table_name
+            + " AS d WHERE d.property_number = "
+            + table_name
+            + "_reminders.property_number AND d.cal_due IS "
+            + table_name
+            + "_reminders.cal_due)"
+        )
+        self.cur.execute(sqlquery)
+        self.conn.commit()
+
+    def create_mailer(self):
+        """Creates the mailer from the EMAIL, PASSWORD and optional SMTP_HOST, SMTP_PORT and SMTP_SSL settings of the .env file"""
+
+        return Reminder_Mailer(
+            os.getenv("EMAIL"),
+            os.getenv("PASSWORD"),
+            os.getenv("SMTP_HOST", "smtp.gmail.com"),
+            int(os.getenv("SMTP_PORT", "465")),
+            os.getenv("SMTP_SSL", "1") != "0",
+        )
+
+    def reminder_message(self, email_receiver, devices=None):
+        """Returns the subject and body of the reminder sent to a custodian, listing the devices in digest mode"""
+
+        subject = "Calibration Reminder"
+        if devices is None:
             body = "Greetings,\n\nOne or more of your devices need to be calibrated.\n\nThank you."
+        else:
+            lines = ["%s - %s %s - due %s (%s)" % device for device in devices]
+            body = (
+                "Greetings,\n\nThe following devices need to be calibrated:\n\n"
+                + "\n".join(lines)
+                + "\n\nThank you."
+            )
+        return subject, body
 
-            em = EmailMessage()
-            em["From"] = email_sender
-            em["To"] = email_receiver
-            em["subject"] = subject
-            em.set_content(body)
+    def send_email_gmail(self, email_receiver, mailer=None, devices=None):
+        """Sends email reminders to custodians using gmail"""
 
-            context = ssl.create_default_context()
+        try:
+            subject, body = self.reminder_message(email_receiver, devices)
 
-            with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as smtp:
-                smtp.login(email_sender, email_password)
-                smtp.sendmail(email_sender, email_receiver, em.as_string())
+            if mailer is None:
+                with self.create_mailer() as mailer:
+                    mailer.send(email_receiver, subject, body)
+            else:
+                mailer.send(email_receiver, subject, body)
 
         except Exception as e:
             print("Error: " + str(e) + " check .env file.")
             return e
 
-    def remind(self):
+    def send_concurrent(self, email_list, workers=4, rate=0, retries=3, digest=None):
+        """Sends the reminders through a pool of workers and prints a per-recipient summary"""
+
+        digest = digest or {}
+        messages = [(i,) + self.reminder_message(i, digest.get(i)) for i in email_list]
+        results = dispatch_concurrent(
+            self.create_mailer, messages, workers, rate, retries
+        )
+
+        failures = [result for result in results if not result.sent]
+        print(
+            "Reminders sent: %d, failed: %d"
+            % (len(results) - len(failures), len(failures))
+        )
+        for result in failures:
+            print(
+                "Error: %s after %d attempt(s): %s"
+                % (result.email_receiver, result.attempts, result.error)
+            )
+        return results
+
+    def remind(self, workers=None, digest=False, changes_only=None):
         """Sends an email reminder to custodians with upcoming calibration expiration"""
 
         try:
-            email_list = self.generate_email_list()
-            if email_list != []:
-                for i in email_list:
-                    self.send_email_gmail(i)
-                print("Reminders sent!")
+            # REMIND_WORKERS, REMIND_RATE and REMIND_RETRIES in the .env file turn on the concurrent mode
+            if workers is None:
+                workers = int(os.getenv("REMIND_WORKERS", "1"))
+            # REMIND_CHANGES_ONLY=0 reminds every custodian with a device due on every run
+            if changes_only is None:
+                changes_only = os.getenv("REMIND_CHANGES_ONLY", "1") != "0"
+
+            crossings = []
+            if changes_only:
+                crossings = self.generate_crossings()
+                # Custodians are listed in the order of their first property number, like generate_email_list
+                devices = {}
+                for email_receiver, *device, _ in crossings:
+                    devices.setdefault(email_receiver, []).append(tuple(device))
+                self.emails[:] = email_list = list(devices)
+                # A digest lists only the devices that crossed a threshold, from the earliest due date
+                if digest:
+                    digest = {
+                        email_receiver: sorted(
+                            devices[email_receiver],
+                            key=lambda device: device[3][6:] + device[3][:5],
+                        )
+                        for email_receiver in email_list
+                    }
+                else:
+                    digest = {}
+            elif digest:
+                digest = self.generate_digest_list()
+                email_list = list(digest)
+            else:
+                digest = {}
+                email_list = self.generate_email_list()
+
+            if email_list == []:
+                if changes_only:
+                    print("No device crossed a reminder threshold since the last run.")
+                else:
+                    print("No upcoming device calibration required.")
+                return []
+
+            elif workers > 1:
+                results = self.send_concurrent(
+                    email_list,
+                    workers,
+                    float(os.getenv("REMIND_RATE", "0")),
+                    int(os.getenv("REMIND_RETRIES", "3")),
+                    digest,
+                )
 
             else:
-                print("No upcoming device calibration required.")
+                # One session is shared by the whole batch
+                results = []
+                with self.create_mailer() as mailer:
+                    for i in email_list:
+                        e = self.send_email_gmail(i, mailer, digest.get(i))
+                        results.append(Send_Result(i, e is None, 1, e))
+                print(
+                    "Reminders sent! (%d messages, %.1f messages per second)"
+                    % (mailer.sent, mailer.throughput())
+                )
+
+            if crossings:
+                self.record_reminders(
+                    crossings,
+                    [result.email_receiver for result in results if result.sent],
+                )
+
+            if self.metrics is not None:
+                sent = sum(result.sent for result in results)
+                self.metrics.inc("cal_emails_sent_total", sent)
+                self.metrics.inc("cal_emails_failed_total", len(results) - sent)
+            return results
 
         except ValueError and TypeError as e:
             print("Error: Date not in the correct format (mm/dd/yyyy)")
             return e
 
+    def stats(self):
+        """Displays the calls and latency of every command and SQL statement, the rows read and written, the emails sent and the result cache hits"""
+
+        print(self.result_cache.report())
+        if self.metrics is None:
+            print("Metrics are off. Set METRICS_FILE in the .env file to turn them on.")
+        else:
+            print(self.metrics.report())
+
     def help(self):
         """Displays the commands and its description"""
 
@@ -424,13 +2415,22 @@ class Cal_Database:
         print("ADD - " + self.add_device.__doc__ + "\n")
         print("APPEND - " + self.append.__doc__ + "\n")
         print("DELETE - " + self.delete_device.__doc__ + "\n")
+        print(
+            "DIGEST - Sends each custodian one email listing their expired and expiring devices with due dates\n"
+        )
         print("DISPLAY - " + self.display_data.__doc__ + "\n")
         print("HELP - " + self.help.__doc__ + "\n")
+        print("MERGE - " + self.merge.__doc__ + "\n")
+        print("PAGE - " + self.display_paged.__doc__ + "\n")
         print("QUIT - Closes connection from the database and exits the program\n")
+        print("REBUILD - " + self.rebuild.__doc__ + "\n")
         print("REMIND - " + self.remind.__doc__ + "\n")
         print("REPLACE - " + self.replace.__doc__ + "\n")
         print("SAVE - " + self.save_csv.__doc__ + "\n")
+        print("SEARCH - " + self.search.__doc__ + "\n")
         print("SELECT = " + self.select.__doc__ + "\n")
+        print("STATS - " + self.stats.__doc__ + "\n")
+        print("STATUS - " + self.status_report.__doc__ + "\n")
         print("UPDATE - " + self.update_device.__doc__ + "\n")
 
     def start(self):
@@ -440,6 +2440,7 @@ class Cal_Database:
         finished = False
         while not finished:
             command = input("Please enter a command\n").lower().strip()
+            started = time.perf_counter()
 
             if command == "quit":
                 self.cur.close()
@@ -450,42 +2451,62 @@ class Cal_Database:
                 sqlquery, new_device, message = self.add_device()
                 self.sql_executemany(sqlquery, new_device, message)
                 self.conn.commit()
-                self.generate_devices_list()
-                self.generate_property_list()
+                self.refresh_device(new_device[0][0])
 
             elif command == "append":
+                last_rowid = self.last_rowid()
                 self.append()
+                self.cache_devices_since(last_rowid)
+
+            elif command == "merge":
+                self.merge()
                 self.generate_devices_list()
-                self.generate_property_list()
 
             elif command == "display":
                 self.display_data()
 
+            elif command == "page":
+                self.display_paged()
+
             elif command == "delete":
                 sqlquery, message = self.delete_device()
                 self.sql_execute(sqlquery, message)
                 self.conn.commit()
-                self.generate_devices_list()
-                self.generate_property_list()
+                for pn in self.changed_pns:
+                    self.refresh_device(pn)
 
             elif command == "update":
                 sqlquery, message = self.update_device()
                 self.sql_execute(sqlquery, message)
                 self.conn.commit()
-                self.generate_devices_list()
-                self.generate_property_list()
+                for pn in self.changed_pns:
+                    self.refresh_device(pn)
 
             elif command == "remind":
                 self.remind()
 
+            elif command == "digest":
+                self.remind(digest=True)
+
             elif command == "replace":
                 self.replace()
                 self.generate_devices_list()
-                self.generate_property_list()
+
+            elif command == "rebuild":
+                self.rebuild()
 
             elif command == "save":
                 self.save_csv()
 
+            elif command == "search":
+                self.search()
+
+            elif command == "status":
+                self.status_report()
+
+            elif command == "stats":
+                self.stats()
+
             elif command == "help":
                 self.help()
 
@@ -496,13 +2517,29 @@ class Cal_Database:
                 print(self.property_numbers)
 
             elif command == "select":
+                total_changes = self.conn.total_changes
                 self.select()
                 self.conn.commit()
+                # Ad-hoc queries may change any row, so the cache is reloaded after writes
+                if self.conn.total_changes != total_changes:
+                    self.generate_devices_list()
 
             else:
                 print("Error: Invalid command! Try again or type HELP.")
 
+            # Plans are looked up between commands, never while a statement is running
+            if self.query_log is not None and not finished:
+                self.query_log.flush()
+
+            if self.metrics is not None:
+                self.metrics.observe(
+                    "cal_command_seconds",
+                    time.perf_counter() - started,
+                    command=command if command in self.commands else "invalid",
+                )
+
 
 # Main program:
-C = Cal_Database()
-C.start()
+if __name__ == "__main__":
+    C = Cal_Database()
+    C.start()
@@ -0,0 +1,245 @@
+import argparse
+import csv
+import heapq
+import itertools
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic_file import atomic_write
+from device_database import Cal_Database
+
+
+class Site_Federation:
+    """Runs DISPLAY, SEARCH, REMIND and SAVE across the databases of several sites at once, one connection and thread per site"""
+
+    def __init__(self, sites):
+        """Initiates Site_Federation from a {site name: database file} dict, opening the sites in parallel"""
+
+        self.sites = dict(sites)
+        if not self.sites:
+            raise ValueError("No sites given")
+
+        # Every site streams from its own thread, so a merge never waits for a free worker
+        self.executor = ThreadPoolExecutor(max_workers=len(self.sites))
+        databases = self.executor.map(
+            lambda db_file: Cal_Database(
+                db_file, load_devices=False, check_same_thread=False
+            ),
+            self.sites.values(),
+        )
+        self.databases = dict(zip(self.sites, databases))
+
+    def close(self):
+        """Stops the threads and closes the site connections"""
+
+        self.executor.shutdown()
+        for C in self.databases.values():
+            C.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def map(self, function):
+        """Runs function(site database) on every site in parallel and returns {site name: result}"""
+
+        futures = {
+            name: self.executor.submit(function, C)
+            for name, C in self.databases.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+    def prefetch(self, pages, size=4):
+        """Yields the items of an iterator of pages that a pool thread reads up to size pages ahead"""
+
+        buffer = queue.Queue(size)
+        stopped = threading.Event()
+
+        def put(item):
+            # Gives up once the reader has stopped, so the thread never blocks on a full queue
+            while not stopped.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for page in pages:
+                    if not put(page):
+                        return
+                put(None)
+            except BaseException as e:
+                put(e)
+
+        future = self.executor.submit(produce)
+        try:
+            while True:
+                page = buffer.get()
+                if page is None:
+                    return
+                if isinstance(page, BaseException):
+                    raise page
+                yield from page
+        finally:
+            stopped.set()
+            # The site's connection is free again once its thread has returned
+            future.result()
+
+    def site_rows(self, name, column, columns, custodian, status, page_size):
+        """Yields (sort value, property number, site, row) for the devices of one site in the order of a column"""
+
+        pages = self.databases[name].sorted_pages(
+            column, page_size, columns, custodian, status
+        )
+        # Keys are built a page at a time in the site's thread, and the site breaks ties before the row is ever compared
+        labeled = (
+            [
+                (sort_value or "", property_number or "", name, row)
+                for sort_value, property_number, row in page
+            ]
+            for page in pages
+        )
+        return self.prefetch(labeled)
+
+    def display_rows(
+        self,
+        column="property_number",
+        columns=None,
+        custodian=None,
+        status=None,
+        page_size=1000,
+    ):
+        """Yields (site, row) for the devices of every site, merged in the order of a column as they are read"""
+
+        streams = [
+            self.site_rows(name, column, columns, custodian, status, page_size)
+            for name in self.databases
+        ]
+        # Each site is already sorted, so the merge only compares the heads of the streams
+        for _, _, name, row in heapq.merge(*streams):
+            yield name, row
+
+    def search(self, terms, limit=100):
+        """Returns (site, row) for the best matches of a search across every site"""
+
+        results = self.map(lambda C: C.search_devices(terms, limit, ranked=True))
+        # Ranks are computed per site, from the words of that site's devices
+        merged = heapq.merge(
+            *(
+                [(row[0], name, row[1:]) for row in rows]
+                for name, rows in results.items()
+            ),
+            key=lambda item: item[0],
+        )
+        return [(name, row) for _, name, row in itertools.islice(merged, limit)]
+
+    def remind(self, digest=False):
+        """Sends the reminders of every site at once and returns {site name: results}"""
+
+        return self.map(lambda C: C.remind(digest=digest))
+
+    def export(self, file_name, columns=None, page_size=10000):
+        """Saves the devices of every site to one csv file sorted by property number, with the site in the first column"""
+
+        if columns is None:
+            columns = list(next(iter(self.databases.values())).display_column_names())
+
+        count = 0
+        # A failed export never leaves a partial file
+        with atomic_write(file_name, newline="") as csv_file:
+            csv_writer = csv.writer(csv_file, lineterminator="\n")
+            csv_writer.writerow(["site"] + columns)
+            for name, row in self.display_rows(
+                "property_number", columns, page_size=page_size
+            ):
+                csv_writer.writerow((name,) + row)
+                count += 1
+
+        return count
+
+
+def parse_sites(values):
+    """Returns a {site name: database file} dict from NAME=FILE values"""
+
+    sites = {}
+    for value in values:
+        name, separator, db_file = value.partition("=")
+        if not separator or not name or not db_file:
+            raise ValueError("Sites are given as NAME=FILE, not " + value)
+        sites[name] = db_file
+    return sites
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Runs commands across the device databases of several sites"
+    )
+    parser.add_argument(
+        "--site",
+        action="append",
+        default=[],
+        help="NAME=FILE, repeated for every site, or SITES=NAME=FILE,... in the environment",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    display = commands.add_parser("display", help="DISPLAY across the sites")
+    display.add_argument("--sort", default="property_number")
+    display.add_argument("--columns", help="comma separated")
+    display.add_argument("--custodian")
+    display.add_argument("--status", choices=["expired", "due-soon", "ok"])
+
+    search = commands.add_parser("search", help="SEARCH across the sites")
+    search.add_argument("terms", nargs="+")
+    search.add_argument("--limit", type=int, default=100)
+
+    remind = commands.add_parser("remind", help="REMIND at every site at once")
+    remind.add_argument("--digest", action="store_true")
+
+    export = commands.add_parser("export", help="SAVE the sites to one csv file")
+    export.add_argument("file_name")
+    export.add_argument("--columns", help="comma separated")
+
+    args = parser.parse_args()
+    values = args.site or [i for i in os.getenv("SITES", "").split(",") if i]
+    columns = getattr(args, "columns", None)
+    columns = columns.split(",") if columns else None
+
+    try:
+        with Site_Federation(parse_sites(values)) as federation:
+            if args.command == "display":
+                for name, row in federation.display_rows(
+                    args.sort, columns, args.custodian, args.status
+                ):
+                    print((name,) + row)
+
+            elif args.command == "search":
+                for name, row in federation.search(" ".join(args.terms), args.limit):
+                    print((name,) + row)
+
+            elif args.command == "remind":
+                for name, results in federation.remind(args.digest).items():
+                    if isinstance(results, Exception):
+                        print("%s: Error: %s" % (name, results))
+                    else:
+                        sent = sum(result.sent for result in results)
+                        print(
+                            "%s: %d sent, %d failed" % (name, sent, len(results) - sent)
+                        )
+
+            elif args.command == "export":
+                count = federation.export(args.file_name, columns)
+                print("%d devices saved to %s" % (count, args.file_name))
+
+    except (ValueError, OSError) as e:
+        print("Error: " + str(e))
+
+
+if __name__ == "__main__":
+    main()
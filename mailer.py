@@ -0,0 +1,211 @@
+import threading
+import time
+from collections import namedtuple
+
+# Outcome of one recipient of a concurrent dispatch
+Send_Result = namedtuple("Send_Result", ["email_receiver", "sent", "attempts", "error"])
+# Hosts a password may be sent to without encryption, such as a local debugging server
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+def build_message(email_sender, email_receiver, subject, body):
+    """Creates the email object for one reminder"""
+
+    # smtplib, ssl and email are imported on first use so importing the mailer stays cheap
+    from email.message import EmailMessage
+
+    em = EmailMessage()
+    em["From"] = email_sender
+    em["To"] = email_receiver
+    em["subject"] = subject
+    em.set_content(body)
+    return em
+
+
+class Reminder_Mailer:
+    """Sends a batch of email reminders over one authenticated SMTP session"""
+
+    def __init__(
+        self,
+        email_sender,
+        email_password,
+        host="smtp.gmail.com",
+        port=465,
+        use_ssl=True,
+        timeout=30,
+    ):
+        """Initiates Reminder_Mailer"""
+
+        import ssl
+
+        self.email_sender = email_sender
+        self.email_password = email_password
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        # Created once and reused by every reconnect of the batch, for SSL or STARTTLS
+        self.context = ssl.create_default_context()
+        self.smtp = None
+        self.sent = 0
+        self.connections = 0
+        self.started = None
+
+    def connect(self):
+        """Opens the SMTP session and logs in"""
+
+        import smtplib
+
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(
+                self.host, self.port, context=self.context, timeout=self.timeout
+            )
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+
+        try:
+            if not self.use_ssl:
+                # Servers on port 587 expect the session to be encrypted before the login
+                smtp.ehlo()
+                if smtp.has_extn("starttls"):
+                    smtp.starttls(context=self.context)
+                    smtp.ehlo()
+                elif self.email_password and self.host not in LOCAL_HOSTS:
+                    raise smtplib.SMTPNotSupportedError(
+                        self.host
+                        + " does not offer STARTTLS, the password is not sent unencrypted"
+                    )
+            if self.email_password:
+                smtp.login(self.email_sender, self.email_password)
+        except Exception:
+            smtp.close()
+            raise
+
+        self.smtp = smtp
+        self.connections += 1
+        return smtp
+
+    def close(self):
+        """Ends the SMTP session"""
+
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except OSError:
+                self.smtp.close()
+            self.smtp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def send(self, email_receiver, subject, body):
+        """Sends one reminder, reconnecting once if the server dropped the session"""
+
+        import smtplib
+
+        if self.started is None:
+            self.started = time.perf_counter()
+
+        em = build_message(self.email_sender, email_receiver, subject, body)
+        for attempt in range(2):
+            if self.smtp is None:
+                self.connect()
+            try:
+                self.smtp.sendmail(self.email_sender, email_receiver, em.as_string())
+                break
+            except smtplib.SMTPServerDisconnected:
+                self.smtp = None
+                if attempt == 1:
+                    raise
+
+        self.sent += 1
+
+    def throughput(self):
+        """Returns the number of messages sent per second since the first send"""
+
+        if self.started is None:
+            return 0.0
+
+        elapsed = time.perf_counter() - self.started
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+
+class Rate_Limiter:
+    """Spaces out sends so that all workers together stay under a number of messages per second"""
+
+    def __init__(self, rate=0):
+        """Initiates Rate_Limiter, a rate of 0 means no limit"""
+
+        self.interval = 1 / rate if rate else 0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until the caller may send the next message"""
+
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            send_time = max(self.next_time, now)
+            self.next_time = send_time + self.interval
+        time.sleep(send_time - now)
+
+
+def is_transient(error):
+    """Checks if an SMTP error is worth retrying"""
+
+    import smtplib
+
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    return isinstance(
+        error, (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+    )
+
+
+def dispatch_concurrent(
+    create_mailer, messages, workers=4, rate=0, retries=3, backoff=1.0
+):
+    """Sends (email_receiver, subject, body) messages through a pool of workers, each with its own session, and returns a Send_Result per message"""
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    limiter = Rate_Limiter(rate)
+    local = threading.local()
+    mailers = []
+    mailers_lock = threading.Lock()
+
+    def send(message):
+        email_receiver, subject, body = message
+        if not hasattr(local, "mailer"):
+            local.mailer = create_mailer()
+            with mailers_lock:
+                mailers.append(local.mailer)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            limiter.wait()
+            try:
+                local.mailer.send(email_receiver, subject, body)
+                return Send_Result(email_receiver, True, attempt, None)
+            except Exception as e:
+                local.mailer.close()
+                if attempt > retries or not is_transient(e):
+                    return Send_Result(email_receiver, False, attempt, e)
+                # Exponential backoff: 1x, 2x, 4x ... the base delay
+                time.sleep(backoff * 2 ** (attempt - 1))
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(send, messages))
+    finally:
+        for mailer in mailers:
+            mailer.close()
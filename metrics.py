@@ -0,0 +1,339 @@
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+
+from atomic_file import atomic_write
+
+# Upper bounds in seconds, from a cached lookup up to a full import
+BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+HELP = {
+    "cal_command_seconds": "Latency of the event loop commands",
+    "cal_sql_seconds": "Latency of the SQL statements, up to their first row",
+    "cal_sql_rows_read_total": "Rows fetched by the SQL statements",
+    "cal_sql_rows_written_total": "Rows inserted, updated or deleted by the SQL statements",
+    "cal_emails_sent_total": "Reminder emails sent",
+    "cal_emails_failed_total": "Reminder emails that could not be sent",
+}
+
+STATEMENT_VERB = re.compile(r"\s*(\w+)")
+STATEMENT_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_name(sqlquery):
+    """Returns a short label such as "SELECT devices" that groups the statements of one kind"""
+
+    verb = STATEMENT_VERB.match(sqlquery)
+    if verb is None:
+        return "OTHER"
+
+    name = verb.group(1).upper()
+    table = STATEMENT_TABLE.search(sqlquery)
+    if table is not None:
+        name += " " + table.group(1)
+    return name
+
+
+class Histogram:
+    """Counts observations into fixed latency buckets"""
+
+    def __init__(self, buckets=BUCKETS):
+        """Initiates Histogram"""
+
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        """Adds one observation"""
+
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Estimates a quantile by interpolating inside the bucket that holds it"""
+
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for position, count in enumerate(self.counts):
+            upper = self.buckets[position] if position < len(self.buckets) else self.max
+            if count and seen + count >= rank:
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+            lower = upper
+        return self.max
+
+
+class Metrics:
+    """Counts calls and records latency histograms per command and per SQL statement"""
+
+    def __init__(self):
+        """Initiates Metrics"""
+
+        # One Metrics can be shared by Cal_Database instances on several threads
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """Adds to a counter"""
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Adds a latency to a histogram"""
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Records the latency of the block it wraps"""
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def cursor(self, conn):
+        """Opens a cursor of the connection that records every statement it runs"""
+
+        cursor = conn.cursor(Timed_Cursor)
+        cursor.metrics = self
+        return cursor
+
+    def report(self):
+        """Returns the calls, latency percentiles and counters as a table"""
+
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines.append(
+            "%-40s %8s %10s %10s %10s %10s"
+            % ("name", "calls", "p50 ms", "p95 ms", "p99 ms", "total s")
+        )
+        for (name, labels), histogram in histograms:
+            lines.append(
+                "%-40s %8d %10.2f %10.2f %10.2f %10.3f"
+                % (
+                    short_name(name) + " " + " ".join(value for _, value in labels),
+                    histogram.count,
+                    histogram.quantile(0.50) * 1000,
+                    histogram.quantile(0.95) * 1000,
+                    histogram.quantile(0.99) * 1000,
+                    histogram.sum,
+                )
+            )
+
+        lines.append("")
+        lines.append("%-40s %8s" % ("counter", "value"))
+        for (name, labels), value in counters:
+            label = " ".join(value for _, value in labels)
+            lines.append(
+                "%-40s %8d" % ((short_name(name) + " " + label).strip(), value)
+            )
+
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format"""
+
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines = []
+        last_name = None
+        for (name, labels), histogram in histograms:
+            if name != last_name:
+                lines.append("# HELP %s %s" % (name, HELP.get(name, name)))
+                lines.append("# TYPE %s histogram" % name)
+                last_name = name
+
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(
+                    "%s_bucket%s %d"
+                    % (name, format_labels(labels + (("le", str(bound)),)), cumulative)
+                )
+            lines.append("%s_sum%s %r" % (name, format_labels(labels), histogram.sum))
+            lines.append(
+                "%s_count%s %d" % (name, format_labels(labels), histogram.count)
+            )
+
+        for (name, labels), value in counters:
+            if name != last_name:
+                lines.append("# HELP %s %s" % (name, HELP.get(name, name)))
+                lines.append("# TYPE %s counter" % name)
+                last_name = name
+            lines.append("%s%s %d" % (name, format_labels(labels), value))
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, file_name):
+        """Writes the Prometheus text to a file, replacing it in one step so a scraper never reads half of it"""
+
+        with atomic_write(file_name) as text_file:
+            text_file.write(self.prometheus())
+
+
+# One Metrics for every Cal_Database of the process, such as the server threads and the scheduler runs
+PROCESS_METRICS = Metrics()
+# The (metrics, file) pairs already written on exit, so repeated opens register no more writers
+exit_writes = set()
+exit_lock = threading.Lock()
+
+
+def write_on_exit(metrics, file_name):
+    """Writes metrics to a file when the process exits, registering every metrics and file pair once"""
+
+    key = (id(metrics), os.path.abspath(file_name))
+    with exit_lock:
+        if key in exit_writes:
+            return
+        exit_writes.add(key)
+    atexit.register(metrics.write, file_name)
+
+
+def short_name(name):
+    """Returns a metric name without its cal_ prefix and unit suffix, for the STATS table"""
+
+    for suffix in ("_seconds", "_total"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    return name[len("cal_") :] if name.startswith("cal_") else name
+
+
+def format_labels(labels):
+    """Returns the {name="value"} part of a Prometheus sample"""
+
+    if not labels:
+        return ""
+
+    pairs = []
+    for name, value in labels:
+        value = (
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        pairs.append('%s="%s"' % (name, value))
+    return "{" + ",".join(pairs) + "}"
+
+
+class Timed_Cursor(sqlite3.Cursor):
+    """A cursor that records the latency, rows read and rows written of every statement"""
+
+    metrics = None
+    statement = "OTHER"
+    pending = 0
+
+    def record(self, sqlquery, started, total_changes):
+        """Records one executed statement"""
+
+        # Rows of a loop left before its end still count for the previous statement
+        self.count_read(self.pending)
+        self.pending = 0
+        self.statement = statement_name(sqlquery)
+        self.metrics.observe(
+            "cal_sql_seconds", time.perf_counter() - started, statement=self.statement
+        )
+        written = self.connection.total_changes - total_changes
+        if written:
+            self.metrics.inc(
+                "cal_sql_rows_written_total", written, statement=self.statement
+            )
+
+    def execute(self, sqlquery, parameters=()):
+        started = time.perf_counter()
+        total_changes = self.connection.total_changes
+        try:
+            return super().execute(sqlquery, parameters)
+        finally:
+            self.record(sqlquery, started, total_changes)
+
+    def executemany(self, sqlquery, parameters):
+        started = time.perf_counter()
+        total_changes = self.connection.total_changes
+        try:
+            return super().executemany(sqlquery, parameters)
+        finally:
+            self.record(sqlquery, started, total_changes)
+
+    def count_read(self, rows):
+        """Adds fetched rows to the rows read by the last statement"""
+
+        if rows:
+            self.metrics.inc("cal_sql_rows_read_total", rows, statement=self.statement)
+
+    def fetchone(self):
+        row = super().fetchone()
+        self.count_read(row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.count_read(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self.count_read(len(rows))
+        return rows
+
+    def __next__(self):
+        # Rows are counted locally and added once the loop ends, keeping the lock out of the loop
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self.count_read(self.pending)
+            self.pending = 0
+            raise
+        self.pending += 1
+        return row
+
+    def close(self):
+        self.count_read(self.pending)
+        self.pending = 0
+        super().close()
@@ -0,0 +1,157 @@
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from sqlite3 import Error
+
+# Schema lookups the program runs for itself, which scan the schema table by design
+SCHEMA_LOOKUP = re.compile(
+    r"SELECT name FROM sqlite_master WHERE (?:type = '\w+' AND )?name = '[^']*'"
+    r"|SELECT \* FROM \w+ LIMIT 0"
+)
+# Logged statements are cut to this many characters, a bulk insert expands to all of its rows
+STATEMENT_LENGTH = 1000
+
+
+def plan_flags(plan):
+    """Returns the warnings of a query plan: full-scan for tables read row by row, temp-b-tree for sorts without an index"""
+
+    flags = []
+    for detail in plan:
+        if (
+            detail.startswith("SCAN ")
+            and " USING " not in detail
+            and "VIRTUAL TABLE" not in detail
+            and "CONSTANT ROW" not in detail
+            and "full-scan" not in flags
+        ):
+            flags.append("full-scan")
+        if "TEMP B-TREE" in detail and "temp-b-tree" not in flags:
+            flags.append("temp-b-tree")
+    return flags
+
+
+class Slow_Query_Log:
+    """Logs the statements of a connection that run longer than a threshold with their query plan, and cancels ad-hoc SELECTs past a time budget"""
+
+    def __init__(self, conn, file_name=None, threshold=0.1, budget=0, interval=1000):
+        """Initiates Slow_Query_Log, watching the connection through its trace callback and progress handler"""
+
+        self.conn = conn
+        self.file_name = file_name
+        self.threshold = threshold
+        self.budget = budget
+        # The latest entries are kept for inspection, the log file has all of them
+        self.entries = deque(maxlen=100)
+        self.pending = []
+        self.statement = None
+        self.started = 0.0
+        self.last_step = 0.0
+        self.deadline = None
+        self.explaining = False
+
+        conn.set_trace_callback(self.trace)
+        # Called every interval virtual machine instructions of a running statement
+        conn.set_progress_handler(self.progress, interval)
+
+    def trace(self, statement):
+        """Notes the start of a statement, which also ends the previous one"""
+
+        # While a statement runs, FTS5 reports its own statements as -- comments and every trigger repeats the statement
+        if self.explaining or statement.startswith("--") or statement == self.statement:
+            return
+
+        self.finish()
+        self.statement = statement
+        self.started = self.last_step = time.perf_counter()
+
+    def progress(self):
+        """Notes that the statement is still running and interrupts it once it is past its deadline"""
+
+        self.last_step = time.perf_counter()
+        if self.deadline is not None and self.last_step > self.deadline:
+            return 1
+        return 0
+
+    def finish(self):
+        """Queues the current statement if it ran longer than the threshold"""
+
+        # A statement runs from its first step to the last progress call before the next statement
+        if self.statement is not None:
+            elapsed = self.last_step - self.started
+            if elapsed >= self.threshold and not SCHEMA_LOOKUP.fullmatch(
+                self.statement.strip()
+            ):
+                self.pending.append((self.statement, elapsed))
+            self.statement = None
+
+    def explain(self, statement):
+        """Returns the EXPLAIN QUERY PLAN lines of a statement, indented by their depth"""
+
+        self.explaining = True
+        try:
+            rows = self.conn.execute("EXPLAIN QUERY PLAN " + statement).fetchall()
+        except Error:
+            return []
+        finally:
+            self.explaining = False
+
+        depth = {0: -1}
+        plan = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            plan.append("  " * depth[node] + detail)
+        return plan
+
+    def flush(self):
+        """Looks up the query plans of the queued slow statements and writes them to the log"""
+
+        self.finish()
+        pending, self.pending = self.pending, []
+        entries = []
+
+        for statement, elapsed in pending:
+            plan = self.explain(statement)
+            if len(statement) > STATEMENT_LENGTH:
+                statement = "%s... (%d more characters)" % (
+                    statement[:STATEMENT_LENGTH],
+                    len(statement) - STATEMENT_LENGTH,
+                )
+            entry = {
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "elapsed_ms": round(elapsed * 1000, 1),
+                "statement": statement,
+                "plan": plan,
+                "flags": plan_flags(line.strip() for line in plan),
+            }
+            self.entries.append(entry)
+            entries.append(entry)
+
+            if self.file_name:
+                with open(self.file_name, "a") as log_file:
+                    log_file.write(
+                        "%s %.1f ms [%s] %s\n"
+                        % (
+                            entry["time"],
+                            entry["elapsed_ms"],
+                            ", ".join(entry["flags"]),
+                            " ".join(statement.split()),
+                        )
+                    )
+                    for line in plan:
+                        log_file.write("    " + line + "\n")
+
+        return entries
+
+    @contextmanager
+    def time_budget(self, seconds=None):
+        """Interrupts the statements run inside the block once they take longer than the budget"""
+
+        seconds = self.budget if seconds is None else seconds
+        if seconds:
+            self.deadline = time.perf_counter() + seconds
+        try:
+            yield
+        finally:
+            self.deadline = None
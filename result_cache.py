@@ -0,0 +1,152 @@
+import re
+import sys
+from collections import OrderedDict
+
+# Quoted strings and identifiers are kept as written, everything else is case and space insensitive
+SQL_TOKEN = re.compile(
+    r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\])|(\s+)|([^'\"`\[\s]+)"
+)
+# Statements whose rows can change without a write, or that write themselves
+UNCACHED = re.compile(
+    r"\b(random|randomblob|changes|total_changes|last_insert_rowid|current_date|current_time|current_timestamp|insert|update|delete|replace)\b|'now'"
+    # Date functions given no time value, such as date() or strftime('%Y'), also mean now
+    r"|\b(date|time|datetime|julianday|unixepoch) ?\( ?\)|\bstrftime ?\( ?'(?:[^']|'')*' ?\)"
+)
+# Statement verbs that only read
+READ_VERBS = ("select", "with", "values")
+
+
+def normalize_sql(sqlquery):
+    """Returns a statement with its keywords and names lowercased, runs of spaces collapsed and the final semicolon removed"""
+
+    parts = []
+    for quoted, space, other in SQL_TOKEN.findall(sqlquery):
+        if quoted:
+            parts.append(quoted)
+        elif space:
+            parts.append(" ")
+        else:
+            parts.append(other.lower())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def row_size(row):
+    """Returns the bytes held by a row tuple and its values"""
+
+    return sys.getsizeof(row) + sum(map(sys.getsizeof, row))
+
+
+class Result_Cache:
+    """Keeps the rows of recent read-only queries up to a size in bytes, least recently used out first, until the database changes"""
+
+    def __init__(self, conn, max_bytes=64 * 1024 * 1024):
+        """Initiates Result_Cache for a connection"""
+
+        self.conn = conn
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.version = None
+
+    def cacheable(self, key):
+        """Checks if the rows of a normalized statement can be kept"""
+
+        return (
+            self.max_bytes > 0
+            and key.split(" ", 1)[0] in READ_VERBS
+            and UNCACHED.search(key) is None
+        )
+
+    def database_version(self):
+        """Returns what changes when this or another connection writes to the database or changes its schema"""
+
+        # data_version only moves for commits of other connections, total_changes counts this one's writes
+        data_version, schema_version = self.conn.execute(
+            "SELECT data_version, schema_version FROM pragma_data_version, pragma_schema_version"
+        ).fetchone()
+        return data_version, schema_version, self.conn.total_changes
+
+    def check(self):
+        """Empties the cache if the database changed since the rows were kept"""
+
+        version = self.database_version()
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.clear()
+            self.version = version
+
+    def clear(self):
+        """Removes every kept result"""
+
+        self.entries.clear()
+        self.size = 0
+
+    def put(self, key, rows, size):
+        """Keeps the rows of a statement, removing the least recently used results past max_bytes"""
+
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (rows, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+            self.evictions += 1
+
+    def execute(self, cur, sqlquery, parameters=()):
+        """Yields the rows of a statement, from the cache when the same statement and parameters ran since the last change"""
+
+        if isinstance(parameters, dict):
+            key = (normalize_sql(sqlquery), tuple(sorted(parameters.items())))
+        else:
+            key = (normalize_sql(sqlquery), tuple(parameters))
+
+        if not self.cacheable(key[0]):
+            yield from cur.execute(sqlquery, parameters)
+            return
+
+        self.check()
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            yield from entry[0]
+            return
+
+        self.misses += 1
+        # Rows are passed on as they are read and only kept while they fit, so a large result still streams
+        rows = []
+        size = sys.getsizeof(rows)
+        for row in cur.execute(sqlquery, parameters):
+            if rows is not None:
+                rows.append(row)
+                size += row_size(row) + 8
+                if size > self.max_bytes:
+                    rows = None
+            yield row
+
+        if rows is not None:
+            self.put(key, rows, size)
+
+    def report(self):
+        """Returns the hits, misses and size of the cache as one line"""
+
+        lookups = self.hits + self.misses
+        return (
+            "Result cache: %d hits, %d misses, %.0f%% hit rate, %d results in %.1f of %.1f MB, %d invalidations, %d evictions"
+            % (
+                self.hits,
+                self.misses,
+                100.0 * self.hits / lookups if lookups else 0.0,
+                len(self.entries),
+                self.size / (1024 * 1024),
+                self.max_bytes / (1024 * 1024),
+                self.invalidations,
+                self.evictions,
+            )
+        )
@@ -0,0 +1,223 @@
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from device_database import Cal_Database
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, msvcrt locks a byte range instead
+    fcntl = None
+    import msvcrt
+
+
+class Lock_File:
+    """Holds an exclusive lock on a file so only one scheduler runs against a database"""
+
+    def __init__(self, file_name="scheduler.lock"):
+        """Initiates Lock_File"""
+
+        self.file_name = file_name
+        self.lock_file = None
+
+    def acquire(self):
+        """Locks the file without waiting, raising RuntimeError if another process holds it"""
+
+        # The lock belongs to the open file, so the system releases it if the process dies
+        lock_file = open(self.file_name, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(
+                "Another scheduler is running, %s is locked" % self.file_name
+            )
+
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write("%d\n" % os.getpid())
+        lock_file.flush()
+        self.lock_file = lock_file
+
+    def release(self):
+        """Unlocks and closes the file"""
+
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class Reminder_Scheduler:
+    """Runs REMIND every day at set times until it is stopped, logging the duration and counts of every run"""
+
+    def __init__(
+        self,
+        db_file="device_database.db",
+        times=("08:00",),
+        lock_file="scheduler.lock",
+        log_file="scheduler.log",
+        digest=False,
+        clock=None,
+        sleep=None,
+    ):
+        """Initiates Reminder_Scheduler, with a clock returning datetimes and a sleep taking seconds that tests can replace"""
+
+        self.db_file = db_file
+        self.times = sorted(datetime.strptime(i, "%H:%M").time() for i in times)
+        self.lock = Lock_File(lock_file)
+        self.log_file = log_file
+        self.digest = digest
+        self.clock = clock
+        self.stopping = threading.Event()
+        # Waiting on the event lets stop() end a sleep at once
+        self.sleep = sleep or self.stopping.wait
+
+    def now(self):
+        """Returns the current time of the scheduler's clock"""
+
+        return self.clock() if self.clock is not None else datetime.now()
+
+    def next_run(self, now):
+        """Returns the first scheduled time after now"""
+
+        for day in (now.date(), now.date() + timedelta(days=1)):
+            for run_time in self.times:
+                scheduled = datetime.combine(day, run_time)
+                if scheduled > now:
+                    return scheduled
+
+    def stop(self, *args):
+        """Asks the scheduler to exit after the run in progress, usable as a signal handler"""
+
+        self.stopping.set()
+
+    def run_once(self):
+        """Sends the reminders through a fresh connection and logs the run"""
+
+        started = time.perf_counter()
+        when = self.now()
+        try:
+            # A new connection sees the changes of other processes and reloads the .env file
+            C = Cal_Database(self.db_file, load_devices=False)
+            try:
+                results = C.remind(digest=self.digest)
+            finally:
+                C.conn.close()
+        except Exception as e:
+            # A locked or missing database fails this run only, the next one tries again
+            results = e
+        elapsed = time.perf_counter() - started
+
+        if isinstance(results, Exception):
+            line = "%s remind %.2f s, Error: %s" % (
+                when.isoformat(timespec="seconds"),
+                elapsed,
+                results,
+            )
+        else:
+            sent = sum(result.sent for result in results)
+            line = "%s remind %.2f s, %d custodians, %d sent, %d failed" % (
+                when.isoformat(timespec="seconds"),
+                elapsed,
+                len(results),
+                sent,
+                len(results) - sent,
+            )
+
+        if self.log_file:
+            with open(self.log_file, "a") as log_file:
+                log_file.write(line + "\n")
+        print(line)
+        return results
+
+    def run(self, max_runs=None):
+        """Holds the lock and runs REMIND at every scheduled time until stopped or max_runs is reached"""
+
+        runs = 0
+        with self.lock:
+            while not self.stopping.is_set() and (max_runs is None or runs < max_runs):
+                scheduled = self.next_run(self.now())
+                # Sleeping in steps of a minute at most keeps the schedule right if the clock jumps
+                while not self.stopping.is_set():
+                    remaining = (scheduled - self.now()).total_seconds()
+                    if remaining <= 0:
+                        break
+                    self.sleep(min(remaining, 60))
+
+                if self.stopping.is_set():
+                    break
+                self.run_once()
+                runs += 1
+        return runs
+
+
+def main():
+    from dotenv import load_dotenv
+
+    # REMIND_AT may come from the .env file, which the database would only read later
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Sends the calibration reminders every day at set times"
+    )
+    parser.add_argument(
+        "--at",
+        nargs="+",
+        default=os.getenv("REMIND_AT", "08:00").split(","),
+        help="times of day as HH:MM",
+    )
+    parser.add_argument("--db", default="device_database.db")
+    parser.add_argument("--lock", default="scheduler.lock")
+    parser.add_argument("--log", default="scheduler.log")
+    parser.add_argument("--digest", action="store_true")
+    parser.add_argument(
+        "--once", action="store_true", help="run once now and exit, e.g. from cron"
+    )
+    args = parser.parse_args()
+
+    try:
+        scheduler = Reminder_Scheduler(
+            args.db, args.at, args.lock, args.log, args.digest
+        )
+    except ValueError:
+        parser.error("--at takes times of day as HH:MM, not " + " ".join(args.at))
+    # SIGTERM from a service manager or Ctrl+C lets a run in progress finish
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+
+    try:
+        if args.once:
+            with scheduler.lock:
+                scheduler.run_once()
+        else:
+            print(
+                "Reminding at %s, next run %s"
+                % (
+                    ", ".join(args.at),
+                    scheduler.next_run(scheduler.now()).isoformat(sep=" "),
+                )
+            )
+            scheduler.run()
+    except RuntimeError as e:
+        print("Error: " + str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+import argparse
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from sqlite3 import Error, IntegrityError
+from urllib.parse import parse_qs, unquote, urlparse
+
+from device_database import Cal_Database, check_row
+
+
+def check_fields(fields):
+    """Returns the fields of a device with its dates normalized, and the reasons of the fields that ADD and UPDATE would reject"""
+
+    today = date.today().strftime("%Y%m/%d")
+    checked = {}
+    reasons = []
+    # Every field is checked on its own so all the bad ones are reported at once
+    for column, value in fields.items():
+        row, reason = check_row([value], {column: 0}, today)
+        if reason is None:
+            checked[column] = row[0]
+        else:
+            reasons.append(reason)
+    return checked, reasons
+
+
+class Connection_Pool:
+    """Gives every server thread its own Cal_Database connection to a database in WAL mode"""
+
+    def __init__(self, db_file="device_database.db"):
+        """Initiates Connection_Pool"""
+
+        self.db_file = db_file
+        self.local = threading.local()
+        # SQLite allows one writer at a time, so writes queue here instead of failing as busy
+        self.write_lock = threading.Lock()
+        self.databases = []
+        self.lock = threading.Lock()
+
+        # WAL mode is stored in the database file, so readers no longer block behind a writer
+        C = self.get()
+        C.cur.execute("PRAGMA journal_mode=WAL").fetchall()
+
+    def get(self):
+        """Returns the connection of the calling thread, opening it on first use"""
+
+        if not hasattr(self.local, "database"):
+            # Opening creates the tables and indexes if needed, which is a write
+            with self.write_lock:
+                C = Cal_Database(
+                    self.db_file, load_devices=False, check_same_thread=False
+                )
+            C.cur.execute("PRAGMA synchronous=NORMAL")
+            self.local.database = C
+            with self.lock:
+                self.databases.append(C)
+
+        return self.local.database
+
+    def close(self):
+        """Closes every connection of the pool"""
+
+        with self.lock:
+            for C in self.databases:
+                C.conn.close()
+            self.databases.clear()
+
+
+class Device_Request_Handler(BaseHTTPRequestHandler):
+    """Maps HTTP/JSON requests onto the Cal_Database commands"""
+
+    def log_message(self, format, *args):
+        """Logs requests only when the server is verbose"""
+
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, data):
+        """Writes a JSON response"""
+
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        """Reads the JSON body of the request"""
+
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def route(self):
+        """Splits the request path into its parts and query parameters"""
+
+        url = urlparse(self.path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return parts, query
+
+    def handle_command(self, method):
+        """Runs the command of the request and answers with its result or error"""
+
+        try:
+            parts, query = self.route()
+            C = self.server.pool.get()
+            handler = getattr(
+                self, method + "_" + (parts[0] if parts else "index"), None
+            )
+            if handler is None:
+                self.send_json(404, {"error": "Not found"})
+            else:
+                handler(C, parts[1:], query)
+
+        except IntegrityError as e:
+            self.send_json(409, {"error": str(e)})
+        except (Error, ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": str(e)})
+
+    def do_GET(self):
+        self.handle_command("get")
+
+    def do_POST(self):
+        self.handle_command("post")
+
+    def do_PATCH(self):
+        self.handle_command("patch")
+
+    def do_DELETE(self):
+        self.handle_command("delete")
+
+    def get_devices(self, C, parts, query):
+        """DISPLAY - a page of devices, or one device when a property number is given"""
+
+        if parts:
+            sqlquery = "SELECT * FROM devices WHERE property_number = ?"
+            # fetchall finishes the statement so the thread does not keep an old WAL snapshot open
+            rows = C.cur.execute(sqlquery, (parts[0],)).fetchall()
+            if not rows:
+                self.send_json(404, {"error": "Property number not found."})
+            else:
+                self.send_json(200, dict(zip(C.display_column_names(), rows[0])))
+            return
+
+        columns = [i for i in query.get("columns", "").split(",") if i]
+        after = None
+        if "after_pn" in query:
+            after = (query.get("after", ""), query["after_pn"])
+
+        rows, after = C.display_page(
+            query.get("sort", "property_number"),
+            after,
+            min(int(query.get("limit", 20)), 1000),
+            columns,
+            query.get("custodian"),
+            query.get("status"),
+        )
+        self.send_json(
+            200,
+            {
+                "columns": columns or list(C.display_column_names()),
+                "rows": rows,
+                "after": after,
+            },
+        )
+
+    def get_export(self, C, parts, query):
+        """SAVE - streams the table as csv"""
+
+        columns = [i for i in query.get("columns", "").split(",") if i]
+        where, parameters = "", ()
+        if query.get("custodian"):
+            where, parameters = "custodian_email = ?", (query["custodian"],)
+
+        # The query runs before the headers, so a bad column is still answered with 400
+        cursor = C.export_cursor("devices", columns, where, parameters)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        csv_file = io.TextIOWrapper(
+            self.wfile, encoding="utf-8", newline="", write_through=True
+        )
+        try:
+            C.write_csv_rows(csv_file, cursor)
+        finally:
+            # Detached, the wrapper never closes the socket file when it is collected
+            csv_file.detach()
+
+    def post_devices(self, C, parts, query):
+        """ADD - adds one device or a list of devices"""
+
+        devices = self.read_json()
+        if isinstance(devices, dict):
+            devices = [devices]
+
+        rows = []
+        invalid = []
+        for device in devices:
+            fields, reasons = check_fields(
+                {column: device[column] for column in C.display_column_names()}
+            )
+            rows.append(tuple(fields.values()))
+            invalid += [str(device["property_number"]) + ": " + i for i in reasons]
+        if invalid:
+            self.send_json(400, {"error": "Invalid fields", "invalid": invalid})
+            return
+
+        with self.server.pool.write_lock:
+            count = C.add_many(rows)
+        self.send_json(201, {"added": count})
+
+    def patch_devices(self, C, parts, query):
+        """UPDATE - changes columns of one device"""
+
+        if not parts:
+            raise ValueError("A property number is required")
+        fields, invalid = check_fields(self.read_json())
+        if invalid:
+            self.send_json(400, {"error": "Invalid fields", "invalid": invalid})
+            return
+
+        changes = [(parts[0], column, value) for column, value in fields.items()]
+        with self.server.pool.write_lock:
+            count = C.update_many(changes)
+
+        if count == 0:
+            self.send_json(404, {"error": "Property number not found."})
+        else:
+            self.send_json(200, {"updated": count})
+
+    def delete_devices(self, C, parts, query):
+        """DELETE - deletes one device"""
+
+        if not parts:
+            raise ValueError("A property number is required")
+        with self.server.pool.write_lock:
+            count = C.delete_many([parts[0]])
+
+        if count == 0:
+            self.send_json(404, {"error": "Property number not found."})
+        else:
+            self.send_json(200, {"deleted": count})
+
+    def post_remind(self, C, parts, query):
+        """REMIND - sends the reminders and returns the result of every recipient"""
+
+        digest = self.read_json().get("digest", False)
+        # The reminder state is written after sending, and two runs at once would both send
+        with self.server.pool.write_lock:
+            results = C.remind(digest=digest)
+        if isinstance(results, Exception):
+            raise ValueError(str(results))
+        self.send_json(
+            200,
+            [
+                {
+                    "email_receiver": result.email_receiver,
+                    "sent": result.sent,
+                    "attempts": result.attempts,
+                    "error": None if result.error is None else str(result.error),
+                }
+                for result in results
+            ],
+        )
+
+
+class Device_Server(HTTPServer):
+    """A local HTTP/JSON service for the device database, answering requests on a fixed pool of threads"""
+
+    # Connections wait in the listen backlog while every pool thread is busy
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 8000),
+        db_file="device_database.db",
+        workers=8,
+        verbose=False,
+    ):
+        """Initiates Device_Server"""
+
+        self.pool = Connection_Pool(db_file)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.verbose = verbose
+        super().__init__(address, Device_Request_Handler)
+
+    def process_request(self, request, client_address):
+        """Hands the request to a pool thread so its connection is reused"""
+
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        """Answers one request on a pool thread"""
+
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        """Stops the pool threads and closes their connections"""
+
+        super().server_close()
+        self.executor.shutdown()
+        self.pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serves the device database over HTTP/JSON"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--db", default="device_database.db")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = Device_Server((args.host, args.port), args.db, args.workers, args.verbose)
+    print("Serving %s on http://%s:%d" % (args.db, args.host, server.server_port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import socketserver
+import threading
+import time
+
+
+class SMTP_Handler(socketserver.StreamRequestHandler):
+    """Answers one SMTP client connection of the SMTP_Sink"""
+
+    def reply(self, line):
+        """Writes one SMTP response line"""
+
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        """Accepts every command and stores the messages it receives"""
+
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+
+        self.reply("220 localhost SMTP sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+
+            command = line.decode().strip()
+            verb = command[:4].upper()
+
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif verb == "AUTH":
+                if command.upper().startswith("AUTH LOGIN"):
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                with sink.lock:
+                    sink.logins += 1
+                self.reply("235 Authentication successful")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    data.append(data_line)
+
+                time.sleep(sink.delay)
+                with sink.lock:
+                    # Simulates a temporary failure of the next messages
+                    if sink.rejects:
+                        sink.rejects -= 1
+                        self.reply("451 Try again later")
+                        continue
+                    sink.messages.append(b"".join(data).decode())
+                    count = len(sink.messages)
+
+                self.reply("250 OK")
+                # Simulates a server closing an idle session after a number of messages
+                if sink.drop_every and count % sink.drop_every == 0:
+                    return
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTP_Sink:
+    """A local stand-in SMTP server that accepts and counts messages, used for tests and benchmarks"""
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, drop_every=0, rejects=0):
+        """Initiates SMTP_Sink"""
+
+        self.server = socketserver.ThreadingTCPServer((host, port), SMTP_Handler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.host, self.port = self.server.server_address
+        self.delay = delay
+        self.drop_every = drop_every
+        self.rejects = rejects
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+
+    def start(self):
+        """Serves clients in a background thread"""
+
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server and closes its socket"""
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,42 @@
+import unittest
+import os
+import stat
+import tempfile
+from unittest.mock import patch
+from atomic_file import UMASK, atomic_write
+
+
+class TestAtomic_Write(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "devices.csv")
+        with open(self.file_name, "w") as text_file:
+            text_file.write("old\n")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_atomic_write(self) -> True:
+        # Tests the file is replaced with the usual permissions without touching the umask
+        with patch("atomic_file.os.umask") as mocked_umask:
+            with atomic_write(self.file_name) as text_file:
+                text_file.write("new\n")
+        mocked_umask.assert_not_called()
+        with open(self.file_name) as text_file:
+            self.assertEqual(text_file.read(), "new\n")
+        self.assertEqual(stat.S_IMODE(os.stat(self.file_name).st_mode), 0o666 & ~UMASK)
+        self.assertEqual(os.listdir(self.directory.name), ["devices.csv"])
+
+    def test_atomic_write_error(self) -> True:
+        # Tests a failed write keeps the old file and leaves no temporary file
+        with self.assertRaises(RuntimeError):
+            with atomic_write(self.file_name) as text_file:
+                text_file.write("partial")
+                raise RuntimeError("Disk full")
+        with open(self.file_name) as text_file:
+            self.assertEqual(text_file.read(), "old\n")
+        self.assertEqual(os.listdir(self.directory.name), ["devices.csv"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,8 @@
 import unittest
 import csv
+import tempfile
+import subprocess
+import sys
 import imaplib
 import email
 import yaml
@@ -8,7 +11,11 @@ from dotenv import load_dotenv, dotenv_values
 from freezegun import freeze_time
 from unittest import mock
 from unittest.mock import patch
-from device_database import Cal_Database
+from device_database import Cal_Database, Device_Cache, csv_chunks, parse_date
+from smtp_sink import SMTP_Sink
+
+# device_database imports pandas on first use, which crashes if that first use is inside freeze_time
+import pandas
 
 
 class TestCal_Database(unittest.TestCase):
@@ -18,6 +25,8 @@ class TestCal_Database(unittest.TestCase):
 
     def tearDown(self) -> None:
         global C
+        # Closing releases the write lock of uncommitted test changes before the next test
+        C.conn.close()
         del C
 
     def test_sql_execute(self) -> True:
@@ -133,6 +142,17 @@ class TestCal_Database(unittest.TestCase):
         # Tests method output to test list
         self.assertEqual(C.generate_property_list(), test_property_numbers_true)
 
+    def test_refresh_device(self) -> True:
+        # Initialize a device changed behind the cache
+        sqlquery = "UPDATE devices SET manufacturer = 'Keychron' WHERE property_number = 'b000001'"
+        C.cur.execute(sqlquery)
+
+        # Tests only that device is reloaded
+        C.refresh_device("b000001")
+        self.assertEqual(C.devices[0][1], "Keychron")
+        self.assertEqual(C.property_numbers[0], "b000001")
+        C.conn.rollback()
+
     def test_generate_email_list(self) -> True:
         # Initialize comparison property numbers
         test_email_list_true = ["john_doe1337@gmail.com"]
@@ -140,6 +160,58 @@ class TestCal_Database(unittest.TestCase):
         # Tests method output to test list
         self.assertEqual(C.generate_email_list(), test_email_list_true)
 
+    def test_generate_email_list_uses_due_index(self) -> True:
+        # Initialize due-soon query
+        sqlquery = (
+            "EXPLAIN QUERY PLAN SELECT custodian_email FROM devices WHERE "
+            + C.date_key("cal_due")
+            + " <= ?"
+        )
+
+        # Tests the due date search is an indexed range query
+        plan = C.cur.execute(sqlquery, ("2024-01-01",)).fetchall()
+        self.assertIn("USING INDEX devices_cal_due_key", plan[0][3])
+
+    def test_normalize_dates(self) -> True:
+        # Initialize a device with a non zero-padded due date
+        C.create_cal_table("test_replace_devices")
+        sqlquery = "INSERT INTO test_replace_devices (property_number, cal_due) VALUES ('b000098', '1/2/2024')"
+        C.cur.execute(sqlquery)
+
+        # Tests the date is rewritten as MM/DD/YYYY
+        C.normalize_dates("test_replace_devices", "cal_due")
+        sqlquery = (
+            "SELECT cal_due FROM test_replace_devices WHERE property_number = 'b000098'"
+        )
+        self.assertEqual(C.cur.execute(sqlquery).fetchone(), ("01/02/2024",))
+        C.conn.rollback()
+
+    @freeze_time("2023-08-21")
+    def test_generate_digest_list(self) -> True:
+        # Initialize comparison result
+        test_digest = {
+            "john_doe1337@gmail.com": [
+                ("b000004", "Newport", "Optical Detector", "07/01/2023", "expired"),
+                ("b000003", "Fluke", "Digital Multi-meter", "08/03/2023", "expired"),
+            ]
+        }
+
+        # Tests method output to test dict
+        self.assertEqual(
+            C.generate_digest_list(60, "test_replace_devices"), test_digest
+        )
+
+    def test_reminder_message(self) -> True:
+        # Initialize test devices
+        devices = [("b000004", "Newport", "Optical Detector", "07/01/2023", "expired")]
+
+        # Tests the digest body lists the device
+        subject, body = C.reminder_message("john_doe1337@gmail.com", devices)
+        self.assertEqual(subject, "Calibration Reminder")
+        self.assertIn(
+            "b000004 - Newport Optical Detector - due 07/01/2023 (expired)", body
+        )
+
     def test_display_column_names(self) -> True:
         # Initialize comparison results
         test_column_names_true = (
@@ -263,6 +335,63 @@ class TestCal_Database(unittest.TestCase):
             )
         )
 
+    def test_display_page(self) -> True:
+        # Initialize comparison pages sorted by due date
+        test_pages = [
+            [("b000004",), ("b000003",)],
+            [("b000005",), ("b000002",)],
+            [("b000001",)],
+        ]
+
+        # Tests each page continues after the last row of the previous one
+        actual_pages = []
+        after = None
+        while True:
+            rows, after = C.display_page(
+                "cal_due",
+                after,
+                2,
+                ["property_number"],
+                table_name="test_replace_devices",
+            )
+            actual_pages.append(rows)
+            if after is None:
+                break
+        self.assertEqual(actual_pages, test_pages)
+
+    @freeze_time("2023-08-21")
+    def test_display_page_filters(self) -> True:
+        # Initialize comparison result
+        test_rows = [("b000004", "07/01/2023"), ("b000003", "08/03/2023")]
+
+        # Tests the custodian and due status filters
+        rows, after = C.display_page(
+            "cal_due",
+            columns=["property_number", "cal_due"],
+            custodian="john_doe1337@gmail.com",
+            status="expired",
+            table_name="test_replace_devices",
+        )
+        self.assertEqual(rows, test_rows)
+        self.assertIsNone(after)
+
+    def test_create_page_indexes(self) -> True:
+        # Initialize a second page query sorted by manufacturer
+        sqlquery = (
+            "EXPLAIN QUERY PLAN SELECT * FROM devices WHERE "
+            + C.sort_key("manufacturer")
+            + " >= ? AND ("
+            + C.sort_key("manufacturer")
+            + ", property_number) > (?, ?) ORDER BY "
+            + C.sort_key("manufacturer")
+            + ", property_number LIMIT 20"
+        )
+
+        # Tests the page is read from the index without sorting
+        plan = C.cur.execute(sqlquery, ("Fluke", "Fluke", "b000003")).fetchall()
+        self.assertEqual(len(plan), 1)
+        self.assertIn("USING INDEX devices_manufacturer_page", plan[0][3])
+
     @patch("builtins.print")
     @patch("builtins.input")
     def test_select(self, mocked_input, mocked_print) -> True:
@@ -308,12 +437,161 @@ class TestCal_Database(unittest.TestCase):
                 "b000006",
                 "Thorlabs",
                 "Optical Power Meter",
-                "01/01/23",
-                "01/01/24",
+                "01/01/2023",
+                "01/01/2024",
                 "john_doe1337@gmail.com",
             )
         )
 
+    def test_parse_date(self) -> True:
+        # Tests the common formats are normalized to MM/DD/YYYY
+        self.assertEqual(parse_date("01/01/23"), "01/01/2023")
+        self.assertEqual(parse_date("12/31/99"), "12/31/1999")
+        self.assertEqual(parse_date(" 1/2/2023 "), "01/02/2023")
+        self.assertEqual(parse_date("2023-01-02 00:00:00"), "01/02/2023")
+        self.assertEqual(parse_date("02-Jan-2023"), "01/02/2023")
+
+        # Tests impossible dates and other text are rejected
+        self.assertIsNone(parse_date("02/30/2024"))
+        self.assertIsNone(parse_date("next week"))
+        self.assertIsNone(parse_date(None))
+
+    @patch("builtins.print")
+    def test_import_csv_rejects(self, mocked_print) -> True:
+        # Initialize a csv file with a bad date, a bad email and a valid row
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write(
+                "property_number,manufacturer,description,cal_date,cal_due,custodian_email\n"
+                "b000001,Durgod,Keyboard,08/02/2023,13/45/2024,jane_doe@gmail.com\n"
+                "b000002,Fluke,Digital Multi-meter,2022-08-03,2023-08-03,john_doe1337\n"
+                "b000003,Fluke,Digital Multi-meter,8/3/22,8/3/23,john_doe1337@gmail.com\n"
+            )
+        reject_file = C.reject_file_name(csv_file.name)
+
+        # Tests the valid row is stored with four digit years
+        C.create_cal_table("test_import_devices")
+        result = C.import_csv(
+            csv_file.name, "test_import_devices", True, reject_file=reject_file
+        )
+        os.remove(csv_file.name)
+        self.assertEqual(result, (1, 2))
+
+        sqlquery = "SELECT property_number, cal_date, cal_due FROM test_import_devices"
+        test_rows = [("b000003", "08/03/2022", "08/03/2023")]
+        self.assertEqual(C.cur.execute(sqlquery).fetchall(), test_rows)
+
+        # Tests the bad rows are saved with their line and reason
+        with open(reject_file, newline="") as rejects:
+            test_rejects = list(csv.reader(rejects))
+        os.remove(reject_file)
+        self.assertEqual(test_rejects[0][:3], ["line", "reason", "property_number"])
+        self.assertEqual(
+            [row[:2] for row in test_rejects[1:]],
+            [
+                ["2", "invalid cal_due '13/45/2024'"],
+                ["3", "invalid custodian_email 'john_doe1337'"],
+            ],
+        )
+
+    @patch("builtins.print")
+    def test_import_csv_parallel(self, mocked_print) -> True:
+        # Initialize a csv file with a quoted newline, a future calibration date and a bad email
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write(
+                "property_number,manufacturer,description,cal_date,cal_due,custodian_email\n"
+                'b000001,Durgod,"Keyboard\nwith ""quotes""",08/02/2023,08/18/2024,jane_doe@gmail.com\n'
+                "b000002,Fluke,Digital Multi-meter,01/01/2099,01/01/2100,john_doe1337@gmail.com\n"
+                "b000003,Fluke,Digital Multi-meter,8/3/22,8/3/23,john_doe1337@gmail.com\n"
+                "b000004,Fluke,Digital Multi-meter,8/3/22,8/3/23,john_doe1337\n"
+                "b000005,Thorlabs,Optical Power Meter,2023-01-01,2024-01-01,jane_doe@gmail.com\n"
+            )
+        reject_file = C.reject_file_name(csv_file.name)
+
+        # Tests every range ends at a row, never inside the quoted newline
+        chunks = csv_chunks(csv_file.name, 16)
+        self.assertEqual([chunk[2] for chunk in chunks], [1, 3, 4, 5, 6])
+
+        # Tests checking the ranges in processes imports like a serial import
+        results = []
+        for workers in (1, 2):
+            C.create_cal_table("test_import_devices")
+            with patch("device_database.CHUNK_BYTES", 16):
+                result = C.import_csv(
+                    csv_file.name,
+                    "test_import_devices",
+                    True,
+                    batch_size=2,
+                    reject_file=reject_file,
+                    workers=workers,
+                )
+            with open(reject_file, newline="") as rejects:
+                test_rejects = [row[:2] for row in csv.reader(rejects)]
+            test_rows = C.cur.execute(
+                "SELECT property_number, description, cal_date FROM test_import_devices"
+            ).fetchall()
+            results.append((result, test_rows, test_rejects))
+        os.remove(csv_file.name)
+        os.remove(reject_file)
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1][0], (3, 2))
+        self.assertEqual(
+            results[1][1][0], ("b000001", 'Keyboard\nwith "quotes"', "08/02/2023")
+        )
+        self.assertEqual(
+            results[1][2][1:],
+            [
+                ["4", "cal_date 01/01/2099 is in the future"],
+                ["6", "invalid custodian_email 'john_doe1337'"],
+            ],
+        )
+
+    @patch("builtins.print")
+    def test_import_csv(self, mocked_print) -> True:
+        # Initialize a csv file with a short row and a duplicate property number
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write(
+                "property_number,manufacturer,description,cal_date,cal_due,custodian_email\n"
+                "b000001,Durgod,Keyboard,08/02/2023,08/18/2024,jane_doe@gmail.com\n"
+                "b000002,Fluke\n"
+                "b000001,Durgod,Keyboard,08/02/2023,08/18/2024,jane_doe@gmail.com\n"
+                "b000003,Fluke,Digital Multi-meter,8/3/2022,8/3/2023,john_doe1337@gmail.com\n"
+            )
+
+        # Tests only the bad rows are skipped and dates are normalized
+        C.create_cal_table("test_import_devices")
+        result = C.import_csv(csv_file.name, "test_import_devices", True, batch_size=2)
+        os.remove(csv_file.name)
+        self.assertEqual(result, (2, 2))
+
+        sqlquery = "SELECT property_number, cal_due FROM test_import_devices"
+        test_rows = [("b000001", "08/18/2024"), ("b000003", "08/03/2023")]
+        self.assertEqual(C.cur.execute(sqlquery).fetchall(), test_rows)
+
+    @patch("builtins.print")
+    def test_upsert_csv(self, mocked_print) -> True:
+        # Initialize a feed with an unchanged, an updated, a new and a short row
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write(
+                "property_number,manufacturer,description,cal_date,cal_due,custodian_email\n"
+                "b000001,Durgod,Keyboard,08/02/2023,08/18/2024,jane_doe@gmail.com\n"
+                "b000002,National Instruments,PXIe 5160 Oscilloscope,3/2/2024,3/2/2025,john_doe1337@gmail.com\n"
+                "b000006,Thorlabs,Optical Power Meter,01/01/2023,01/01/2024,john_doe1337@gmail.com\n"
+                "b000007,Fluke\n"
+            )
+
+        # Tests the rows are counted by outcome
+        C.create_cal_table("test_merge_devices")
+        C.import_csv("calibration_data.csv", "test_merge_devices", True, progress=False)
+        result = C.upsert_csv(csv_file.name, "test_merge_devices")
+        os.remove(csv_file.name)
+        self.assertEqual(result, (1, 1, 1, 1))
+
+        sqlquery = (
+            "SELECT cal_due FROM test_merge_devices WHERE property_number = 'b000002'"
+        )
+        self.assertEqual(C.cur.execute(sqlquery).fetchone(), ("03/02/2025",))
+
     @patch("builtins.print")
     @patch("builtins.input")
     def test_replace(self, mocked_input, mocked_print) -> True:
@@ -352,6 +630,69 @@ class TestCal_Database(unittest.TestCase):
         actual_list = [actual_sqlquery, actual_message]
         self.assertEqual(actual_list, test_list)
 
+    @patch("builtins.print")
+    def test_update_many(self, mocked_print) -> True:
+        # Initialize a copy of the calibration data
+        C.create_cal_table("test_batch_devices")
+        C.import_csv("calibration_data.csv", "test_batch_devices", True, progress=False)
+        changes = [
+            ("b000002", "custodian_email", "jane_doe@gmail.com"),
+            ("b000003", "custodian_email", "jane_doe@gmail.com"),
+            ("b000003", "cal_due", "8/3/2024"),
+        ]
+
+        # Tests every change is applied with normalized dates
+        self.assertEqual(C.update_many(changes, "test_batch_devices"), 3)
+        sqlquery = "SELECT property_number, cal_due, custodian_email FROM test_batch_devices WHERE property_number IN ('b000002', 'b000003')"
+        test_rows = [
+            ("b000002", "03/02/2024", "jane_doe@gmail.com"),
+            ("b000003", "08/03/2024", "jane_doe@gmail.com"),
+        ]
+        self.assertEqual(C.cur.execute(sqlquery).fetchall(), test_rows)
+
+    @patch("builtins.print")
+    def test_update_many_rename(self, mocked_print) -> True:
+        # Initialize a rename followed by other changes of the same device
+        C.create_cal_table("test_batch_devices")
+        C.import_csv("calibration_data.csv", "test_batch_devices", True, progress=False)
+        changes = [
+            ("b000002", "manufacturer", "Keysight"),
+            ("b000002", "property_number", "b000012"),
+            ("b000002", "description", "Oscilloscope"),
+            ("b000012", "manufacturer", "Tektronix"),
+        ]
+
+        # Tests the changes are applied in order and follow the device to its new property number
+        self.assertEqual(C.update_many(changes, "test_batch_devices"), 4)
+        sqlquery = "SELECT property_number, manufacturer, description FROM test_batch_devices WHERE property_number IN ('b000002', 'b000012')"
+        self.assertEqual(
+            C.cur.execute(sqlquery).fetchall(),
+            [("b000012", "Tektronix", "Oscilloscope")],
+        )
+
+    @patch("builtins.print")
+    def test_delete_many(self, mocked_print) -> True:
+        # Initialize a copy of the calibration data
+        C.create_cal_table("test_batch_devices")
+        C.import_csv("calibration_data.csv", "test_batch_devices", True, progress=False)
+
+        # Tests the devices are deleted in one call
+        self.assertEqual(C.delete_many(["b000001", "b000004"], "test_batch_devices"), 2)
+        sqlquery = "SELECT property_number FROM test_batch_devices"
+        test_rows = [("b000002",), ("b000003",), ("b000005",)]
+        self.assertEqual(C.cur.execute(sqlquery).fetchall(), test_rows)
+
+    def test_refresh_devices(self) -> True:
+        # Initialize devices changed behind the cache
+        sqlquery = "UPDATE devices SET manufacturer = 'Keychron' WHERE property_number IN ('b000001', 'b000002')"
+        C.cur.execute(sqlquery)
+
+        # Tests both devices are reloaded by one call
+        C.refresh_devices(["b000001", "b000002"])
+        self.assertEqual([i[1] for i in C.devices[:2]], ["Keychron", "Keychron"])
+        self.assertEqual(len(C.devices), len(C.property_numbers))
+        C.conn.rollback()
+
     def test_save_csv(self) -> True:
         # Initialize comparison result
         C.save_csv("test_replace_devices", "test_save.csv")
@@ -417,6 +758,30 @@ class TestCal_Database(unittest.TestCase):
 
         self.assertEqual(actual_list, test_list)
 
+    def test_save_csv_projection(self) -> True:
+        # Initialize comparison result
+        test_list = [
+            ["property_number", "cal_due"],
+            ["b000003", "08/03/2023"],
+            ["b000004", "07/01/2023"],
+        ]
+
+        # Tests only the chosen columns and rows are exported
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "test_export.csv")
+            C.save_csv(
+                "test_replace_devices",
+                file_name,
+                ["property_number", "cal_due"],
+                "cal_due LIKE ?",
+                ("%/2023",),
+            )
+            with open(file_name) as csv_file_obj:
+                actual_list = list(csv.reader(csv_file_obj))
+            self.assertEqual(os.listdir(directory), ["test_export.csv"])
+
+        self.assertEqual(actual_list, test_list)
+
     @freeze_time("2023-08-21")
     def test_date_math(self) -> True:
         # Initialize test value
@@ -425,6 +790,263 @@ class TestCal_Database(unittest.TestCase):
         # Actual Test
         self.assertEqual(C.date_math("08/01/2023"), -20)
 
+    @freeze_time("2023-08-21")
+    def test_due_status(self) -> True:
+        # Initialize test values
+        test_days = [-20.0, 11.0, 132.0]
+        test_status = ["expired", "due-soon", "ok", "invalid"]
+
+        # Actual Test
+        df = C.due_status(["08/01/2023", "09/01/2023", "12/31/2023", "01/01/23"])
+        self.assertEqual(list(df["days_remaining"][:3]), test_days)
+        self.assertEqual(list(df["status"]), test_status)
+
+    @freeze_time("2023-08-21")
+    def test_status_expression(self) -> True:
+        # Initialize due dates including non-canonical ones
+        test_dates = ["08/01/2023", "09/01/2023", "12/31/2023", "01/01/23"]
+        test_dates += ["8/1/2023", "02/30/2023", "banana", "", None]
+
+        # Tests the SQL statuses match the due_status statuses
+        expression, parameters = C.status_expression()
+        sqlquery = "SELECT " + expression + " FROM (SELECT ? AS cal_due)"
+        actual_status = [
+            C.cur.execute(sqlquery, parameters + [cal_due]).fetchone()[0]
+            for cal_due in test_dates
+        ]
+        self.assertEqual(actual_status, list(C.due_status(test_dates)["status"]))
+
+        # Tests an invalid due date is neither paged as expired nor reminded
+        C.cur.execute(
+            "CREATE TEMP TABLE test_status_devices AS SELECT * FROM test_replace_devices"
+        )
+        C.cur.execute(
+            "UPDATE test_status_devices SET cal_due = '7/1/2023' WHERE property_number = 'b000004'"
+        )
+        rows, after = C.display_page(
+            "cal_due",
+            columns=["property_number"],
+            status="expired",
+            table_name="test_status_devices",
+        )
+        self.assertEqual(rows, [("b000003",)])
+        digest = C.generate_digest_list(60, "test_status_devices")
+        self.assertEqual(
+            [device[0] for device in digest["john_doe1337@gmail.com"]], ["b000003"]
+        )
+        C.cur.execute("DROP TABLE test_status_devices")
+
+    @freeze_time("2023-08-21")
+    def test_generate_status_table(self) -> True:
+        # Initialize comparison result
+        test_status = ["ok", "ok", "expired", "expired", "ok"]
+
+        # Actual Test
+        df = C.generate_status_table("test_replace_devices")
+        self.assertEqual(list(df["status"]), test_status)
+
+    @freeze_time("2023-08-21")
+    @patch("builtins.print")
+    def test_remind(self, mocked_print) -> True:
+        # Initialize a local stand-in SMTP server
+        with SMTP_Sink() as sink:
+            settings = {
+                "EMAIL": "sender@example.com",
+                "PASSWORD": "password",
+                "SMTP_HOST": sink.host,
+                "SMTP_PORT": str(sink.port),
+                "SMTP_SSL": "0",
+            }
+
+            # Tests every custodian is reminded over one session
+            C.create_reminder_table()
+            C.cur.execute("DELETE FROM devices_reminders")
+            with patch.dict(os.environ, settings):
+                C.remind()
+            self.assertEqual(len(sink.messages), len(C.emails))
+            self.assertEqual(sink.connections, 1)
+
+    @freeze_time("2023-08-21")
+    @patch("builtins.print")
+    def test_remind_concurrent(self, mocked_print) -> True:
+        # Initialize a local stand-in SMTP server
+        with SMTP_Sink() as sink:
+            settings = {
+                "EMAIL": "sender@example.com",
+                "PASSWORD": "password",
+                "SMTP_HOST": sink.host,
+                "SMTP_PORT": str(sink.port),
+                "SMTP_SSL": "0",
+            }
+
+            # Tests a result is returned for every custodian
+            with patch.dict(os.environ, settings):
+                results = C.remind(workers=2, changes_only=False)
+            self.assertEqual([result.email_receiver for result in results], C.emails)
+            self.assertTrue(all(result.sent for result in results))
+
+    @freeze_time("2023-08-21")
+    @patch("builtins.print")
+    def test_due_table(self, mocked_print) -> True:
+        # Initialize a table filled by REPLACE
+        C.create_cal_table("test_due_devices")
+        C.replace("test_due_devices")
+        self.assertEqual(C.check_due_table("test_due_devices"), 0)
+
+        # Tests inserts, updates and deletes are copied by the triggers
+        C.add_many(
+            [
+                (
+                    "b000006",
+                    "Thorlabs",
+                    "Optical Power Meter",
+                    "01/01/2023",
+                    "09/01/2023",
+                    "john_doe1337@gmail.com",
+                )
+            ],
+            "test_due_devices",
+        )
+        C.update_many(
+            [
+                ("b000005", "cal_due", "08/30/2023"),
+                ("b000003", "cal_due", "08/03/2024"),
+            ],
+            "test_due_devices",
+        )
+        C.delete_many(["b000004"], "test_due_devices")
+        self.assertEqual(C.check_due_table("test_due_devices"), 0)
+
+        # Tests the devices due within 60 days are listed from the earliest
+        test_due = [
+            ("b000005", "john_doe1337@gmail.com", "2023-08-30"),
+            ("b000006", "john_doe1337@gmail.com", "2023-09-01"),
+        ]
+        self.assertEqual(C.due_within(60, "test_due_devices"), test_due)
+
+        # Tests a change behind the triggers' back is found and rebuilt
+        C.cur.execute(
+            "DELETE FROM test_due_devices_due WHERE property_number = 'b000006'"
+        )
+        self.assertEqual(C.check_due_table("test_due_devices"), 1)
+        C.rebuild("test_due_devices")
+        self.assertEqual(C.check_due_table("test_due_devices"), 0)
+
+    @patch("builtins.print")
+    def test_search_devices(self, mocked_print) -> True:
+        # Initialize a table filled by REPLACE
+        C.create_cal_table("test_search_devices")
+        C.replace("test_search_devices")
+
+        # Tests prefixes of words in both columns are matched
+        rows = C.search_devices("thorl power", table_name="test_search_devices")
+        self.assertEqual([row[0] for row in rows], ["b000005"])
+        rows = C.search_devices("optical", table_name="test_search_devices")
+        self.assertEqual(sorted(row[0] for row in rows), ["b000004", "b000005"])
+
+        # Tests inserts, updates and deletes are followed by the index
+        C.add_many(
+            [
+                (
+                    "b000006",
+                    "Thorlabs",
+                    "Optical Power Meter",
+                    "01/01/2023",
+                    "01/01/2024",
+                    "john_doe1337@gmail.com",
+                )
+            ],
+            "test_search_devices",
+        )
+        C.update_many(
+            [("b000005", "description", "Laser Diode Driver")], "test_search_devices"
+        )
+        C.delete_many(["b000004"], "test_search_devices")
+        rows = C.search_devices("optical", table_name="test_search_devices")
+        self.assertEqual([row[0] for row in rows], ["b000006"])
+        sqlquery = "INSERT INTO test_search_devices_search (test_search_devices_search) VALUES ('integrity-check')"
+        C.cur.execute(sqlquery)
+
+        # Tests FTS5 syntax in the terms is searched as plain words
+        self.assertEqual(
+            C.search_devices('"laser" OR NOT', table_name="test_search_devices"), []
+        )
+
+    def test_search_devices_fallback(self) -> True:
+        # Initialize a table without a search index
+        sqlquery = "CREATE TABLE test_plain_devices (property_number TEXT, manufacturer TEXT, description TEXT)"
+        C.cur.execute(sqlquery)
+        sqlquery = "INSERT INTO test_plain_devices VALUES ('b000001', 'Thorlabs', 'Optical Power Meter')"
+        C.cur.execute(sqlquery)
+
+        # Tests the table is scanned for every word instead
+        rows = C.search_devices("power thorl", table_name="test_plain_devices")
+        self.assertEqual(rows, [("b000001", "Thorlabs", "Optical Power Meter")])
+        C.conn.rollback()
+
+    @patch("builtins.print")
+    def test_generate_crossings(self, mocked_print) -> True:
+        # Initialize a table with two expired devices and one due on 01/01/2024
+        C.create_cal_table("test_remind_devices")
+        C.import_csv("calibration_data.csv", "test_remind_devices", True)
+        C.create_reminder_table("test_remind_devices")
+        C.cur.execute("DELETE FROM test_remind_devices_reminders")
+        thresholds = [0, 7, 30, 60]
+
+        # Tests the expired devices are reminded once
+        with freeze_time("2023-08-21"):
+            crossings = C.generate_crossings(thresholds, "test_remind_devices")
+            self.assertEqual([row[1] for row in crossings], ["b000003", "b000004"])
+            C.record_reminders(
+                crossings, ["john_doe1337@gmail.com"], "test_remind_devices"
+            )
+            self.assertEqual(
+                C.generate_crossings(thresholds, "test_remind_devices"), []
+            )
+
+        # Tests each threshold the next device reaches is a new crossing
+        for today, threshold in [("2023-11-05", 60), ("2023-12-30", 7)]:
+            with freeze_time(today):
+                crossings = C.generate_crossings(thresholds, "test_remind_devices")
+                self.assertEqual(
+                    [(row[1], row[6]) for row in crossings], [("b000005", threshold)]
+                )
+                C.record_reminders(
+                    crossings, ["john_doe1337@gmail.com"], "test_remind_devices"
+                )
+
+        # Tests a recalibrated device starts over
+        sqlquery = "UPDATE test_remind_devices SET cal_due = '12/31/2023' WHERE property_number = 'b000005'"
+        C.cur.execute(sqlquery)
+        with freeze_time("2023-12-30"):
+            crossings = C.generate_crossings(thresholds, "test_remind_devices")
+        self.assertEqual([(row[1], row[6]) for row in crossings], [("b000005", 7)])
+
+    def test_import_side_effects(self) -> True:
+        # Initialize a fresh interpreter that only imports the module
+        code = (
+            "import sys, device_database; "
+            "print([m for m in ('pandas', 'numpy', 'smtplib', 'ssl', 'email') if m in sys.modules])"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.run(
+                [sys.executable, "-c", code],
+                cwd=directory,
+                env=dict(
+                    os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__))
+                ),
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                text=True,
+                timeout=60,
+            )
+            created = os.listdir(directory)
+
+        # Tests importing opens no database, waits for no input and loads no heavy module
+        self.assertEqual(output.returncode, 0)
+        self.assertEqual(output.stdout.strip(), "[]")
+        self.assertEqual(created, [])
+
     def test_send_email_gmail(self):
         """Sends an email reminder to personal gmail, then reads the email. Needs user credential files to work."""
 
@@ -475,6 +1097,113 @@ class TestCal_Database(unittest.TestCase):
         self.assertEqual(my_msg["subject"], test_email_subject)
 
 
+class TestDevice_Cache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = Device_Cache()
+        self.cache.load(
+            [
+                ("b000001", "Durgod", "Keyboard"),
+                ("b000003", "Fluke", "Digital Multi-meter"),
+            ]
+        )
+
+    def test_add(self) -> True:
+        # Tests the new device is inserted in sorted order
+        self.cache.add(("b000002", "Logi", "Speakers"))
+        self.assertEqual(self.cache.property_numbers, ["b000001", "b000002", "b000003"])
+        self.assertIn("b000002", self.cache)
+
+    def test_remove(self) -> True:
+        # Tests the device is removed from the lists and the index
+        self.cache.remove("b000001")
+        self.assertEqual(
+            self.cache.devices, [("b000003", "Fluke", "Digital Multi-meter")]
+        )
+        self.assertNotIn("b000001", self.cache)
+
+    def test_replace(self) -> True:
+        # Tests the updated row takes the place of the old one
+        self.cache.replace("b000003", [("b000003", "Fluke", "Oscilloscope")])
+        self.assertEqual(self.cache.devices[1], ("b000003", "Fluke", "Oscilloscope"))
+        self.assertEqual(len(self.cache), 2)
+
+    def test_merge(self) -> True:
+        # Initialize a batch that removes, replaces and inserts devices out of order
+        self.cache.merge(
+            ["b000001", "b000003"],
+            [
+                ("b000004", "Fluke", "Oscilloscope"),
+                ("b000003", "Fluke", "Calibrator"),
+                ("b000000", "Logi", "Speakers"),
+                ("b000003", "Fluke", "Clamp Meter"),
+            ],
+        )
+
+        # Tests the batch lands in sorted order with repeated rows kept in the given order
+        self.assertEqual(
+            self.cache.devices,
+            [
+                ("b000000", "Logi", "Speakers"),
+                ("b000003", "Fluke", "Calibrator"),
+                ("b000003", "Fluke", "Clamp Meter"),
+                ("b000004", "Fluke", "Oscilloscope"),
+            ],
+        )
+        self.assertNotIn("b000001", self.cache)
+
+    def test_merge_rebuild(self) -> True:
+        # Initialize the same batch spliced in place and rebuilt in one pass
+        rows = [("b%06d" % i, "Fluke", "Caliper %d" % i) for i in range(0, 10, 3)]
+        spliced = Device_Cache()
+        spliced.load(self.cache.devices)
+        spliced.merge(["b000001"], rows)
+        with patch("device_database.SPLICE_EDITS", 0):
+            self.cache.merge(["b000001"], rows)
+
+        # Tests both ways leave the same devices
+        self.assertEqual(self.cache.devices, spliced.devices)
+        self.assertEqual(len(self.cache), 5)
+        self.assertEqual(
+            [row[0] for row in self.cache.devices], self.cache.property_numbers
+        )
+
+    def test_null_property_numbers(self) -> True:
+        # Initialize a cache loaded with a device without a property number, as SQLite sorts it first
+        self.cache.load([(None, "Logi", "Speakers")] + list(self.cache.devices))
+        self.cache.add(("b000002", "Logi", "Mouse"))
+        self.cache.add((None, "Logi", "Webcam"))
+
+        # Tests lookups and edits work around the NULL property numbers
+        self.assertIn("b000002", self.cache)
+        self.assertNotIn("b000004", self.cache)
+        self.assertEqual(
+            self.cache.property_numbers, [None, None, "b000001", "b000002", "b000003"]
+        )
+        self.cache.remove(None)
+        self.cache.remove("b000001")
+        self.assertNotIn(None, self.cache)
+        self.assertEqual(self.cache.property_numbers, ["b000002", "b000003"])
+
+    def test_columns(self) -> True:
+        # Initialize a second device of the same manufacturer
+        self.cache.add(("b000004", "Fluke", "Oscilloscope"))
+
+        # Tests repeated values are stored once and rows are rebuilt from the columns
+        self.assertEqual(self.cache.columns[0].values, ["Durgod", "Fluke"])
+        self.assertEqual(list(self.cache.columns[0].codes), [0, 1, 1])
+        self.assertEqual(self.cache.devices[-1], ("b000004", "Fluke", "Oscilloscope"))
+        self.assertEqual(
+            self.cache.devices[:2],
+            [
+                ("b000001", "Durgod", "Keyboard"),
+                ("b000003", "Fluke", "Digital Multi-meter"),
+            ],
+        )
+        self.assertEqual(
+            [row[0] for row in self.cache.devices], self.cache.property_numbers
+        )
+
+
 # Main Program
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import csv
+import os
+import tempfile
+from unittest.mock import patch
+from device_database import Cal_Database
+from federation import Site_Federation, parse_sites
+from smtp_sink import SMTP_Sink
+
+
+class TestSite_Federation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.sites = {
+            "north": os.path.join(self.directory.name, "north.db"),
+            "south": os.path.join(self.directory.name, "south.db"),
+        }
+        devices = {
+            "north": [
+                ("b000001", "Fluke", "Multimeter", "08/02/2023", "08/25/2023", "jane_doe@gmail.com"),
+                ("b000004", "Tektronix", "Oscilloscope", "01/10/2023", "01/10/2030", "john_doe@gmail.com"),
+                ("b000005", "Fluke", "Clamp Meter", "03/01/2023", "03/01/2031", "jane_doe@gmail.com"),
+            ],
+            "south": [
+                ("b000002", "Keysight", "Oscilloscope", "02/01/2023", "02/01/2029", "ann_lee@gmail.com"),
+                ("b000003", "Fluke", "Calibrator", "05/05/2023", "08/20/2023", "ann_lee@gmail.com"),
+            ],
+        }  # fmt: skip
+        for name, db_file in self.sites.items():
+            C = Cal_Database(db_file, load_devices=False)
+            C.add_many(devices[name])
+            C.conn.close()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_display_rows(self) -> True:
+        # Initialize a federation of two sites
+        with Site_Federation(self.sites) as federation:
+            rows = list(federation.display_rows(page_size=2))
+            by_due = list(federation.display_rows("cal_due", page_size=1))
+            expired = list(federation.display_rows(status="expired"))
+
+        # Tests the devices of both sites are merged in order with their site
+        self.assertEqual(
+            [(name, row[0]) for name, row in rows],
+            [
+                ("north", "b000001"),
+                ("south", "b000002"),
+                ("south", "b000003"),
+                ("north", "b000004"),
+                ("north", "b000005"),
+            ],
+        )
+        self.assertEqual(
+            [row[0] for _, row in by_due],
+            ["b000003", "b000001", "b000002", "b000004", "b000005"],
+        )
+        self.assertEqual(sorted(row[0] for _, row in expired), ["b000001", "b000003"])
+
+    def test_display_rows_closed_early(self) -> True:
+        # Tests a merge that is abandoned releases the site threads
+        with Site_Federation(self.sites) as federation:
+            rows = federation.display_rows(page_size=1)
+            self.assertEqual(next(rows)[0], "north")
+            rows.close()
+            self.assertEqual(len(list(federation.display_rows())), 5)
+
+    def test_search(self) -> True:
+        # Tests matches from both sites are merged and limited
+        with Site_Federation(self.sites) as federation:
+            self.assertEqual(
+                sorted((name, row[0]) for name, row in federation.search("oscillo")),
+                [("north", "b000004"), ("south", "b000002")],
+            )
+            self.assertEqual(len(federation.search("fluke")), 3)
+            self.assertEqual(len(federation.search("fluke", limit=2)), 2)
+
+    def test_export(self) -> True:
+        # Initialize an export of both sites
+        file_name = os.path.join(self.directory.name, "fleet.csv")
+        with Site_Federation(self.sites) as federation:
+            count = federation.export(file_name, ["property_number", "custodian_email"])
+
+        # Tests one file holds every device sorted by property number
+        with open(file_name, newline="") as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(count, 5)
+        self.assertEqual(rows[0], ["site", "property_number", "custodian_email"])
+        self.assertEqual(rows[3], ["south", "b000003", "ann_lee@gmail.com"])
+        self.assertEqual(
+            [row[1] for row in rows[1:]], sorted(row[1] for row in rows[1:])
+        )
+
+    @patch("builtins.print")
+    def test_remind(self, mocked_print) -> True:
+        # Initialize a local stand-in SMTP server
+        with SMTP_Sink() as sink:
+            settings = {
+                "EMAIL": "sender@example.com",
+                "PASSWORD": "password",
+                "SMTP_HOST": sink.host,
+                "SMTP_PORT": str(sink.port),
+                "SMTP_SSL": "0",
+            }
+            with patch.dict(os.environ, settings), Site_Federation(
+                self.sites
+            ) as federation:
+                results = federation.remind()
+
+        # Tests every site reminds its own custodians
+        self.assertEqual(sorted(results), ["north", "south"])
+        self.assertEqual(len(sink.messages), 2)
+
+    def test_parse_sites(self) -> True:
+        # Tests NAME=FILE values become a site dict
+        self.assertEqual(
+            parse_sites(["north=a.db", "south=b=c.db"]),
+            {"north": "a.db", "south": "b=c.db"},
+        )
+        with self.assertRaises(ValueError):
+            parse_sites(["north"])
+        with self.assertRaises(ValueError):
+            Site_Federation({})
+
+
+if __name__ == "__main__":
+    unittest.main()
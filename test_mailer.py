@@ -0,0 +1,138 @@
+import unittest
+import smtplib
+import time
+from unittest.mock import patch
+from mailer import Rate_Limiter, Reminder_Mailer, build_message, dispatch_concurrent
+from smtp_sink import SMTP_Sink
+
+
+class TestReminder_Mailer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.sink = SMTP_Sink().start()
+
+    def tearDown(self) -> None:
+        self.sink.stop()
+
+    def create_mailer(self):
+        return Reminder_Mailer(
+            "sender@example.com",
+            "password",
+            self.sink.host,
+            self.sink.port,
+            use_ssl=False,
+        )
+
+    def test_build_message(self) -> True:
+        # Initialize test message
+        em = build_message(
+            "sender@example.com", "jane_doe@gmail.com", "Subject", "Body"
+        )
+
+        # Tests the message headers
+        self.assertEqual(em["To"], "jane_doe@gmail.com")
+        self.assertEqual(em["subject"], "Subject")
+
+    def test_send_one_session(self) -> True:
+        # Actual test
+        with self.create_mailer() as mailer:
+            for i in range(5):
+                mailer.send("custodian" + str(i) + "@gmail.com", "Subject", "Body")
+
+        # Tests a single connection and login served the whole batch
+        self.assertEqual(len(self.sink.messages), 5)
+        self.assertEqual(self.sink.connections, 1)
+        self.assertEqual(self.sink.logins, 1)
+        self.assertGreater(mailer.throughput(), 0)
+
+    def test_starttls(self) -> True:
+        # Initialize a server that offers STARTTLS
+        mailer = self.create_mailer()
+        with patch.object(smtplib.SMTP, "has_extn", return_value=True), patch.object(
+            smtplib.SMTP, "starttls"
+        ) as starttls:
+            mailer.connect()
+        mailer.close()
+
+        # Tests the session is encrypted before the login
+        starttls.assert_called_once_with(context=mailer.context)
+        self.assertEqual(self.sink.logins, 1)
+
+    def test_no_starttls(self) -> True:
+        # Initialize a server without STARTTLS that is not a local one
+        mailer = self.create_mailer()
+        with patch("mailer.LOCAL_HOSTS", ()):
+            with self.assertRaises(smtplib.SMTPNotSupportedError):
+                mailer.connect()
+
+        # Tests the password is never sent
+        self.assertEqual(self.sink.logins, 0)
+
+    def test_send_reconnects(self) -> True:
+        # Initialize a server that drops the session after every 2 messages
+        self.sink.drop_every = 2
+
+        # Actual test
+        with self.create_mailer() as mailer:
+            for i in range(5):
+                mailer.send("custodian" + str(i) + "@gmail.com", "Subject", "Body")
+
+        # Tests every message was delivered once over new sessions
+        self.assertEqual(len(self.sink.messages), 5)
+        self.assertEqual(mailer.connections, 3)
+
+    def test_dispatch_concurrent(self) -> True:
+        # Initialize test messages
+        messages = [
+            ("custodian" + str(i) + "@gmail.com", "Subject", "Body") for i in range(8)
+        ]
+
+        # Tests every message is sent and reported in order
+        results = dispatch_concurrent(self.create_mailer, messages, workers=4)
+        self.assertEqual(
+            [result.email_receiver for result in results], [i[0] for i in messages]
+        )
+        self.assertTrue(all(result.sent for result in results))
+        self.assertEqual(len(self.sink.messages), 8)
+
+    def test_dispatch_concurrent_retries(self) -> True:
+        # Initialize a server answering the first message with a temporary error
+        self.sink.rejects = 1
+        messages = [("jane_doe@gmail.com", "Subject", "Body")]
+
+        # Tests the message is sent on the second attempt
+        results = dispatch_concurrent(
+            self.create_mailer, messages, workers=1, backoff=0.01
+        )
+        self.assertEqual(results[0].attempts, 2)
+        self.assertTrue(results[0].sent)
+
+    def test_dispatch_concurrent_failure(self) -> True:
+        # Initialize a mailer pointed at a closed port
+        self.sink.stop()
+        messages = [("jane_doe@gmail.com", "Subject", "Body")]
+
+        # Tests the failure is collected instead of raised
+        results = dispatch_concurrent(
+            self.create_mailer, messages, retries=2, backoff=0.01
+        )
+        self.assertFalse(results[0].sent)
+        self.assertEqual(results[0].attempts, 3)
+        self.assertIsInstance(results[0].error, ConnectionError)
+        self.sink = SMTP_Sink().start()
+
+
+class TestRate_Limiter(unittest.TestCase):
+    def test_wait(self) -> True:
+        # Initialize a limit of 50 messages per second
+        limiter = Rate_Limiter(50)
+
+        # Tests 6 messages take at least 5 intervals
+        start = time.monotonic()
+        for i in range(6):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+
+# Main Program
+if __name__ == "__main__":
+    unittest.main()
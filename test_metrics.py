@@ -0,0 +1,116 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from unittest.mock import patch
+from device_database import Cal_Database
+from metrics import PROCESS_METRICS, Histogram, Metrics, statement_name
+
+
+class TestMetrics(unittest.TestCase):
+    def test_statement_name(self) -> True:
+        # Tests statements are grouped by verb and table
+        self.assertEqual(
+            statement_name("SELECT * FROM devices WHERE property_number = ?"),
+            "SELECT devices",
+        )
+        self.assertEqual(
+            statement_name("insert into devices (property_number) values (?)"),
+            "INSERT devices",
+        )
+        self.assertEqual(statement_name("BEGIN"), "BEGIN")
+
+    def test_histogram_quantile(self) -> True:
+        # Initialize test histogram, 90 fast and 10 slow observations
+        histogram = Histogram()
+        for i in range(90):
+            histogram.observe(0.0008)
+        for i in range(10):
+            histogram.observe(0.2)
+
+        # Tests the quantiles fall inside the buckets of the observations
+        self.assertTrue(0.0005 < histogram.quantile(0.5) <= 0.001)
+        self.assertTrue(0.1 < histogram.quantile(0.99) <= 0.2)
+        self.assertEqual(histogram.count, 100)
+
+    def test_timed_cursor(self) -> True:
+        # Initialize test connection
+        metrics = Metrics()
+        conn = sqlite3.connect(":memory:")
+        cur = metrics.cursor(conn)
+        cur.execute("CREATE TABLE devices (property_number TEXT)")
+        cur.executemany(
+            "INSERT INTO devices VALUES (?)", [(str(i),) for i in range(10)]
+        )
+        for row in cur.execute("SELECT * FROM devices"):
+            pass
+        cur.execute("SELECT * FROM devices LIMIT 3").fetchall()
+        conn.close()
+
+        # Tests calls, rows read and rows written per statement
+        statement = (("statement", "SELECT devices"),)
+        self.assertEqual(metrics.histograms[("cal_sql_seconds", statement)].count, 2)
+        self.assertEqual(metrics.counters[("cal_sql_rows_read_total", statement)], 13)
+        self.assertEqual(
+            metrics.counters[
+                ("cal_sql_rows_written_total", (("statement", "INSERT devices"),))
+            ],
+            10,
+        )
+
+    def test_prometheus(self) -> True:
+        # Initialize test metrics
+        metrics = Metrics()
+        metrics.observe("cal_command_seconds", 0.003, command="add")
+        metrics.inc("cal_emails_sent_total", 2)
+
+        text = metrics.prometheus()
+
+        # Tests the exposition format of a histogram and a counter
+        self.assertIn("# TYPE cal_command_seconds histogram", text)
+        self.assertIn('cal_command_seconds_bucket{command="add",le="0.0025"} 0', text)
+        self.assertIn('cal_command_seconds_bucket{command="add",le="0.005"} 1', text)
+        self.assertIn('cal_command_seconds_bucket{command="add",le="+Inf"} 1', text)
+        self.assertIn('cal_command_seconds_count{command="add"} 1', text)
+        self.assertIn("# TYPE cal_emails_sent_total counter", text)
+        self.assertIn("cal_emails_sent_total 2", text)
+
+    def test_process_metrics(self) -> True:
+        # Initialize three databases opened with METRICS_FILE set, like the server threads
+        with tempfile.TemporaryDirectory() as directory, patch(
+            "metrics.atexit.register"
+        ) as register:
+            file_name = os.path.join(directory, "metrics.prom")
+            with patch.dict(os.environ, {"METRICS_FILE": file_name}):
+                databases = [
+                    Cal_Database(os.path.join(directory, "devices.db"))
+                    for i in range(3)
+                ]
+            for C in databases:
+                C.conn.close()
+
+        # Tests they share one Metrics written by a single exit handler
+        self.assertIs(databases[0].metrics, PROCESS_METRICS)
+        self.assertIs(databases[2].metrics, PROCESS_METRICS)
+        register.assert_called_once_with(PROCESS_METRICS.write, file_name)
+
+    @patch("builtins.print")
+    @patch("builtins.input")
+    def test_start(self, mocked_input, mocked_print) -> True:
+        # Initialize a database with metrics on
+        with tempfile.TemporaryDirectory() as directory:
+            metrics = Metrics()
+            C = Cal_Database(os.path.join(directory, "devices.db"), metrics=metrics)
+            mocked_input.side_effect = ["help", "bogus", "stats", "quit"]
+            C.start()
+
+            file_name = os.path.join(directory, "metrics.prom")
+            metrics.write(file_name)
+            with open(file_name) as text_file:
+                text = text_file.read()
+
+        # Tests each command was timed, unknown input under one label, and STATS printed the table
+        for command in ("help", "invalid", "stats", "quit"):
+            self.assertIn('cal_command_seconds_count{command="%s"} 1' % command, text)
+        report = mocked_print.call_args_list[-1].args[0]
+        self.assertIn("command help", report)
@@ -0,0 +1,128 @@
+import unittest
+import os
+import tempfile
+from unittest.mock import patch
+from device_database import Cal_Database
+from query_log import STATEMENT_LENGTH, Slow_Query_Log, plan_flags
+
+
+class TestSlow_Query_Log(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.C = Cal_Database(
+            os.path.join(self.directory.name, "devices.db"), load_devices=False
+        )
+        self.C.add_many(
+            [
+                ("b%06d" % i, "Fluke", "Caliper", "08/02/2023", "08/18/2024", "a@b.com")
+                for i in range(1000)
+            ]
+        )
+        self.log_file = os.path.join(self.directory.name, "slow_queries.log")
+        self.C.query_log = Slow_Query_Log(self.C.conn, self.log_file, threshold=0)
+
+    def tearDown(self) -> None:
+        self.C.conn.close()
+        self.directory.cleanup()
+
+    def test_plan_flags(self) -> True:
+        # Tests scans and sorts without an index are flagged, index scans are not
+        self.assertEqual(
+            plan_flags(["SCAN devices", "USE TEMP B-TREE FOR ORDER BY"]),
+            ["full-scan", "temp-b-tree"],
+        )
+        self.assertEqual(
+            plan_flags(["SCAN devices USING INDEX devices_cal_due_page"]), []
+        )
+        self.assertEqual(
+            plan_flags(["SEARCH devices USING INDEX sqlite_autoindex_devices_1"]), []
+        )
+
+    def test_flush(self) -> True:
+        # Initialize test statements, one sorted without an index and one index lookup
+        self.C.cur.execute("SELECT * FROM devices ORDER BY manufacturer").fetchall()
+        self.C.cur.execute(
+            "SELECT * FROM devices WHERE property_number = ?", ("b000001",)
+        ).fetchall()
+        entries = self.C.query_log.flush()
+
+        # Tests the plans and flags of both statements are logged
+        self.assertEqual(entries[0]["flags"], ["full-scan", "temp-b-tree"])
+        self.assertEqual(
+            entries[1]["statement"],
+            "SELECT * FROM devices WHERE property_number = 'b000001'",
+        )
+        self.assertEqual(entries[1]["flags"], [])
+        with open(self.log_file) as log_file:
+            text = log_file.read()
+        self.assertIn("[full-scan, temp-b-tree] SELECT * FROM devices", text)
+        self.assertIn("    USE TEMP B-TREE FOR ORDER BY", text)
+
+    def test_threshold(self) -> True:
+        # Tests statements faster than the threshold are not logged
+        self.C.query_log.threshold = 10
+        self.C.cur.execute("SELECT * FROM devices").fetchall()
+        self.assertEqual(self.C.query_log.flush(), [])
+        self.assertFalse(os.path.exists(self.log_file))
+
+    def test_internal_statements(self) -> True:
+        # Initialize an insert that fires the triggers of the due table and search index, and the schema lookups of the program
+        self.C.cur.execute(
+            "INSERT INTO devices VALUES (?, ?, ?, ?, ?, ?)",
+            ("b999999", "Fluke", "Caliper", "08/02/2023", "08/18/2024", "a@b.com"),
+        )
+        self.C.conn.commit()
+        self.C.display_column_names()
+        self.C.cur.execute(
+            "SELECT name FROM sqlite_master WHERE name = ?", ("devices",)
+        ).fetchall()
+        statements = [entry["statement"] for entry in self.C.query_log.flush()]
+
+        # Tests the insert is logged once under its own statement and the rest is left out
+        self.assertEqual(
+            statements,
+            [
+                "BEGIN ",
+                "INSERT INTO devices VALUES ('b999999', 'Fluke', 'Caliper', '08/02/2023', '08/18/2024', 'a@b.com')",
+                "COMMIT",
+            ],
+        )
+
+    def test_user_statements(self) -> True:
+        # Initialize a user query ending in LIMIT 0 and an insert with a long value
+        self.C.cur.execute(
+            "SELECT * FROM devices WHERE manufacturer = 'Fluke' LIMIT 0"
+        ).fetchall()
+        self.C.cur.execute(
+            "INSERT INTO devices VALUES (?, ?, ?, ?, ?, ?)",
+            ("b999999", "F" * 5000, "Caliper", "08/02/2023", "08/18/2024", "a@b.com"),
+        )
+        statements = [entry["statement"] for entry in self.C.query_log.flush()]
+
+        # Tests the query is logged and the insert is cut to STATEMENT_LENGTH characters
+        self.assertEqual(
+            statements[0], "SELECT * FROM devices WHERE manufacturer = 'Fluke' LIMIT 0"
+        )
+        self.assertEqual(len(statements[-1]), STATEMENT_LENGTH + 26)
+        self.assertTrue(statements[-1].endswith("... (4092 more characters)"))
+        with open(self.log_file) as log_file:
+            self.assertLess(max(len(line) for line in log_file), 1100)
+
+    @patch("builtins.print")
+    @patch("builtins.input")
+    def test_select_budget(self, mocked_input, mocked_print) -> True:
+        # Initialize a runaway ad-hoc query
+        self.C.query_log.budget = 0.2
+        mocked_input.return_value = (
+            "with recursive c(x) as (select 1 union all select x + 1 from c) "
+            "select count(*) from c"
+        )
+
+        e = self.C.select()
+
+        # Tests the query is cancelled and the connection keeps working
+        self.assertEqual(str(e), "Query cancelled after 0.2 seconds")
+        mocked_print.assert_called_with("Error: Query cancelled after 0.2 seconds")
+        self.assertEqual(
+            self.C.cur.execute("SELECT COUNT(*) FROM devices").fetchone()[0], 1000
+        )
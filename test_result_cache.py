@@ -0,0 +1,126 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from unittest.mock import patch
+from device_database import Cal_Database
+from result_cache import Result_Cache, normalize_sql
+
+
+class TestResult_Cache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.directory.name, "devices.db")
+        self.C = Cal_Database(self.db_file, load_devices=False)
+        self.C.add_many(
+            [
+                ("b%06d" % i, "Fluke", "Caliper", "08/02/2023", "08/18/2024", "a@b.com")
+                for i in range(100)
+            ]
+        )
+        self.cache = self.C.result_cache
+
+    def tearDown(self) -> None:
+        self.C.conn.close()
+        self.directory.cleanup()
+
+    def rows(self, sqlquery, parameters=()):
+        return list(self.cache.execute(self.C.cur, sqlquery, parameters))
+
+    def test_normalize_sql(self) -> True:
+        # Tests case and spacing are ignored outside of quotes
+        self.assertEqual(
+            normalize_sql(
+                "SELECT  *\n FROM Devices WHERE custodian_email = 'A@B.com' ;"
+            ),
+            "select * from devices where custodian_email = 'A@B.com'",
+        )
+        self.assertEqual(
+            normalize_sql("select 'it''s  Here', \"Odd  Name\" from t"),
+            "select 'it''s  Here', \"Odd  Name\" from t",
+        )
+
+    def test_hits(self) -> True:
+        # Initialize the same query written two ways and one with other parameters
+        sqlquery = "SELECT * FROM devices WHERE property_number < ?"
+        first = self.rows(sqlquery, ("b000010",))
+        second = self.rows(
+            "select *  from devices where property_number < ?;", ("b000010",)
+        )
+        self.rows(sqlquery, ("b000020",))
+
+        # Tests the second run is served from the cache
+        self.assertEqual(len(first), 10)
+        self.assertEqual(first, second)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+        self.assertIn("1 hits, 2 misses, 33% hit rate", self.cache.report())
+
+    def test_uncached(self) -> True:
+        # Tests statements that write or change without a write are always run
+        self.rows("SELECT random() FROM devices")
+        self.rows("SELECT random() FROM devices")
+        self.rows("UPDATE devices SET manufacturer = 'Mitutoyo'")
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 0))
+
+        # Tests date functions without a time value are read as now
+        for sqlquery in (
+            "SELECT * FROM devices WHERE cal_due_key <= date()",
+            "SELECT julianday( ), time()",
+            "SELECT strftime('%Y-%m', 'now')",
+            "SELECT STRFTIME('%s')",
+        ):
+            self.assertFalse(self.cache.cacheable(normalize_sql(sqlquery)))
+        self.assertTrue(
+            self.cache.cacheable(normalize_sql("SELECT date(cal_due) FROM devices"))
+        )
+
+    def test_invalidation(self) -> True:
+        # Initialize a cached count
+        sqlquery = "SELECT COUNT(*) FROM devices WHERE manufacturer = 'Fluke'"
+        self.assertEqual(self.rows(sqlquery), [(100,)])
+
+        # Tests a write through this connection empties the cache
+        self.C.update_many([("b000001", "manufacturer", "Mitutoyo")])
+        self.assertEqual(self.rows(sqlquery), [(99,)])
+
+        # Tests a commit of another connection empties the cache
+        other = sqlite3.connect(self.db_file)
+        other.execute("DELETE FROM devices WHERE property_number = 'b000002'")
+        other.commit()
+        other.close()
+        self.assertEqual(self.rows(sqlquery), [(98,)])
+        self.assertEqual(self.cache.invalidations, 2)
+
+    def test_max_bytes(self) -> True:
+        # Initialize a cache that holds two small results
+        cache = Result_Cache(self.C.conn, 400)
+        for i in range(1, 4):
+            list(
+                cache.execute(
+                    self.C.cur,
+                    "SELECT property_number FROM devices WHERE rowid = ?",
+                    (i,),
+                )
+            )
+        list(cache.execute(self.C.cur, "SELECT * FROM devices"))
+
+        # Tests the oldest results are evicted and a result too large streams without being kept
+        self.assertLessEqual(cache.size, 400)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(len(cache.entries), 2)
+        self.assertNotIn(("select * from devices", ()), cache.entries)
+
+    @patch("builtins.print")
+    def test_display_data(self, mocked_print) -> True:
+        # Tests a repeated DISPLAY sort is a cache hit with the same output
+        with patch("builtins.input", return_value="cal_due"):
+            self.C.display_data()
+            first = mocked_print.call_args_list[:]
+            mocked_print.reset_mock()
+            self.C.display_data()
+        self.assertEqual(mocked_print.call_args_list, first)
+        self.assertEqual(self.cache.hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+from unittest.mock import patch
+from freezegun import freeze_time
+from device_database import Cal_Database
+from scheduler import Lock_File, Reminder_Scheduler, main
+from smtp_sink import SMTP_Sink
+
+# device_database imports pandas on first use, which crashes if that first use is inside freeze_time
+import pandas
+
+
+class TestReminder_Scheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.directory.name, "devices.db")
+        self.log_file = os.path.join(self.directory.name, "scheduler.log")
+        self.lock_file = os.path.join(self.directory.name, "scheduler.lock")
+
+        C = Cal_Database(self.db_file, load_devices=False)
+        C.add_many(
+            [
+                (
+                    "b000001",
+                    "Durgod",
+                    "Keyboard",
+                    "08/02/2023",
+                    "08/25/2023",
+                    "jane_doe@gmail.com",
+                ),
+                (
+                    "b000002",
+                    "Logitech",
+                    "Mouse",
+                    "01/10/2023",
+                    "01/10/2030",
+                    "john_doe@gmail.com",
+                ),
+            ]
+        )
+        C.conn.close()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_next_run(self) -> True:
+        # Initialize a scheduler running twice a day
+        scheduler = Reminder_Scheduler(self.db_file, ["13:30", "08:00"])
+
+        # Tests the next time is later today or early tomorrow
+        self.assertEqual(
+            scheduler.next_run(datetime(2023, 8, 21, 9, 0)),
+            datetime(2023, 8, 21, 13, 30),
+        )
+        self.assertEqual(
+            scheduler.next_run(datetime(2023, 8, 21, 13, 30)),
+            datetime(2023, 8, 22, 8, 0),
+        )
+
+    @patch("builtins.print")
+    def test_run(self, mocked_print) -> True:
+        # Initialize a local stand-in SMTP server and a frozen clock the sleep moves forward
+        with SMTP_Sink() as sink, freeze_time("2023-08-21 07:00") as frozen:
+            settings = {
+                "EMAIL": "sender@example.com",
+                "PASSWORD": "password",
+                "SMTP_HOST": sink.host,
+                "SMTP_PORT": str(sink.port),
+                "SMTP_SSL": "0",
+            }
+            scheduler = Reminder_Scheduler(
+                self.db_file,
+                ["08:00"],
+                self.lock_file,
+                self.log_file,
+                sleep=frozen.tick,
+            )
+            with patch.dict(os.environ, settings):
+                runs = scheduler.run(max_runs=2)
+
+        # Tests the custodian is reminded on the first day only
+        self.assertEqual(runs, 2)
+        self.assertEqual(len(sink.messages), 1)
+        with open(self.log_file) as log_file:
+            lines = log_file.read().splitlines()
+        self.assertTrue(lines[0].startswith("2023-08-21T08:00:00 remind"))
+        self.assertTrue(lines[0].endswith("1 custodians, 1 sent, 0 failed"))
+        self.assertTrue(lines[1].startswith("2023-08-22T08:00:00 remind"))
+        self.assertTrue(lines[1].endswith("0 custodians, 0 sent, 0 failed"))
+
+    @patch("builtins.print")
+    def test_run_error(self, mocked_print) -> True:
+        # Initialize a first run that finds the database locked
+        with freeze_time("2023-08-21 07:00") as frozen, patch(
+            "device_database.Cal_Database.remind",
+            side_effect=[sqlite3.OperationalError("database is locked"), []],
+        ):
+            scheduler = Reminder_Scheduler(
+                self.db_file,
+                ["08:00"],
+                self.lock_file,
+                self.log_file,
+                sleep=frozen.tick,
+            )
+            runs = scheduler.run(max_runs=2)
+
+        # Tests the error is logged and the scheduler runs again the next day
+        self.assertEqual(runs, 2)
+        with open(self.log_file) as log_file:
+            lines = log_file.read().splitlines()
+        self.assertTrue(lines[0].startswith("2023-08-21T08:00:00 remind"))
+        self.assertTrue(lines[0].endswith("Error: database is locked"))
+        self.assertTrue(lines[1].startswith("2023-08-22T08:00:00 remind"))
+        self.assertTrue(lines[1].endswith("0 custodians, 0 sent, 0 failed"))
+
+    def test_stop(self) -> True:
+        # Initialize a scheduler stopped while it sleeps
+        scheduler = Reminder_Scheduler(self.db_file, lock_file=self.lock_file)
+        scheduler.sleep = lambda seconds: scheduler.stop()
+
+        # Tests it exits without running
+        self.assertEqual(scheduler.run(), 0)
+
+    @patch("builtins.print")
+    @patch("scheduler.signal.signal")
+    @patch("scheduler.Reminder_Scheduler.run")
+    def test_main(self, mocked_run, mocked_signal, mocked_print) -> True:
+        # Initialize a .env file that sets the reminder time
+        def load_dotenv():
+            os.environ["REMIND_AT"] = "09:30"
+
+        with patch.dict(os.environ), patch("dotenv.load_dotenv", load_dotenv):
+            with patch("sys.argv", ["scheduler.py", "--lock", self.lock_file]):
+                main()
+            with patch("sys.argv", ["scheduler.py", "--at", "25:99"]):
+                with patch("sys.stderr"), self.assertRaises(SystemExit) as error:
+                    main()
+
+        # Tests the time of the .env file is used and a bad time is a usage error
+        self.assertTrue(mocked_print.call_args.args[0].startswith("Reminding at 09:30"))
+        self.assertEqual(error.exception.code, 2)
+
+    def test_lock_file(self) -> True:
+        # Tests a second scheduler cannot take the lock until the first releases it
+        with Lock_File(self.lock_file):
+            with self.assertRaises(RuntimeError):
+                Lock_File(self.lock_file).acquire()
+        with Lock_File(self.lock_file):
+            pass
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,239 @@
+import unittest
+import json
+import os
+import tempfile
+import threading
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from device_database import Cal_Database
+from server import Device_Server
+
+
+class TestDevice_Server(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        db_file = os.path.join(self.directory.name, "devices.db")
+
+        C = Cal_Database(db_file, load_devices=False)
+        C.add_many(
+            [
+                (
+                    "b000001",
+                    "Durgod",
+                    "Keyboard",
+                    "08/02/2023",
+                    "08/18/2024",
+                    "jane_doe@gmail.com",
+                ),
+                (
+                    "b000002",
+                    "Logitech",
+                    "Mouse",
+                    "01/10/2023",
+                    "01/10/2030",
+                    "john_doe@gmail.com",
+                ),
+                (
+                    "b000003",
+                    "Dell",
+                    "Monitor",
+                    "02/15/2023",
+                    "02/15/2030",
+                    "jane_doe@gmail.com",
+                ),
+            ]
+        )
+        C.conn.close()
+
+        self.server = Device_Server(("127.0.0.1", 0), db_file, workers=4)
+        self.url = "http://127.0.0.1:%d" % self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def request(self, method, path, data=None):
+        body = None if data is None else json.dumps(data).encode()
+        request = Request(self.url + path, body, method=method)
+        request.add_header("Content-Type", "application/json")
+        try:
+            with urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_journal_mode(self) -> True:
+        # Tests the pool switched the database to WAL mode
+        C = self.server.pool.get()
+        self.assertEqual(C.cur.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_get_devices(self) -> True:
+        # Actual test
+        status, page = self.request(
+            "GET", "/devices?sort=cal_due&limit=2&columns=property_number,cal_due"
+        )
+        status2, page2 = self.request(
+            "GET",
+            "/devices?sort=cal_due&limit=2&after=%s&after_pn=%s" % tuple(page["after"]),
+        )
+
+        # Tests keyset pages over the same parameters as display_page
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            page["rows"], [["b000001", "08/18/2024"], ["b000002", "01/10/2030"]]
+        )
+        self.assertEqual(status2, 200)
+        self.assertEqual([row[0] for row in page2["rows"]], ["b000003"])
+        self.assertIsNone(page2["after"])
+
+    def test_get_device(self) -> True:
+        # Actual test
+        status, device = self.request("GET", "/devices/b000002")
+        status2, error = self.request("GET", "/devices/b999999")
+
+        # Tests one device is returned by property number
+        self.assertEqual(status, 200)
+        self.assertEqual(device["custodian_email"], "john_doe@gmail.com")
+        self.assertEqual(status2, 404)
+        self.assertIn("error", error)
+
+    def test_add_update_delete(self) -> True:
+        # Initialize test device
+        device = {
+            "property_number": "b000004",
+            "manufacturer": "Filco",
+            "description": "Keyboard",
+            "cal_date": "8/18/2023",
+            "cal_due": "08/18/2031",
+            "custodian_email": "jane_doe@gmail.com",
+        }
+
+        # Tests add, update and delete through the service
+        self.assertEqual(self.request("POST", "/devices", device), (201, {"added": 1}))
+        self.assertEqual(self.request("POST", "/devices", device)[0], 409)
+        self.assertEqual(
+            self.request("PATCH", "/devices/b000004", {"description": "Mouse"}),
+            (200, {"updated": 1}),
+        )
+        status, row = self.request("GET", "/devices/b000004")
+        self.assertEqual(row["description"], "Mouse")
+        self.assertEqual(row["cal_date"], "08/18/2023")
+        self.assertEqual(
+            self.request(
+                "PATCH",
+                "/devices/b000004",
+                {"property_number": "b000005", "manufacturer": "Keychron"},
+            ),
+            (200, {"updated": 2}),
+        )
+        status, row = self.request("GET", "/devices/b000005")
+        self.assertEqual(row["manufacturer"], "Keychron")
+        self.assertEqual(
+            self.request("DELETE", "/devices/b000005"), (200, {"deleted": 1})
+        )
+        self.assertEqual(self.request("DELETE", "/devices/b000005")[0], 404)
+
+    def test_bad_request(self) -> True:
+        # Tests unknown columns and routes are answered with an error
+        self.assertEqual(self.request("GET", "/devices?sort=serial")[0], 400)
+        self.assertEqual(
+            self.request("PATCH", "/devices/b000001", {"serial": "1"})[0], 400
+        )
+        self.assertEqual(self.request("GET", "/unknown")[0], 404)
+        self.assertEqual(
+            self.request("PATCH", "/devices", {"manufacturer": "Logi"}),
+            (400, {"error": "A property number is required"}),
+        )
+        self.assertEqual(self.request("DELETE", "/devices")[0], 400)
+
+    def test_invalid_fields(self) -> True:
+        # Initialize a device with a future calibration, a bad due date and a bad email
+        device = {
+            "property_number": "b000004",
+            "manufacturer": "Filco",
+            "description": "Keyboard",
+            "cal_date": "12/31/2099",
+            "cal_due": "banana",
+            "custodian_email": "not-an-email",
+        }
+
+        # Tests every bad field is reported and nothing is stored
+        self.assertEqual(
+            self.request("POST", "/devices", device),
+            (
+                400,
+                {
+                    "error": "Invalid fields",
+                    "invalid": [
+                        "b000004: cal_date 12/31/2099 is in the future",
+                        "b000004: invalid cal_due 'banana'",
+                        "b000004: invalid custodian_email 'not-an-email'",
+                    ],
+                },
+            ),
+        )
+        self.assertEqual(self.request("GET", "/devices/b000004")[0], 404)
+        self.assertEqual(
+            self.request("PATCH", "/devices/b000001", {"cal_due": "banana"}),
+            (400, {"error": "Invalid fields", "invalid": ["invalid cal_due 'banana'"]}),
+        )
+        self.assertEqual(
+            self.request("PATCH", "/devices/b000001", {"cal_due": "1/2/2031"}),
+            (200, {"updated": 1}),
+        )
+        self.assertEqual(
+            self.request("GET", "/devices/b000001")[1]["cal_due"], "01/02/2031"
+        )
+
+    def test_export(self) -> True:
+        # Actual test
+        with urlopen(
+            self.url + "/export?columns=property_number&custodian=jane_doe@gmail.com"
+        ) as response:
+            lines = response.read().decode().splitlines()
+
+        # Tests the csv holds the header and the filtered rows
+        self.assertEqual(lines, ["property_number", "b000001", "b000003"])
+
+        # Tests an unknown column is answered with an error instead of a csv
+        self.assertEqual(
+            self.request("GET", "/export?columns=bogus"),
+            (400, {"error": "Column bogus does not exist"}),
+        )
+
+    def test_concurrent_requests(self) -> True:
+        # Initialize test clients, each adding devices while reading pages
+        errors = []
+
+        def client(n):
+            for i in range(10):
+                pn = "c%02d%03d" % (n, i)
+                device = {
+                    "property_number": pn,
+                    "manufacturer": "Filco",
+                    "description": "Keyboard",
+                    "cal_date": "08/18/2023",
+                    "cal_due": "08/18/2031",
+                    "custodian_email": "jane_doe@gmail.com",
+                }
+                for result in (
+                    self.request("POST", "/devices", device),
+                    self.request("GET", "/devices?limit=5"),
+                ):
+                    if result[0] not in (200, 201):
+                        errors.append(result)
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Tests every request succeeded and every write was kept
+        self.assertEqual(errors, [])
+        C = self.server.pool.get()
+        self.assertEqual(
+            C.cur.execute("SELECT COUNT(*) FROM devices").fetchone()[0], 83
+        )